@@ -1,3 +1,9 @@
+import asyncio
+from functools import lru_cache
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, StateGraph
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -5,57 +11,175 @@ from app.agents.nodes import (
     fail_node,
     generate_sql_node,
     link_schema_node,
+    match_template_node,
+    route_after_template,
     should_retry_execution,
     should_retry_validation,
     summarize_node,
     validate_sql_node,
 )
 from app.agents.state import AgentState
-from app.llm.factory import create_llm
+from app.config import get_settings
+from app.db.engine import SessionLocal
+from app.llm.factory import get_llm
 from app.logging_config import get_logger
+from app.services.cache_factory import get_cache_backend, get_result_cache
 from app.services.query_executor import execute_readonly_query
+from app.services.sql_validator import extract_tables
+from app.telemetry import RETRIES, traced_node
 
 logger = get_logger(__name__)
-
-
-async def execute_sql_node(state: AgentState, session: AsyncSession) -> dict:
+settings = get_settings()
+
+
+def session_from_config(config: RunnableConfig) -> AsyncSession:
+    """The per-request session travels in the run config, so one compiled graph serves every request."""
+    session = (config.get("configurable") or {}).get("session")
+    if session is None:
+        raise RuntimeError("run_agent must pass configurable.session to the compiled graph")
+    return session
+
+
+def _execution_error(exc: Exception) -> str:
+    err = str(getattr(exc, "orig", exc))
+    if len(err) > 300:
+        err = err[:300] + "..."
+    return err
+
+
+async def _table_versions(sql: str) -> dict[str, int]:
+    """Versions of the tables ``sql`` reads. Taken before it runs: a change mid-query must leave cached copies stale.
+
+    Synced from the question-cache backend first, so with Redis they are the versions every worker shares.
+    """
+    tables = extract_tables(sql)
+    backend = get_cache_backend()
+    await backend.sync_versions(tables)
+    return backend.versions.snapshot(tables)
+
+
+async def _run_candidate(sql: str) -> tuple[str, list[str], list[list[Any]]]:
+    """One speculative candidate on its own session: candidates race, and a session runs one query at a time."""
+    async with SessionLocal() as session:
+        columns, rows = await execute_readonly_query(session, sql)
+    return sql, columns, rows
+
+
+async def race_candidates(candidates: list[str], timeout: float) -> dict:
+    """Execute candidates concurrently; the first to succeed wins and the others are cancelled."""
+    # One backend sync for every candidate's tables, rather than a round trip per candidate.
+    tables = {sql: extract_tables(sql) for sql in candidates}
+    backend = get_cache_backend()
+    await backend.sync_versions(set().union(*tables.values()))
+    versions = {sql: backend.versions.snapshot(read) for sql, read in tables.items()}
+    if settings.result_cache_enabled:
+        for sql in candidates:
+            cached = get_result_cache().get(sql)
+            if cached is not None:
+                columns, rows = cached
+                logger.info("result_cache_hit", row_count=len(rows))
+                return {
+                    "sql": sql,
+                    "columns": columns,
+                    "rows": rows,
+                    "table_versions": versions[sql],
+                    "execution_error": None,
+                }
+
+    tasks = {asyncio.create_task(_run_candidate(sql)): sql for sql in candidates}
+    # (sql, error) in the order the candidates failed; the report names the SQL that produced the error
+    failures: list[tuple[str, str]] = []
     try:
-        columns, rows = await execute_readonly_query(session, state["sql"])
+        async with asyncio.timeout(timeout):
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=lambda t: candidates.index(tasks[t])):
+                    sql = tasks[task]
+                    if task.cancelled():
+                        failures.append((sql, "candidate was cancelled"))
+                        continue
+                    try:
+                        _, columns, rows = task.result()
+                    except Exception as exc:
+                        logger.warning("sql_candidate_failed", error=str(exc))
+                        failures.append((sql, _execution_error(exc)))
+                        continue
+                    logger.info("sql_candidate_won", candidate=candidates.index(sql), of=len(candidates))
+                    if settings.result_cache_enabled:
+                        get_result_cache().set(sql, columns, rows, versions[sql])
+                    return {
+                        "sql": sql,
+                        "columns": columns,
+                        "rows": rows,
+                        "table_versions": versions[sql],
+                        "execution_error": None,
+                    }
+    except TimeoutError:
+        failed = {sql for sql, _ in failures}
+        unfinished = next(sql for sql in candidates if sql not in failed)
+        failures.insert(0, (unfinished, f"no candidate finished within {timeout:g}s"))
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    sql, error = failures[0]
+    return {"sql": sql, "execution_error": error}
+
+
+async def execute_sql_node(state: AgentState, config: RunnableConfig) -> dict:
+    sql = state["sql"]
+    if len(state.get("candidates") or []) > 1:
+        return await race_candidates(state["candidates"], settings.speculative_timeout_seconds)
+    session = session_from_config(config)
+    versions = await _table_versions(sql)
+    if settings.result_cache_enabled:
+        cached = get_result_cache().get(sql)
+        if cached is not None:
+            columns, rows = cached
+            logger.info("result_cache_hit", row_count=len(rows))
+            return {"columns": columns, "rows": rows, "table_versions": versions, "execution_error": None}
+    try:
+        columns, rows = await execute_readonly_query(session, sql)
         logger.info("sql_executed", row_count=len(rows))
-        return {"columns": columns, "rows": rows, "execution_error": None}
+        if settings.result_cache_enabled:
+            get_result_cache().set(sql, columns, rows, versions)
+        return {"columns": columns, "rows": rows, "table_versions": versions, "execution_error": None}
     except Exception as exc:
         logger.warning("sql_execution_failed", error=str(exc))
-        err = str(getattr(exc, "orig", exc))
-        if len(err) > 300:
-            err = err[:300] + "..."
-        return {"execution_error": err}
+        return {"execution_error": _execution_error(exc)}
 
 
 async def increment_retry_node(state: AgentState) -> dict:
+    RETRIES.labels("validation" if state.get("validation_error") else "execution").inc()
     return {"retry_count": state.get("retry_count", 0) + 1}
 
 
-def build_graph(session: AsyncSession):
-    llm = create_llm()
+def build_graph(llm: BaseChatModel | None = None):
+    """Build and compile the workflow. Request-specific state (the DB session) is passed per run."""
+    llm = llm or get_llm()
 
     async def gen_sql(state: AgentState) -> dict:
         return await generate_sql_node(state, llm)
 
-    async def exec_sql(state: AgentState) -> dict:
-        return await execute_sql_node(state, session)
-
     graph = StateGraph(AgentState)
 
-    graph.add_node("link_schema", link_schema_node)
-    graph.add_node("generate_sql", gen_sql)
-    graph.add_node("validate_sql", validate_sql_node)
-    graph.add_node("execute_sql", exec_sql)
-    graph.add_node("summarize", summarize_node)
-    graph.add_node("increment_retry", increment_retry_node)
-    graph.add_node("fail", fail_node)
+    graph.add_node("link_schema", traced_node("link_schema", link_schema_node))
+    graph.add_node("match_template", traced_node("match_template", match_template_node))
+    graph.add_node("generate_sql", traced_node("generate_sql", gen_sql))
+    graph.add_node("validate_sql", traced_node("validate_sql", validate_sql_node))
+    graph.add_node("execute_sql", traced_node("execute_sql", execute_sql_node))
+    graph.add_node("summarize", traced_node("summarize", summarize_node))
+    graph.add_node("increment_retry", traced_node("increment_retry", increment_retry_node))
+    graph.add_node("fail", traced_node("fail", fail_node))
 
     graph.set_entry_point("link_schema")
-    graph.add_edge("link_schema", "generate_sql")
+    graph.add_edge("link_schema", "match_template")
+    graph.add_conditional_edges(
+        "match_template",
+        route_after_template,
+        {"validate": "validate_sql", "generate": "generate_sql"},
+    )
     graph.add_edge("generate_sql", "validate_sql")
 
     graph.add_conditional_edges(
@@ -76,3 +200,9 @@ def build_graph(session: AsyncSession):
     graph.add_edge("fail", END)
 
     return graph.compile()
+
+
+@lru_cache
+def get_compiled_graph():
+    """Process-wide compiled graph, built on first use (or at startup) and reused."""
+    return build_graph()
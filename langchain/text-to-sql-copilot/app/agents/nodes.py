@@ -1,13 +1,18 @@
+import asyncio
+
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.language_models.chat_models import BaseChatModel
 
 from app.agents.state import AgentState
 from app.config import get_settings
-from app.db.schema import TABLE_CATALOG
 from app.logging_config import get_logger
+from app.services.cache_factory import get_llm_limiter
+from app.services.catalog import get_catalog
+from app.services.query_templates import match_template
 from app.services.schema_service import build_schema_context, format_results_as_answer, link_relevant_tables
 from app.services.sql_parser import extract_sql_from_llm_response
 from app.services.sql_validator import SQLValidationError, validate_sql
+from app.telemetry import record_llm_usage, span
 
 logger = get_logger(__name__)
 settings = get_settings()
@@ -31,6 +36,15 @@ Example (revenue by country):
 """
 
 
+# Speculative mode: one prompt variant per candidate, so K replies differ even at temperature 0.
+CANDIDATE_HINTS = (
+    "",
+    "Qualify every column with its table alias and join only on key columns.",
+    "Use the fewest tables and joins that answer the question.",
+    "When grouping, aggregate in a subquery or CTE before joining other tables.",
+)
+
+
 def _parse_sql_response(content: str) -> str:
     return extract_sql_from_llm_response(content)
 
@@ -44,14 +58,26 @@ async def link_schema_node(state: AgentState) -> dict:
     return {"relevant_tables": tables, "schema_context": schema_context, "retry_count": state.get("retry_count", 0)}
 
 
-async def generate_sql_node(state: AgentState, llm: BaseChatModel) -> dict:
-    """Single LLM call to generate SQL."""
-    question = state["question"]
-    schema_context = state["schema_context"]
-    retry_count = state.get("retry_count", 0)
-    llm_calls = state.get("llm_calls", 0)
+async def match_template_node(state: AgentState) -> dict:
+    """Pre-vetted SQL for common question shapes — no LLM call."""
+    if not settings.templates_enabled:
+        return {"template": None}
+    match = match_template(state["question"], get_catalog().allowed_tables, settings.max_result_rows)
+    if match is None:
+        return {"template": None}
+    tables = list(dict.fromkeys([*state.get("relevant_tables", []), *match.tables]))
+    logger.info("template_matched", template=match.name, slots=match.slots)
+    return {
+        "template": match.name,
+        "template_slots": match.slots,
+        "sql": match.sql,
+        "relevant_tables": tables,
+        "schema_context": build_schema_context(tables),
+    }
 
-    user_parts = [f"Schema:\n{schema_context}", f"Question: {question}"]
+
+def _sql_messages(state: AgentState, hint: str = "") -> list:
+    user_parts = [f"Schema:\n{state['schema_context']}", f"Question: {state['question']}"]
 
     if state.get("validation_error"):
         user_parts.append(f"Previous SQL failed validation: {state['validation_error']}")
@@ -62,25 +88,65 @@ async def generate_sql_node(state: AgentState, llm: BaseChatModel) -> dict:
         user_parts.append(f"Previous SQL failed at runtime: {state['execution_error']}")
         user_parts.append(f"Previous SQL: {state.get('sql', '')}")
 
-    messages = [
+    if hint:
+        user_parts.append(hint)
+
+    return [
         SystemMessage(content=SQL_SYSTEM_PROMPT),
         HumanMessage(content="\n\n".join(user_parts)),
     ]
 
-    response = await llm.ainvoke(messages)
-    sql = _parse_sql_response(response.content)
-    logger.info("sql_generated", retry=retry_count, sql_preview=sql[:120])
+
+async def _generate_one(llm: BaseChatModel, messages: list) -> str:
+    # Queue time is outside the "llm" span, so the span keeps measuring the provider.
+    async with get_llm_limiter().slot():
+        with span("llm"):
+            response = await llm.ainvoke(messages)
+    record_llm_usage(response)
+    return _parse_sql_response(response.content)
+
+
+async def generate_sql_node(state: AgentState, llm: BaseChatModel) -> dict:
+    """Single LLM call to generate SQL, or K concurrent calls in speculative mode."""
+    retry_count = state.get("retry_count", 0)
+    llm_calls = state.get("llm_calls", 0)
+    k = settings.speculative_candidates
+
+    if k <= 1:
+        sql = await _generate_one(llm, _sql_messages(state))
+        logger.info("sql_generated", retry=retry_count, sql_preview=sql[:120])
+        return {
+            "sql": sql,
+            "template": None,  # a template whose SQL failed falls back here; the answer is the LLM's now
+            "validation_error": None,
+            "execution_error": None,
+            "llm_calls": llm_calls + 1,
+        }
+
+    hints = [CANDIDATE_HINTS[i % len(CANDIDATE_HINTS)] for i in range(k)]
+    replies = await asyncio.gather(
+        *(_generate_one(llm, _sql_messages(state, hint)) for hint in hints), return_exceptions=True
+    )
+    candidates = list(dict.fromkeys(r for r in replies if isinstance(r, str) and r))
+    if not candidates:
+        raise next(r for r in replies if isinstance(r, BaseException))
+    logger.info("sql_candidates_generated", retry=retry_count, requested=k, distinct=len(candidates))
     return {
-        "sql": sql,
+        "sql": candidates[0],
+        "template": None,
+        "candidates": candidates,
+        "candidates_generated": state.get("candidates_generated", 0) + k,
         "validation_error": None,
         "execution_error": None,
-        "llm_calls": llm_calls + 1,
+        "llm_calls": llm_calls + k,
     }
 
 
 async def validate_sql_node(state: AgentState) -> dict:
-    """Validate SQL without LLM."""
-    allowed = set(state.get("relevant_tables", list(TABLE_CATALOG.keys())))
+    """Validate SQL without LLM. Speculative candidates are all validated; the invalid ones are dropped."""
+    allowed = set(state.get("relevant_tables", get_catalog().allowed_tables))
+    if len(state.get("candidates") or []) > 1:
+        return _validate_candidates(state["candidates"], allowed)
     try:
         cleaned = validate_sql(state["sql"], allowed_tables=allowed)
         return {"sql": cleaned, "sql_valid": True, "validation_error": None}
@@ -89,6 +155,20 @@ async def validate_sql_node(state: AgentState) -> dict:
         return {"sql_valid": False, "validation_error": str(exc)}
 
 
+def _validate_candidates(candidates: list[str], allowed: set[str]) -> dict:
+    valid, errors = [], []
+    for sql in candidates:
+        try:
+            valid.append(validate_sql(sql, allowed_tables=allowed))
+        except SQLValidationError as exc:
+            errors.append(str(exc))
+    valid = list(dict.fromkeys(valid))
+    if not valid:
+        logger.warning("sql_validation_failed", error=errors[0], candidates=len(candidates))
+        return {"sql_valid": False, "validation_error": errors[0], "candidates": []}
+    return {"sql": valid[0], "candidates": valid, "sql_valid": True, "validation_error": None}
+
+
 async def summarize_node(state: AgentState) -> dict:
     """Template-based summary — no extra LLM call."""
     answer = format_results_as_answer(
@@ -100,6 +180,10 @@ async def summarize_node(state: AgentState) -> dict:
     return {"answer": answer}
 
 
+def route_after_template(state: AgentState) -> str:
+    return "validate" if state.get("template") else "generate"
+
+
 def should_retry_validation(state: AgentState) -> str:
     if state.get("sql_valid"):
         return "execute"
@@ -1,24 +1,50 @@
+from collections.abc import AsyncIterator
+
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.agents.graph import build_graph
+from app.agents.graph import get_compiled_graph
 from app.agents.state import AgentState
 from app.logging_config import get_logger
+from app.telemetry import AGENT_RUNS, span
 
 logger = get_logger(__name__)
 
 
-async def run_agent(question: str, session: AsyncSession) -> AgentState:
-    graph = build_graph(session)
-    initial: AgentState = {
+def _initial_state(question: str) -> AgentState:
+    return {
         "question": question,
         "retry_count": 0,
         "llm_calls": 0,
     }
-    result = await graph.ainvoke(initial)
+
+
+def _log_complete(result: AgentState) -> None:
+    succeeded = result.get("sql_valid") and not result.get("execution_error")
+    AGENT_RUNS.labels("success" if succeeded else "failed").inc()
     logger.info(
         "agent_complete",
         llm_calls=result.get("llm_calls", 0),
         retries=result.get("retry_count", 0),
         has_sql=bool(result.get("sql")),
     )
+
+
+async def run_agent(question: str, session: AsyncSession) -> AgentState:
+    graph = get_compiled_graph()
+    with span("agent"):
+        result = await graph.ainvoke(_initial_state(question), config={"configurable": {"session": session}})
+    _log_complete(result)
     return result
+
+
+async def stream_agent(question: str, session: AsyncSession) -> AsyncIterator[tuple[str, dict, AgentState]]:
+    """Yield ``(node, update, state_so_far)`` as each graph node finishes."""
+    graph = get_compiled_graph()
+    state = _initial_state(question)
+    config = {"configurable": {"session": session}}
+    async for chunk in graph.astream(state, config=config, stream_mode="updates"):
+        for node, update in chunk.items():
+            update = update or {}
+            state = {**state, **update}
+            yield node, update, state
+    _log_complete(state)
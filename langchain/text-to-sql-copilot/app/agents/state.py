@@ -5,12 +5,17 @@ class AgentState(TypedDict, total=False):
     question: str
     relevant_tables: list[str]
     schema_context: str
+    template: str | None
+    template_slots: dict[str, Any]
     sql: str
+    candidates: list[str]  # speculative mode: distinct SQL from one generate_sql round
+    candidates_generated: int
     sql_valid: bool
     validation_error: str | None
     execution_error: str | None
     columns: list[str]
-    rows: list[dict[str, Any]]
+    rows: list[list[Any]]  # aligned with columns
+    table_versions: dict[str, int]  # of the tables the SQL read, snapshotted before it ran
     answer: str
     retry_count: int
     llm_calls: int
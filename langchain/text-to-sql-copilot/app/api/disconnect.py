@@ -0,0 +1,105 @@
+"""Stop work for clients that have gone away.
+
+Without this, a closed tab keeps its LLM call and SQL running until
+``statement_timeout``, holding a pooled connection the whole time. The request
+body is already read when a route runs, so the next ASGI message is
+``http.disconnect``: it arrives when the client goes away (or once the response
+is sent). ``cancel_on_disconnect`` races the route's work against that message
+and cancels the work if the client leaves first. Cancelling the task that is
+awaiting asyncpg sends Postgres a cancel request for the running statement. The
+session's rollback waits for it, and the connection goes back to the pool
+clean. ``stream_until_disconnect`` does the same for streaming responses.
+"""
+
+import asyncio
+from collections.abc import AsyncGenerator, AsyncIterator, Awaitable
+from contextlib import suppress
+from typing import Any, TypeVar
+
+from starlette.types import Receive
+
+from app.logging_config import get_logger
+from app.telemetry import REQUESTS_CANCELLED
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class ClientDisconnected(Exception):
+    """The client closed the connection before the answer was ready."""
+
+    # nginx's "client closed request"; the ledger records it as the request's status.
+    status_code = 499
+
+
+async def wait_for_disconnect(receive: Receive) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _cancel(task: asyncio.Future) -> None:
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+
+
+async def cancel_on_disconnect(receive: Receive, work: Awaitable[T], endpoint: str) -> T:
+    """Result of ``work``, or ``ClientDisconnected`` after cancelling it if the client leaves first."""
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        if not task.done():
+            await _cancel(task)
+        await _cancel(watcher)
+    if task.cancelled() and watcher.done() and not watcher.cancelled():
+        REQUESTS_CANCELLED.labels(endpoint).inc()
+        logger.info("request_cancelled", endpoint=endpoint)
+        raise ClientDisconnected()
+    return task.result()
+
+
+async def _pump(events: AsyncGenerator[Any, None], queue: asyncio.Queue) -> None:
+    try:
+        async for event in events:
+            await queue.put(event)
+    finally:
+        # Cancelled while waiting on the queue: close the generator so its own cleanup
+        # (sessions, cursors, the ledger record) runs now rather than at garbage collection.
+        await events.aclose()
+
+
+async def stream_until_disconnect(
+    receive: Receive, events: AsyncGenerator[T, None], endpoint: str
+) -> AsyncIterator[T]:
+    """Relay ``events``, produced in a task of their own, and cancel that task when the client leaves.
+
+    The queue holds one event, so the producer never runs more than one event ahead of the client.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+    producer = asyncio.ensure_future(_pump(events, queue))
+    watcher = asyncio.ensure_future(wait_for_disconnect(receive))
+    getter = None
+    try:
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            await asyncio.wait({getter, watcher, producer}, return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                await _cancel(getter)
+            if not getter.cancelled():
+                yield getter.result()
+                continue
+            if watcher.done():
+                REQUESTS_CANCELLED.labels(endpoint).inc()
+                logger.info("request_cancelled", endpoint=endpoint)
+                return
+            while not queue.empty():
+                yield queue.get_nowait()
+            producer.result()  # re-raise what stopped the producer, if anything
+            return
+    finally:
+        for task in (getter, watcher, producer):
+            if task is not None and not task.done():
+                await _cancel(task)
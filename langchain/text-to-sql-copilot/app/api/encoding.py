@@ -0,0 +1,9 @@
+from typing import Any
+
+import orjson
+
+from app.services.json_codec import json_default
+
+
+def dumps(value: Any) -> bytes:
+    return orjson.dumps(value, default=json_default, option=orjson.OPT_NON_STR_KEYS)
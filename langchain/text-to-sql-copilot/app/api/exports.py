@@ -0,0 +1,123 @@
+"""Streaming encoders for /export: CSV, NDJSON and (with ``pyarrow``) Parquet.
+
+Each encoder takes the column names and an async iterator of row batches and
+yields one chunk of bytes per batch, so a response never holds more than one
+batch of encoded rows. ``ExportResponse`` streams them and releases the
+export's cursor however the response ends.
+"""
+
+import csv
+import io
+from collections.abc import AsyncIterator, Awaitable, Callable, Sequence
+from typing import Any
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.api.encoding import dumps
+
+Batches = AsyncIterator[Sequence[Sequence[Any]]]
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+async def encode_csv(columns: list[str], batches: Batches) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def encode_ndjson(columns: list[str], batches: Batches) -> AsyncIterator[bytes]:
+    """One JSON object per row, encoded like ``/query`` records (Decimal as string)."""
+    async for batch in batches:
+        yield b"".join(dumps(dict(zip(columns, row))) + b"\n" for row in batch)
+
+
+class _Drain(io.RawIOBase):
+    """Write-only file whose bytes are taken out after every row group."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+async def encode_parquet(columns: list[str], batches: Batches) -> AsyncIterator[bytes]:
+    """One Parquet row group per batch; column types are inferred from the first batch."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _Drain()
+    writer = None
+    async for batch in batches:
+        arrays = [pa.array([row[i] for row in batch]) for i in range(len(columns))]
+        table = pa.Table.from_arrays(arrays, names=columns)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+        else:
+            table = table.cast(writer.schema)
+        writer.write_table(table)
+        yield sink.take()
+    if writer is None:
+        writer = pq.ParquetWriter(sink, pa.schema([(name, pa.null()) for name in columns]))
+    writer.close()
+    yield sink.take()
+
+
+ENCODERS = {"csv": encode_csv, "ndjson": encode_ndjson, "parquet": encode_parquet}
+
+
+def check_export_format(fmt: str) -> None:
+    """Parquet needs pyarrow; checked before the query starts, since a streamed response cannot fail cleanly."""
+    if fmt == "parquet":
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError as exc:
+            detail = "Parquet export needs pyarrow installed on the server."
+            raise HTTPException(status_code=406, detail=detail) from exc
+
+
+class ExportResponse(StreamingResponse):
+    """StreamingResponse that awaits ``on_close`` when the response ends, however it ends.
+
+    The cursor and its export slot are taken before the response starts. A body iterator
+    that never ran has no ``finally`` of its own, and Starlette's ``background`` only runs
+    after a complete send. So without this, a client that leaves before the first chunk, or
+    a failed response start, would hold both until garbage collection.
+    """
+
+    def __init__(self, content: AsyncIterator[bytes], on_close: Callable[[], Awaitable[None]], **kwargs: Any) -> None:
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.on_close()
@@ -0,0 +1,77 @@
+"""Response formats for /query results.
+
+Rows travel through the agent, the result cache and the answer cache as arrays
+aligned with ``columns``. The default ``records`` format expands them into one
+object per row (the original ``QueryResponse`` shape); the compact formats skip
+that and are encoded straight from the arrays with orjson:
+
+- ``rows``    — ``columns`` once, ``rows`` as arrays
+- ``columns`` — ``columns`` once, ``data`` as one array per column
+- ``arrow``   — Arrow IPC stream; response metadata in the schema metadata (needs ``pyarrow``)
+
+Clients pick one with ``?format=`` or the ``Accept`` header.
+"""
+
+from collections.abc import Sequence
+from typing import Any
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+from app.api.encoding import dumps
+
+ROWS_MEDIA_TYPE = "application/vnd.copilot.rows+json"
+COLUMNS_MEDIA_TYPE = "application/vnd.copilot.columns+json"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+MEDIA_TYPES = {
+    "records": "application/json",
+    "rows": ROWS_MEDIA_TYPE,
+    "columns": COLUMNS_MEDIA_TYPE,
+    "arrow": ARROW_MEDIA_TYPE,
+}
+_FORMAT_BY_MEDIA_TYPE = {media_type: name for name, media_type in MEDIA_TYPES.items() if name != "records"}
+
+
+def records(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> list[dict[str, Any]]:
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def negotiate_format(requested: str | None, accept: str | None) -> str:
+    """``?format=`` wins; otherwise the first compact media type in ``Accept``; otherwise records."""
+    if requested:
+        if requested not in MEDIA_TYPES:
+            detail = f"Unknown format {requested!r}; use one of {', '.join(MEDIA_TYPES)}."
+            raise HTTPException(status_code=400, detail=detail)
+        return requested
+    for part in (accept or "").split(","):
+        name = _FORMAT_BY_MEDIA_TYPE.get(part.split(";", 1)[0].strip().lower())
+        if name:
+            return name
+    return "records"
+
+
+def _arrow_ipc(metadata: dict[str, Any], columns: list[str], rows: list[Sequence[Any]]) -> bytes:
+    try:
+        import pyarrow as pa
+    except ImportError as exc:
+        raise HTTPException(status_code=406, detail="Arrow responses need pyarrow installed on the server.") from exc
+
+    arrays = [pa.array([row[i] for row in rows]) for i in range(len(columns))]
+    table = pa.Table.from_arrays(arrays, names=columns).replace_schema_metadata({"copilot": dumps(metadata)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def compact_response(fmt: str, metadata: dict[str, Any], columns: list[str], rows: list[Sequence[Any]]) -> Response:
+    """Encode a result in one of the compact formats without building per-row objects."""
+    if fmt == "arrow":
+        return Response(content=_arrow_ipc(metadata, columns, rows), media_type=ARROW_MEDIA_TYPE)
+    if fmt == "columns":
+        data = [list(col) for col in zip(*rows)] if rows else [[] for _ in columns]
+        body = {**metadata, "format": fmt, "columns": columns, "data": data}
+    else:
+        body = {**metadata, "format": fmt, "columns": columns, "rows": rows}
+    return Response(content=dumps(body), media_type=MEDIA_TYPES[fmt])
@@ -1,93 +1,378 @@
-from fastapi import APIRouter, Depends, Header, HTTPException
+import asyncio
+import hmac
+import time
+from collections.abc import AsyncIterator
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy import text
+from sqlalchemy.exc import DataError, ProgrammingError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.agents.runner import run_agent
-from app.api.schemas import CacheStatsResponse, HealthResponse, QueryRequest, QueryResponse
+from app.agents.runner import run_agent, stream_agent
+from app.api.schemas import (
+    BatchQueryItem,
+    BatchQueryRequest,
+    BatchQueryResponse,
+    BatchStats,
+    CacheStatsResponse,
+    CatalogRefreshResponse,
+    CatalogResponse,
+    ExportRequest,
+    HealthResponse,
+    QueryRequest,
+    QueryResponse,
+    SlowQueriesResponse,
+    TableVersionsResponse,
+    TableVersionUpdate,
+    TopQuestionsResponse,
+    ViewsResponse,
+    ViewSyncResponse,
+)
+from app.api.disconnect import ClientDisconnected, cancel_on_disconnect, stream_until_disconnect
+from app.api.exports import ENCODERS, EXPORT_MEDIA_TYPES, ExportResponse, check_export_format
+from app.api.formats import compact_response, negotiate_format, records
+from app.api.streaming import node_events, sse_event
 from app.config import get_settings
-from app.db.engine import get_db_session
+from app.db.datasources import DEFAULT_DATASOURCE, current_datasource, use_datasource
+from app.db.engine import SessionLocal, current_engine, get_datasources, get_db_session
 from app.logging_config import get_logger
-from app.services.cache_factory import get_query_cache
-from app.services.query_cache import is_cacheable_response
+from app.services.admission import LLMOverloaded, client_key, llm_client
+from app.services.cache_factory import (
+    get_cache_backend,
+    get_export_slots,
+    get_export_tokens,
+    get_inflight_queries,
+    get_ledger,
+    get_plan_cache,
+    get_result_cache,
+    get_semantic_cache,
+    get_table_versions,
+    get_view_advisor,
+    get_warmup_status,
+)
+from app.services.catalog import Catalog, get_catalog, refresh_catalog, save_snapshot, set_catalog
+from app.services.exporter import ExportCursor, InvalidExportToken, export_sql
+from app.services.ledger import TOP_QUESTION_ORDER, Ledger, record_request
+from app.services.query_cache import is_cacheable_response, make_cache_key
+from app.services.query_planner import QueryPlanRejected, check_plan
+from app.services.sql_validator import SQLValidationError, extract_tables, validate_sql
+from app.services.view_advisor import sync_views_once, view_reader
 
 logger = get_logger(__name__)
 settings = get_settings()
 
 router = APIRouter()
 
+# Same floor as the request models' min_length, applied again after stripping whitespace.
+MIN_QUESTION_LENGTH = 3
+
+# Names a DATASOURCES entry for routes without a body field; absent means the default source.
+DatasourceHeader = Annotated[str | None, Header(alias="X-Datasource")]
+AdminTokenHeader = Annotated[str | None, Header(alias="X-Admin-Token")]
+
+
+def _response_fields(
+    question: str, payload: dict, cached: bool = False, similarity: float | None = None
+) -> dict:
+    """Everything in a QueryResponse except the result set."""
+    return {
+        "question": question,
+        "sql": payload.get("sql"),
+        "answer": payload.get("answer", "No answer generated."),
+        "relevant_tables": payload.get("relevant_tables", []),
+        "llm_calls": payload.get("llm_calls", 0),
+        "retry_count": payload.get("retry_count", 0),
+        "candidates_generated": payload.get("candidates_generated", 0),
+        "template": payload.get("template"),
+        "cached": cached,
+        "similarity": similarity,
+        "export_token": _export_token(payload),
+    }
 
-def _to_response(question: str, payload: dict, cached: bool = False) -> QueryResponse:
+
+def _export_token(payload: dict) -> str | None:
+    """Signed handle on the answer's SQL for /export; issued per response, so cached answers get a fresh expiry."""
+    if not is_cacheable_response(payload):
+        return None
+    return get_export_tokens().issue(payload["sql"], current_datasource())
+
+
+def _to_response(
+    question: str, payload: dict, cached: bool = False, similarity: float | None = None
+) -> QueryResponse:
+    columns = payload.get("columns", [])
     return QueryResponse(
-        question=question,
-        sql=payload.get("sql"),
-        answer=payload.get("answer", "No answer generated."),
-        columns=payload.get("columns", []),
-        rows=payload.get("rows", []),
-        relevant_tables=payload.get("relevant_tables", []),
-        llm_calls=payload.get("llm_calls", 0),
-        retry_count=payload.get("retry_count", 0),
-        cached=cached,
+        **_response_fields(question, payload, cached, similarity),
+        columns=columns,
+        rows=records(columns, payload.get("rows", [])),
     )
 
 
+def _render(
+    question: str, payload: dict, fmt: str, cached: bool = False, similarity: float | None = None
+) -> QueryResponse | Response:
+    """QueryResponse for the default format; compact formats are encoded straight from the cached arrays."""
+    if fmt == "records":
+        return _to_response(question, payload, cached, similarity)
+    fields = _response_fields(question, payload, cached, similarity)
+    return compact_response(fmt, fields, payload.get("columns", []), payload.get("rows", []))
+
+
+async def _is_fresh(payload: dict) -> bool:
+    """A cached answer is stale once any table it read has a newer version (shared by workers with Redis)."""
+    snapshot = payload.get("table_versions", {})
+    backend = get_cache_backend()
+    await backend.sync_versions(snapshot)
+    return backend.versions.is_current(snapshot)
+
+
+def _datasource(header: str | None, field: str | None = None) -> str:
+    """Datasource named by the request body, else by the X-Datasource header, else the default."""
+    name = field or header or DEFAULT_DATASOURCE
+    if name not in get_datasources():
+        raise HTTPException(status_code=400, detail=f"Unknown datasource: {name}")
+    return name
+
+
+def _check_table(table: str) -> None:
+    if table not in get_catalog().allowed_tables:
+        raise HTTPException(status_code=404, detail=f"Unknown table: {table}")
+
+
 @router.get("/health", response_model=HealthResponse)
-async def health(session: AsyncSession = Depends(get_db_session)) -> HealthResponse:
+async def health(
+    response: Response,
+    session: AsyncSession = Depends(get_db_session),
+    x_datasource: DatasourceHeader = None,
+) -> HealthResponse:
+    """503 with status "warming" while the startup warm-up runs, so load balancers wait for a warm cache."""
     db_status = "ok"
-    try:
-        await session.execute(text("SELECT 1"))
-    except Exception:
-        db_status = "error"
+    with use_datasource(_datasource(x_datasource)):
+        try:
+            await session.execute(text("SELECT 1"))
+        except Exception:
+            db_status = "error"
+    status = "ok" if db_status == "ok" else "degraded"
+    warmup = get_warmup_status()
+    if warmup.running:
+        status = "warming"
+        response.status_code = 503
     return HealthResponse(
-        status="ok" if db_status == "ok" else "degraded",
+        status=status,
         database=db_status,
         llm_provider=settings.llm_provider,
+        warmup=warmup.as_dict() if warmup.total else None,
+    )
+
+
+def _catalog_response(catalog: Catalog) -> CatalogResponse:
+    return CatalogResponse(
+        version=catalog.version,
+        source=catalog.source,
+        introspected_at=catalog.introspected_at,
+        tables=sorted(catalog.tables),
     )
 
 
+@router.get("/catalog", response_model=CatalogResponse)
+async def catalog_info(x_datasource: DatasourceHeader = None) -> CatalogResponse:
+    with use_datasource(_datasource(x_datasource)):
+        return _catalog_response(get_catalog())
+
+
+@router.post("/catalog/refresh", response_model=CatalogRefreshResponse)
+async def refresh_catalog_route(
+    session: AsyncSession = Depends(get_db_session),
+    x_datasource: DatasourceHeader = None,
+) -> CatalogRefreshResponse:
+    """Re-introspect tables whose columns, comment or foreign keys changed, and rewrite the snapshot."""
+    with use_datasource(_datasource(x_datasource)):
+        source = get_datasources().current()
+        try:
+            catalog, diff = await refresh_catalog(session, source.catalog_schema, get_catalog())
+        except Exception as exc:
+            logger.exception("catalog_refresh_failed", datasource=source.name)
+            raise HTTPException(status_code=503, detail="Catalog introspection failed.") from exc
+        if not catalog.tables:
+            raise HTTPException(status_code=503, detail=f"No tables found in schema {source.catalog_schema!r}.")
+        save_snapshot(catalog, source.snapshot_path, source.catalog_schema)
+        set_catalog(catalog)
+        catalog = get_catalog()
+    logger.info(
+        "catalog_refreshed", datasource=source.name, version=catalog.version, **{k: len(v) for k, v in diff.items()}
+    )
+    return CatalogRefreshResponse(**_catalog_response(catalog).model_dump(), **diff)
+
+
 @router.get("/cache/stats", response_model=CacheStatsResponse)
-async def cache_stats() -> CacheStatsResponse:
-    stats = get_query_cache().stats()
-    return CacheStatsResponse(enabled=settings.cache_enabled, **stats)
+async def cache_stats(x_datasource: DatasourceHeader = None) -> CacheStatsResponse:
+    with use_datasource(_datasource(x_datasource)):
+        stats = await get_cache_backend().stats()
+        semantic = get_semantic_cache().stats() if settings.semantic_cache_enabled else None
+        result = get_result_cache().stats() if settings.result_cache_enabled else None
+        plan = get_plan_cache().stats() if settings.plan_guard_enabled else None
+        coalesced = get_inflight_queries().stats()["coalesced"]
+    return CacheStatsResponse(
+        enabled=settings.cache_enabled, semantic=semantic, result=result, plan=plan, coalesced=coalesced, **stats
+    )
 
 
 @router.delete("/cache")
-async def clear_cache() -> dict:
-    """Clear cached query responses (useful after schema/data changes)."""
-    removed = get_query_cache().clear()
-    logger.info("cache_cleared", entries=removed)
+async def clear_cache(x_datasource: DatasourceHeader = None) -> dict:
+    """Clear one datasource's cached query responses (useful after schema/data changes)."""
+    name = _datasource(x_datasource)
+    with use_datasource(name):
+        removed = await get_cache_backend().clear() + get_semantic_cache().clear() + get_result_cache().clear()
+        get_plan_cache().clear()
+    logger.info("cache_cleared", datasource=name, entries=removed)
     return {"cleared": removed}
 
 
-@router.post("/query", response_model=QueryResponse)
-async def query(
-    body: QueryRequest,
-    session: AsyncSession = Depends(get_db_session),
-    x_cache_bypass: str | None = Header(default=None, alias="X-Cache-Bypass"),
-) -> QueryResponse:
-    question = body.question.strip()
-    if len(question) > settings.max_question_length:
-        raise HTTPException(status_code=400, detail="Question too long.")
+@router.get("/cache/tables", response_model=TableVersionsResponse)
+async def table_versions(x_datasource: DatasourceHeader = None) -> TableVersionsResponse:
+    with use_datasource(_datasource(x_datasource)):
+        backend = get_cache_backend()
+        tables = sorted(get_catalog().allowed_tables)
+        await backend.sync_versions(tables)
+    return TableVersionsResponse(versions={table: backend.versions.get(table) for table in tables})
 
-    bypass = x_cache_bypass is not None and x_cache_bypass.lower() in {"1", "true", "yes"}
-    cache = get_query_cache()
 
-    if settings.cache_enabled and not bypass:
-        cached_payload = cache.get(question)
-        if cached_payload is not None:
-            logger.info("cache_hit", question=question[:100])
-            return _to_response(question, cached_payload, cached=True)
+@router.post("/cache/tables/{table}/invalidate", response_model=TableVersionsResponse)
+async def invalidate_table(table: str, x_datasource: DatasourceHeader = None) -> TableVersionsResponse:
+    """Bump a table's version — cached answers and results that read it become stale."""
+    with use_datasource(_datasource(x_datasource)):
+        _check_table(table)
+        version = await get_cache_backend().bump_version(table)
+    logger.info("table_invalidated", table=table, version=version)
+    return TableVersionsResponse(versions={table: version})
+
+
+@router.put("/cache/tables/{table}/version", response_model=TableVersionsResponse)
+async def set_table_version(
+    table: str, body: TableVersionUpdate, x_datasource: DatasourceHeader = None
+) -> TableVersionsResponse:
+    """Set a table's version explicitly (e.g. from a loader that tracks its own batch ids)."""
+    with use_datasource(_datasource(x_datasource)):
+        _check_table(table)
+        version = await get_cache_backend().set_version(table, body.version)
+    logger.info("table_version_set", table=table, version=version)
+    return TableVersionsResponse(versions={table: version})
+
+
+@router.get("/views", response_model=ViewsResponse)
+async def views() -> ViewsResponse:
+    """Hot aggregates advised as materialized views, and the active views with the time they saved."""
+    return ViewsResponse(
+        enabled=settings.matview_advisor_enabled,
+        auto_create=settings.matview_auto_create,
+        **get_view_advisor().stats(),
+    )
 
-    logger.info("query_received", question=question[:100], cache_bypass=bypass)
 
+def _require_admin(token: str | None) -> None:
+    if not settings.admin_token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is empty).")
+    if token is None or not hmac.compare_digest(token.encode(), settings.admin_token.encode()):
+        raise HTTPException(status_code=403, detail="Missing or invalid X-Admin-Token.")
+
+
+@router.post("/views/sync", response_model=ViewSyncResponse)
+async def sync_views_route(x_admin_token: AdminTokenHeader = None) -> ViewSyncResponse:
+    """Run the maintenance pass now: create advised views (if MATVIEW_AUTO_CREATE) and refresh active ones."""
+    _require_admin(x_admin_token)
+    if not settings.matview_advisor_enabled:
+        raise HTTPException(status_code=409, detail="MATVIEW_ADVISOR_ENABLED is off.")
     try:
-        result = await run_agent(question, session)
-    except ValueError as exc:
-        raise HTTPException(status_code=503, detail=str(exc)) from exc
+        result = await sync_views_once(
+            settings.matview_owner_url,
+            get_view_advisor(),
+            get_table_versions(DEFAULT_DATASOURCE),
+            create=settings.matview_auto_create,
+            reader=view_reader(settings.database_url),
+            statement_timeout=settings.matview_statement_timeout_seconds,
+        )
     except Exception as exc:
-        logger.exception("agent_error")
-        raise HTTPException(status_code=500, detail="Agent failed to process question.") from exc
+        logger.exception("matview_sync_failed")
+        raise HTTPException(status_code=503, detail="Materialized view maintenance failed.") from exc
+    return ViewSyncResponse(**result)
+
+
+def _ledger() -> Ledger:
+    ledger = get_ledger()
+    if ledger is None:
+        raise HTTPException(status_code=409, detail="The request ledger is off (LEDGER_PATH is empty).")
+    return ledger
+
+
+@router.get("/admin/slow-queries", response_model=SlowQueriesResponse)
+async def slow_queries(
+    window_minutes: int = Query(default=60, ge=1),
+    limit: int = Query(default=20, ge=1, le=500),
+) -> SlowQueriesResponse:
+    """p50/p95/p99 of total, DB and LLM time over the window, and the slowest requests with their stage times."""
+    ledger = _ledger()
+    await ledger.flush()
+    report = await ledger.slow_queries(time.time() - window_minutes * 60, limit)
+    return SlowQueriesResponse(window_minutes=window_minutes, dropped=ledger.dropped, **report)
+
+
+@router.get("/admin/top-questions", response_model=TopQuestionsResponse)
+async def top_questions(
+    window_minutes: int = Query(default=1440, ge=1),
+    limit: int = Query(default=20, ge=1, le=500),
+    order: str = Query(default="total_ms"),
+) -> TopQuestionsResponse:
+    """Questions costing the most total time (or ``order=llm_ms|tokens|count``) over the window."""
+    if order not in TOP_QUESTION_ORDER:
+        raise HTTPException(status_code=400, detail=f"order must be one of: {', '.join(TOP_QUESTION_ORDER)}")
+    ledger = _ledger()
+    await ledger.flush()
+    questions = await ledger.top_questions(time.time() - window_minutes * 60, limit, order)
+    return TopQuestionsResponse(window_minutes=window_minutes, order=order, questions=questions)
 
-    payload = {
+
+async def _lookup_cached(question: str) -> QueryResponse | None:
+    """Exact-key tier first, then the semantic tier; stale entries count as misses."""
+    hit = await _lookup_cached_payload(question)
+    return _to_response(question, hit[0], cached=True, similarity=hit[1]) if hit else None
+
+
+async def _lookup_cached_payload(question: str) -> tuple[dict, float | None] | None:
+    """(payload, similarity) of a fresh cached answer, or None."""
+    return await _resolve_cached(question, await get_cache_backend().get(question))
+
+
+async def _lookup_cached_many(questions: list[str]) -> list[QueryResponse | None]:
+    """Batch form of ``_lookup_cached``: one ``get_many`` round trip for the exact tier."""
+    payloads = await get_cache_backend().get_many(questions)
+    responses = []
+    for question, payload in zip(questions, payloads):
+        hit = await _resolve_cached(question, payload)
+        responses.append(_to_response(question, hit[0], cached=True, similarity=hit[1]) if hit else None)
+    return responses
+
+
+async def _resolve_cached(question: str, cached_payload: dict | None) -> tuple[dict, float | None] | None:
+    if cached_payload is not None and not await _is_fresh(cached_payload):
+        await get_cache_backend().delete(question)
+        cached_payload = None
+    if cached_payload is not None:
+        logger.info("cache_hit", question=question[:100])
+        return cached_payload, None
+
+    if settings.semantic_cache_enabled:
+        match = get_semantic_cache().lookup(question)
+        if match is not None and await _is_fresh(match[0]):
+            similar_payload, similarity = match
+            logger.info("semantic_cache_hit", question=question[:100], similarity=similarity)
+            return similar_payload, similarity
+    return None
+
+
+def _payload_from_result(result: dict) -> dict:
+    return {
         "sql": result.get("sql"),
         "answer": result.get("answer", "No answer generated."),
         "columns": result.get("columns", []),
@@ -95,10 +380,361 @@ async def query(
         "relevant_tables": result.get("relevant_tables", []),
         "llm_calls": result.get("llm_calls", 0),
         "retry_count": result.get("retry_count", 0),
+        "candidates_generated": result.get("candidates_generated", 0),
+        "template": result.get("template"),
     }
 
-    if settings.cache_enabled and is_cacheable_response(payload):
-        cache.set(question, payload)
-        logger.info("cache_store", question=question[:100])
 
-    return _to_response(question, payload, cached=False)
+async def _store_payload(question: str, payload: dict, table_versions: dict[str, int] | None) -> None:
+    """``table_versions`` is the agent's snapshot from before the SQL ran; without one, the current versions."""
+    if not (settings.cache_enabled and is_cacheable_response(payload)):
+        return
+    backend = get_cache_backend()
+    if table_versions is None:
+        tables = extract_tables(payload["sql"])
+        await backend.sync_versions(tables)
+        table_versions = backend.versions.snapshot(tables)
+    payload["table_versions"] = table_versions
+    await backend.set(question, payload)
+    if settings.semantic_cache_enabled:
+        get_semantic_cache().add(question, payload)
+    logger.info("cache_store", question=question[:100])
+
+
+async def _answer_question(question: str, session: AsyncSession) -> dict:
+    result = await run_agent(question, session)
+    payload = _payload_from_result(result)
+    await _store_payload(question, payload, result.get("table_versions"))
+    return payload
+
+
+def _clean_question(body: QueryRequest) -> str:
+    return _check_question(body.question)
+
+
+def _check_question(question: str) -> str:
+    question = question.strip()
+    if len(question) < MIN_QUESTION_LENGTH:
+        raise HTTPException(status_code=400, detail="Question too short.")
+    if len(question) > settings.max_question_length:
+        raise HTTPException(status_code=400, detail="Question too long.")
+    return question
+
+
+def _is_bypass(header: str | None) -> bool:
+    return header is not None and header.lower() in {"1", "true", "yes"}
+
+
+def _client_key(request: Request) -> str:
+    peer = request.client.host if request.client else None
+    return client_key(
+        request.headers, peer, settings.client_api_key_header, settings.client_ip_header, settings.trusted_proxy_count
+    )
+
+
+def _overloaded(exc: LLMOverloaded) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(exc), headers={"Retry-After": str(exc.retry_after)})
+
+
+@router.post("/query", response_model=QueryResponse)
+async def query(
+    body: QueryRequest,
+    request: Request,
+    session: AsyncSession = Depends(get_db_session),
+    x_cache_bypass: str | None = Header(default=None, alias="X-Cache-Bypass"),
+    response_format: str | None = Query(default=None, alias="format"),
+    accept: str | None = Header(default=None),
+    x_datasource: DatasourceHeader = None,
+) -> QueryResponse | Response:
+    """Answer one question. ``?format=rows|columns|arrow`` (or a matching Accept) returns a compact result.
+
+    The ``datasource`` field (or X-Datasource header) picks the database. If the client
+    disconnects first, the agent run (LLM call and SQL) is cancelled.
+    """
+    question = _clean_question(body)
+    bypass = _is_bypass(x_cache_bypass)
+    fmt = negotiate_format(response_format, accept)
+    with use_datasource(_datasource(x_datasource, body.datasource)):
+        answer = _query(question, session, bypass, fmt, _client_key(request))
+        try:
+            return await cancel_on_disconnect(request.receive, answer, "query")
+        except ClientDisconnected:
+            return Response(status_code=ClientDisconnected.status_code)
+
+
+async def _query(
+    question: str, session: AsyncSession, bypass: bool, fmt: str, client: str
+) -> QueryResponse | Response:
+    with record_request(get_ledger(), question) as record, llm_client(client):
+        if settings.cache_enabled and not bypass:
+            hit = await _lookup_cached_payload(question)
+            if hit is not None:
+                record.cache = "hit" if hit[1] is None else "semantic"
+                record.fill(hit[0], cached=True)
+                return _render(question, hit[0], fmt, cached=True, similarity=hit[1])
+
+        logger.info("query_received", question=question[:100], cache_bypass=bypass)
+        record.cache = "bypass" if bypass else "miss"
+
+        try:
+            if bypass:
+                payload = await _answer_question(question, session)
+            else:
+                # Concurrent identical questions share one agent run instead of each paying for it.
+                # It runs on its own session: the request that started it may disconnect before the others.
+                payload, shared = await get_inflight_queries().do(
+                    make_cache_key(question), lambda: _answer_with_own_session(question)
+                )
+                if shared:
+                    record.cache = "coalesced"
+                    logger.info("query_coalesced", question=question[:100])
+        except LLMOverloaded as exc:
+            logger.warning("query_rejected", question=question[:100], retry_after=exc.retry_after)
+            raise _overloaded(exc) from exc
+        except ValueError as exc:
+            raise HTTPException(status_code=503, detail=str(exc)) from exc
+        except Exception as exc:
+            logger.exception("agent_error")
+            raise HTTPException(status_code=500, detail="Agent failed to process question.") from exc
+
+        record.fill(payload, cached=record.cache == "coalesced")
+        return _render(question, payload, fmt)
+
+
+async def _stream_query_events(question: str, bypass: bool, client: str, datasource: str) -> AsyncIterator[bytes]:
+    # Runs after the handler returns, so it enters the datasource itself.
+    with use_datasource(datasource), record_request(get_ledger(), question) as record, llm_client(client):
+        if settings.cache_enabled and not bypass:
+            hit = await _lookup_cached_payload(question)
+            if hit is not None:
+                record.cache = "hit" if hit[1] is None else "semantic"
+                record.fill(hit[0], cached=True)
+                cached = _to_response(question, hit[0], cached=True, similarity=hit[1])
+                yield sse_event("done", cached.model_dump(mode="json"))
+                return
+
+        logger.info("query_stream_received", question=question[:100], cache_bypass=bypass)
+        record.cache = "bypass" if bypass else "miss"
+        state: dict = {}
+        try:
+            # Own session: the stream outlives the request handler.
+            async with SessionLocal() as session:
+                async for node, update, state in stream_agent(question, session):
+                    for event, data in node_events(node, update, state, settings.stream_row_batch_size):
+                        yield sse_event(event, data)
+        except LLMOverloaded as exc:
+            record.status = 429
+            yield sse_event("error", {"status": 429, "detail": str(exc), "retry_after": exc.retry_after})
+            return
+        except ValueError as exc:
+            record.status = 503
+            yield sse_event("error", {"status": 503, "detail": str(exc)})
+            return
+        except Exception:
+            logger.exception("agent_stream_error")
+            record.status = 500
+            yield sse_event("error", {"status": 500, "detail": "Agent failed to process question."})
+            return
+
+        payload = _payload_from_result(state)
+        record.fill(payload)
+        await _store_payload(question, payload, state.get("table_versions"))
+        yield sse_event("done", _to_response(question, payload, cached=False).model_dump(mode="json"))
+
+
+@router.post("/query/stream")
+async def query_stream(
+    body: QueryRequest,
+    request: Request,
+    x_cache_bypass: str | None = Header(default=None, alias="X-Cache-Bypass"),
+    x_datasource: DatasourceHeader = None,
+) -> StreamingResponse:
+    """Same as /query, but emits Server-Sent Events as each agent step completes.
+
+    Events: schema, sql, validation, retry, execution_error, rows (batched), answer,
+    then done (the full QueryResponse) or error. Cache hits emit done immediately.
+    The agent run is cancelled if the client disconnects mid-stream.
+    """
+    question = _clean_question(body)
+    datasource = _datasource(x_datasource, body.datasource)
+    events = _stream_query_events(question, _is_bypass(x_cache_bypass), _client_key(request), datasource)
+    return StreamingResponse(
+        stream_until_disconnect(request.receive, events, "query_stream"),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _answer_with_own_session(question: str) -> dict:
+    async with SessionLocal() as session:
+        return await _answer_question(question, session)
+
+
+async def warm_question(question: str) -> None:
+    """Startup warm-up: make sure ``question`` has a fresh cached answer."""
+    question = _check_question(question)
+    if await _lookup_cached_payload(question) is not None:
+        return
+    await get_inflight_queries().do(make_cache_key(question), lambda: _answer_with_own_session(question))
+
+
+@router.post("/query/batch", response_model=BatchQueryResponse)
+async def query_batch(
+    body: BatchQueryRequest,
+    request: Request,
+    x_cache_bypass: str | None = Header(default=None, alias="X-Cache-Bypass"),
+    x_datasource: DatasourceHeader = None,
+) -> BatchQueryResponse | Response:
+    """Answer many questions in one call.
+
+    Duplicates (after normalization) are answered once, cache hits skip the agent, and
+    misses run concurrently — at most BATCH_MAX_CONCURRENCY at a time, each on its own
+    pooled session. One failing question does not fail the batch. All questions run
+    against one datasource.
+    """
+    if len(body.questions) > settings.batch_max_questions:
+        raise HTTPException(status_code=400, detail=f"At most {settings.batch_max_questions} questions per batch.")
+    questions = [_check_question(q) for q in body.questions]
+    with use_datasource(_datasource(x_datasource, body.datasource)):
+        return await _query_batch(questions, request, _is_bypass(x_cache_bypass))
+
+
+async def _query_batch(questions: list[str], request: Request, bypass: bool) -> BatchQueryResponse | Response:
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(settings.batch_max_concurrency)
+
+    unique: dict[str, str] = {}
+    for question in questions:
+        unique.setdefault(make_cache_key(question), question)
+
+    cached: dict[str, QueryResponse | None] = dict.fromkeys(unique)
+    if settings.cache_enabled and not bypass:
+        cached.update(zip(unique, await _lookup_cached_many(list(unique.values()))))
+
+    async def resolve(key: str, question: str) -> tuple[QueryResponse | None, str | None, float, bool]:
+        if cached[key] is not None:
+            return cached[key], None, 0.0, True
+        start = time.perf_counter()
+        with record_request(get_ledger(), question) as record:
+            record.cache = "bypass" if bypass else "miss"
+            try:
+                async with semaphore:
+                    if bypass:
+                        payload = await _answer_with_own_session(question)
+                    else:
+                        payload, shared = await get_inflight_queries().do(
+                            key, lambda: _answer_with_own_session(question)
+                        )
+                        if shared:
+                            record.cache = "coalesced"
+            except LLMOverloaded as exc:
+                record.status = 429
+                return None, str(exc), (time.perf_counter() - start) * 1000, False
+            except ValueError as exc:
+                record.status = 503
+                return None, str(exc), (time.perf_counter() - start) * 1000, False
+            except Exception:
+                logger.exception("batch_question_failed", question=question[:100])
+                record.status = 500
+                return None, "Agent failed to process question.", (time.perf_counter() - start) * 1000, False
+            record.fill(payload, cached=record.cache == "coalesced")
+        return _to_response(question, payload), None, (time.perf_counter() - start) * 1000, False
+
+    async def resolve_all() -> list[tuple[QueryResponse | None, str | None, float, bool]]:
+        with llm_client(_client_key(request)):
+            return await asyncio.gather(*(resolve(k, q) for k, q in unique.items()))
+
+    try:
+        outcomes = dict(zip(unique, await cancel_on_disconnect(request.receive, resolve_all(), "query_batch")))
+    except ClientDisconnected:
+        return Response(status_code=ClientDisconnected.status_code)
+
+    results = []
+    for question in questions:
+        response, error, elapsed_ms, _ = outcomes[make_cache_key(question)]
+        if response is not None and response.question != question:
+            response = response.model_copy(update={"question": question})
+        results.append(
+            BatchQueryItem(question=question, response=response, error=error, elapsed_ms=round(elapsed_ms, 2))
+        )
+
+    executed = [r for r, err, _, hit in outcomes.values() if r is not None and not hit]
+    stats = BatchStats(
+        total=len(questions),
+        unique=len(unique),
+        cache_hits=sum(hit for *_, hit in outcomes.values()),
+        executed=len(executed),
+        errors=sum(err is not None for _, err, _, _ in outcomes.values()),
+        llm_calls=sum(r.llm_calls for r in executed),
+        retries=sum(r.retry_count for r in executed),
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+    )
+    logger.info("batch_complete", **stats.model_dump())
+    return BatchQueryResponse(results=results, stats=stats)
+
+
+async def _export_chunks(fmt: str, columns: list[str], cursor: ExportCursor) -> AsyncIterator[bytes]:
+    try:
+        async for chunk in ENCODERS[fmt](columns, cursor.batches()):
+            yield chunk
+    finally:
+        # Closing the encoder does not close the batches generator inside it; release the connection here.
+        await cursor.close()
+
+
+async def _plan_export(sql: str) -> str:
+    """Export SQL checked against the export plan budgets (LIMIT possibly tightened), or ``QueryPlanRejected``."""
+    if not settings.plan_guard_enabled:
+        return sql
+    async with SessionLocal() as session:
+        return await check_plan(
+            session,
+            sql,
+            max_cost=settings.export_max_cost,
+            max_plan_rows=settings.export_max_plan_rows,
+            row_cap=settings.export_max_rows,
+        )
+
+
+@router.post("/export")
+async def export(body: ExportRequest, request: Request) -> ExportResponse:
+    """Stream the full result of a /query answer, named by its ``export_token``, as CSV, NDJSON or Parquet.
+
+    Only SQL this server answered can be exported. It is validated again, planned against
+    EXPORT_MAX_COST / EXPORT_MAX_PLAN_ROWS, then read through a server-side cursor in
+    EXPORT_BATCH_ROWS batches, as the read-only role, under EXPORT_TIMEOUT_SECONDS.
+    At most EXPORT_MAX_CONCURRENCY exports stream at once per process; the rest get 429.
+    """
+    check_export_format(body.format)
+    try:
+        sql, datasource = get_export_tokens().open(body.export_token)
+    except InvalidExportToken as exc:
+        raise HTTPException(status_code=403, detail=str(exc)) from exc
+    with use_datasource(_datasource(None, datasource)):
+        try:
+            sql = await _plan_export(export_sql(validate_sql(sql), settings.export_max_rows, keep_limit=body.keep_limit))
+        except (SQLValidationError, QueryPlanRejected) as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        engine = current_engine()
+
+    slots = get_export_slots()
+    if not slots.try_acquire():
+        raise HTTPException(status_code=429, detail="Too many exports in progress; try again later.")
+    cursor = ExportCursor(
+        engine, sql, settings.export_batch_rows, settings.export_timeout_seconds, on_close=slots.release
+    )
+    try:
+        columns = await cursor.open()
+    except (DataError, ProgrammingError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc.orig)[:300]) from exc
+    except Exception as exc:
+        logger.exception("export_failed")
+        raise HTTPException(status_code=503, detail="Export query failed.") from exc
+
+    logger.info("export_started", format=body.format, datasource=datasource, sql_preview=sql[:120])
+    return ExportResponse(
+        stream_until_disconnect(request.receive, _export_chunks(body.format, columns, cursor), "export"),
+        cursor.close,
+        media_type=EXPORT_MEDIA_TYPES[body.format],
+        headers={"Content-Disposition": f'attachment; filename="export.{body.format}"'},
+    )
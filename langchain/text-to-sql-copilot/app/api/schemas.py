@@ -1,10 +1,28 @@
-from typing import Any
+from typing import Annotated, Any, Literal
 
 from pydantic import BaseModel, Field
 
 
 class QueryRequest(BaseModel):
     question: str = Field(..., min_length=3, max_length=500, examples=["What was total revenue by country?"])
+    # A name from DATASOURCES; overrides the X-Datasource header, default source when both are absent
+    datasource: str | None = None
+
+
+class ExportRequest(BaseModel):
+    # The export_token of a /query answer; it names the answer's SQL and datasource
+    export_token: str = Field(..., min_length=1)
+    format: Literal["csv", "ndjson", "parquet"] = "csv"
+    # False: the trailing LIMIT (generated SQL always has one) is lifted to EXPORT_MAX_ROWS
+    keep_limit: bool = False
+
+
+class BatchQueryRequest(BaseModel):
+    # Each question is bounded like QueryRequest.question
+    questions: list[Annotated[str, Field(min_length=3, max_length=500)]] = Field(
+        ..., min_length=1, examples=[["Total revenue?", "Revenue by country"]]
+    )
+    datasource: str | None = None
 
 
 class QueryResponse(BaseModel):
@@ -16,17 +34,189 @@ class QueryResponse(BaseModel):
     relevant_tables: list[str] = Field(default_factory=list)
     llm_calls: int = 0
     retry_count: int = 0
+    candidates_generated: int = 0
+    template: str | None = None
     cached: bool = False
+    similarity: float | None = None
+    # Handle for POST /export on this answer's SQL; None when no SQL ran
+    export_token: str | None = None
+
+
+class BatchQueryItem(BaseModel):
+    question: str
+    response: QueryResponse | None = None
+    error: str | None = None
+    elapsed_ms: float
+
+
+class BatchStats(BaseModel):
+    total: int
+    unique: int
+    cache_hits: int
+    executed: int
+    errors: int
+    llm_calls: int
+    retries: int
+    elapsed_ms: float
+
+
+class BatchQueryResponse(BaseModel):
+    results: list[BatchQueryItem]
+    stats: BatchStats
+
+
+class SemanticCacheStats(BaseModel):
+    size: int
+    max_size: int
+    ttl_seconds: int
+    threshold: float
+    hits: int = 0
+    misses: int = 0
+    hit_ratio: float = 0.0
+
+
+class ResultCacheStats(BaseModel):
+    size: int
+    max_size: int
+    ttl_seconds: int
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expired: int = 0
+    stale: int = 0
+    hit_ratio: float = 0.0
 
 
 class CacheStatsResponse(BaseModel):
     enabled: bool
+    backend: str = "memory"
     size: int
     max_size: int
     ttl_seconds: int
+    shards: int = 1
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expired: int = 0
+    hit_ratio: float = 0.0
+    coalesced: int = 0
+    semantic: SemanticCacheStats | None = None
+    result: ResultCacheStats | None = None
+    plan: ResultCacheStats | None = None
+
+
+class TableVersionUpdate(BaseModel):
+    version: int = Field(..., ge=0)
+
+
+class TableVersionsResponse(BaseModel):
+    versions: dict[str, int]
+
+
+class CatalogResponse(BaseModel):
+    version: str
+    source: str
+    introspected_at: float | None = None
+    tables: list[str]
+
+
+class CatalogRefreshResponse(CatalogResponse):
+    added: list[str] = Field(default_factory=list)
+    removed: list[str] = Field(default_factory=list)
+    changed: list[str] = Field(default_factory=list)
+
+
+class WarmupInfo(BaseModel):
+    total: int
+    done: int
+    failed: int
+    running: bool
+    elapsed_ms: float
 
 
 class HealthResponse(BaseModel):
     status: str
     database: str
     llm_provider: str
+    warmup: WarmupInfo | None = None
+
+
+class AdvisedView(BaseModel):
+    name: str
+    sql: str
+    tables: list[str]
+    calls: int
+    mean_ms: float
+    total_ms: float
+
+
+class ActiveView(BaseModel):
+    name: str
+    sql: str
+    tables: list[str]
+    baseline_ms: float
+    hits: int
+    saved_ms: float
+    refreshed_at: float | None = None
+    fresh: bool
+
+
+class ViewsResponse(BaseModel):
+    enabled: bool
+    auto_create: bool
+    advised: list[AdvisedView] = Field(default_factory=list)
+    active: list[ActiveView] = Field(default_factory=list)
+    saved_ms: float = 0.0
+
+
+class ViewSyncResponse(BaseModel):
+    created: list[str] = Field(default_factory=list)
+    refreshed: list[str] = Field(default_factory=list)
+    failed: list[str] = Field(default_factory=list)
+    skipped: bool = False
+
+
+class LedgerEntry(BaseModel):
+    ts: float
+    datasource: str = "default"
+    question: str
+    sql: str | None = None
+    row_count: int
+    total_ms: float
+    db_ms: float
+    llm_ms: float
+    input_tokens: int
+    output_tokens: int
+    llm_calls: int
+    retries: int
+    cache: str
+    status: int
+
+
+class SlowQueriesResponse(BaseModel):
+    window_minutes: int
+    requests: int
+    percentiles: dict[str, dict[str, float]]
+    slowest: list[LedgerEntry] = Field(default_factory=list)
+    dropped: int = 0
+
+
+class TopQuestion(BaseModel):
+    datasource: str = "default"
+    question_hash: str
+    question: str
+    requests: int
+    total_ms: float
+    avg_ms: float
+    max_ms: float
+    db_ms: float
+    llm_ms: float
+    tokens: int
+    cache_hits: int
+    errors: int
+
+
+class TopQuestionsResponse(BaseModel):
+    window_minutes: int
+    order: str
+    questions: list[TopQuestion] = Field(default_factory=list)
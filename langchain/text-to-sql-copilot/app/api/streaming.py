@@ -0,0 +1,44 @@
+"""Server-Sent Events for /query/stream — one event per finished LangGraph node."""
+
+from typing import Any
+
+from app.agents.state import AgentState
+from app.api.encoding import dumps
+from app.api.formats import records
+
+
+def sse_event(event: str, data: Any) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+def node_events(node: str, update: dict, state: AgentState, row_batch_size: int) -> list[tuple[str, Any]]:
+    """Translate a node's state update into client-facing events."""
+    if node == "link_schema":
+        return [("schema", {"tables": update.get("relevant_tables", [])})]
+    if node == "match_template":
+        if not update.get("template"):
+            return []
+        return [("sql", {"sql": update.get("sql"), "attempt": 1, "template": update["template"]})]
+    if node == "generate_sql":
+        event = {"sql": update.get("sql"), "attempt": state.get("retry_count", 0) + 1}
+        if update.get("candidates"):
+            event["candidates"] = update["candidates"]
+        return [("sql", event)]
+    if node == "validate_sql":
+        return [("validation", {"valid": bool(update.get("sql_valid")), "error": update.get("validation_error")})]
+    if node == "increment_retry":
+        reason = state.get("validation_error") or state.get("execution_error")
+        return [("retry", {"retry_count": update.get("retry_count", 0), "reason": reason})]
+    if node == "execute_sql":
+        if update.get("execution_error"):
+            return [("execution_error", {"error": update["execution_error"]})]
+        columns = update.get("columns", [])
+        rows = update.get("rows", [])
+        batches = [
+            ("rows", {"columns": columns, "offset": i, "rows": records(columns, rows[i : i + row_batch_size])})
+            for i in range(0, len(rows), row_batch_size)
+        ]
+        return batches or [("rows", {"columns": columns, "offset": 0, "rows": []})]
+    if node in ("summarize", "fail"):
+        return [("answer", {"answer": update.get("answer", ""), "success": node == "summarize"})]
+    return []
@@ -0,0 +1,194 @@
+"""Named datasources: one database, engine pool, catalog and cache namespace each.
+
+``DATABASE_URL`` is the ``default`` source and ``DATASOURCES`` adds more (e.g. one
+per regional sales database). The source a request runs against is held in a
+ContextVar (``use_datasource``), so the catalog, the cache getters and the
+routing session (``app.db.engine``) resolve to that source without a name being
+passed through the agent. Each source has its own pool and caches, so traffic to
+one region never waits on another region's connections or cache locks.
+
+Engines are created on first use. ``run_idle_reaper`` disposes an engine whose
+pool has had nothing checked out for ``DATASOURCE_IDLE_SECONDS``; the next
+request to that source creates a new one.
+"""
+
+import asyncio
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app.config import Settings
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_DATASOURCE = "default"
+
+_current: ContextVar[str] = ContextVar("copilot_datasource", default=DEFAULT_DATASOURCE)
+
+
+class UnknownDatasource(KeyError):
+    """No datasource with this name is configured."""
+
+
+def current_datasource() -> str:
+    return _current.get()
+
+
+@contextmanager
+def use_datasource(name: str) -> Iterator[None]:
+    """Run the enclosed code (and tasks it starts) against datasource ``name``."""
+    token = _current.set(name)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+class Datasource:
+    """A named database with a lazily created engine."""
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        *,
+        catalog_schema: str = "public",
+        allowed_tables: frozenset[str] | None = None,
+        cache_namespace: str = "copilot",
+        snapshot_path: Path | None = None,
+        pool_size: int = 5,
+        max_overflow: int = 10,
+    ) -> None:
+        self.name = name
+        self.url = url
+        self.catalog_schema = catalog_schema
+        self.allowed_tables = allowed_tables
+        self.cache_namespace = cache_namespace
+        self.snapshot_path = snapshot_path
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.last_used = time.monotonic()
+        self._engine: AsyncEngine | None = None
+
+    @property
+    def engine(self) -> AsyncEngine:
+        """The source's engine, created on first use; every access counts as use for the idle reaper."""
+        self.last_used = time.monotonic()
+        if self._engine is None:
+            self._engine = create_async_engine(
+                self.url, pool_pre_ping=True, pool_size=self.pool_size, max_overflow=self.max_overflow
+            )
+            logger.info("datasource_engine_created", datasource=self.name)
+        return self._engine
+
+    @property
+    def connected(self) -> bool:
+        return self._engine is not None
+
+    def pool_stats(self) -> dict[str, int]:
+        """Connections in use and idle, and how far past ``pool_size`` the pool has overflowed (for /metrics)."""
+        if self._engine is None:
+            return {"checked_out": 0, "idle": 0, "overflow": 0, "size": 0}
+        pool = self._engine.pool
+        return {
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "size": pool.size(),
+        }
+
+    def is_idle(self, idle_seconds: float, now: float | None = None) -> bool:
+        if self._engine is None or self._engine.pool.checkedout():
+            return False
+        return (time.monotonic() if now is None else now) - self.last_used >= idle_seconds
+
+    async def dispose(self) -> None:
+        # Detach first: a request arriving while the pool closes gets a fresh engine, not this one.
+        engine, self._engine = self._engine, None
+        if engine is not None:
+            await engine.dispose()
+
+
+class DatasourceRegistry:
+    """The configured datasources, by name."""
+
+    def __init__(self, sources: list[Datasource]) -> None:
+        self._sources = {source.name: source for source in sources}
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "DatasourceRegistry":
+        snapshot = Path(settings.catalog_snapshot_path)
+        sources = [
+            Datasource(
+                DEFAULT_DATASOURCE,
+                settings.database_url,
+                catalog_schema=settings.catalog_schema,
+                cache_namespace=settings.cache_namespace,
+                snapshot_path=snapshot,
+                pool_size=settings.database_pool_size,
+                max_overflow=settings.database_max_overflow,
+            )
+        ]
+        for name, config in settings.datasources.items():
+            if name == DEFAULT_DATASOURCE:
+                raise ValueError(f"DATASOURCES may not redefine {DEFAULT_DATASOURCE!r}; that is DATABASE_URL")
+            sources.append(
+                Datasource(
+                    name,
+                    config.url,
+                    catalog_schema=config.catalog_schema,
+                    allowed_tables=frozenset(config.allowed_tables) or None,
+                    cache_namespace=config.cache_namespace or f"{settings.cache_namespace}:{name}",
+                    snapshot_path=snapshot.with_name(f"{snapshot.stem}.{name}{snapshot.suffix}"),
+                    pool_size=config.pool_size,
+                    max_overflow=config.max_overflow,
+                )
+            )
+        return cls(sources)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._sources
+
+    def __iter__(self) -> Iterator[Datasource]:
+        return iter(self._sources.values())
+
+    def names(self) -> list[str]:
+        return list(self._sources)
+
+    def get(self, name: str) -> Datasource:
+        try:
+            return self._sources[name]
+        except KeyError:
+            raise UnknownDatasource(name) from None
+
+    def current(self) -> Datasource:
+        return self.get(current_datasource())
+
+    def pool_stats(self) -> dict[str, dict[str, int]]:
+        return {source.name: source.pool_stats() for source in self}
+
+    async def dispose_idle(self, idle_seconds: float, now: float | None = None) -> list[str]:
+        """Dispose engines idle for ``idle_seconds``; returns the names of the sources disposed."""
+        disposed = [source for source in self if source.is_idle(idle_seconds, now)]
+        for source in disposed:
+            await source.dispose()
+            logger.info("datasource_engine_disposed", datasource=source.name, idle_seconds=idle_seconds)
+        return [source.name for source in disposed]
+
+    async def run_idle_reaper(self, idle_seconds: float) -> None:
+        """Background task: check for idle engines a few times per idle period."""
+        while True:
+            await asyncio.sleep(max(idle_seconds / 4, 1.0))
+            try:
+                await self.dispose_idle(idle_seconds)
+            except Exception as exc:
+                logger.warning("datasource_dispose_failed", error=str(exc))
+
+    async def close(self) -> None:
+        for source in self:
+            await source.dispose()
@@ -1,19 +1,39 @@
 from collections.abc import AsyncGenerator
+from functools import lru_cache
 
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
 
 from app.config import get_settings
+from app.db.datasources import DatasourceRegistry
 
-settings = get_settings()
 
-engine = create_async_engine(
-    settings.database_url,
-    pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=10,
-)
+@lru_cache
+def get_datasources() -> DatasourceRegistry:
+    return DatasourceRegistry.from_settings(get_settings())
 
-SessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+def current_engine() -> AsyncEngine:
+    """Engine of the request's datasource (``use_datasource``), created on first use."""
+    return get_datasources().current().engine
+
+
+class RoutingSession(Session):
+    """Binds to the current datasource when a statement first needs a connection, not when the session opens.
+
+    Sessions injected before the route picks a source (``Depends(get_db_session)``) still reach the right database.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        return current_engine().sync_engine
+
+
+SessionLocal = async_sessionmaker(class_=AsyncSession, sync_session_class=RoutingSession, expire_on_commit=False)
+
+
+def pool_stats() -> dict[str, dict[str, int]]:
+    """Per datasource: connections in use and idle, and overflow past ``pool_size`` (for /metrics)."""
+    return get_datasources().pool_stats()
 
 
 async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
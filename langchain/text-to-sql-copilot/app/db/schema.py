@@ -70,7 +70,52 @@ INSERT INTO order_items (order_id, product_id, quantity, unit_price) VALUES
     (7, 3, 4, 349.00);
 """
 
-# Table metadata for schema linking (no LLM cost)
+# Materialized views created by the view advisor (app/services/view_advisor.py); never part of the catalog.
+MATVIEW_PREFIX = "copilot_mv_"
+
+# Statement-level triggers bump a per-table version and NOTIFY the app, which
+# invalidates cached results that read the table (see app/services/table_versions.py).
+TABLE_VERSIONS_DDL = """
+CREATE TABLE IF NOT EXISTS copilot_table_versions (
+    table_name  TEXT PRIMARY KEY,
+    version     BIGINT NOT NULL DEFAULT 0,
+    updated_at  TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION copilot_bump_table_version() RETURNS trigger AS $$
+DECLARE
+    new_version BIGINT;
+BEGIN
+    INSERT INTO copilot_table_versions (table_name, version, updated_at)
+    VALUES (TG_TABLE_NAME, 1, NOW())
+    ON CONFLICT (table_name) DO UPDATE
+        SET version = copilot_table_versions.version + 1, updated_at = NOW()
+    RETURNING version INTO new_version;
+    PERFORM pg_notify('copilot_table_changes', TG_TABLE_NAME || ':' || new_version);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['customers', 'products', 'orders', 'order_items'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS copilot_table_version ON %I', t);
+        EXECUTE format(
+            'CREATE TRIGGER copilot_table_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+            'FOR EACH STATEMENT EXECUTE FUNCTION copilot_bump_table_version()',
+            t
+        );
+    END LOOP;
+END
+$$;
+"""
+
+# Table metadata for schema linking (no LLM cost). foreign_keys drive join
+# bridging and the prompt's relationship lines; companions are always linked
+# together (revenue needs orders + items); notes are added to the prompt.
+# With CATALOG_SOURCE=introspect this is an overlay on the introspected catalog.
 TABLE_CATALOG = {
     "customers": {
         "description": "Customer accounts with name, email, country",
@@ -86,17 +131,108 @@ TABLE_CATALOG = {
         "description": "Customer orders with date and status",
         "columns": ["id", "customer_id", "order_date", "status"],
         "keywords": ["order", "purchase", "transaction", "date", "status"],
+        "foreign_keys": {"customer_id": "customers.id"},
+        "companions": ["order_items"],
     },
     "order_items": {
         "description": "Line items per order: product, quantity, unit price",
         "columns": ["id", "order_id", "product_id", "quantity", "unit_price"],
         "keywords": ["revenue", "sales", "quantity", "line item", "total", "amount", "sold"],
+        "foreign_keys": {"order_id": "orders.id", "product_id": "products.id"},
+        "companions": ["orders"],
+        "notes": ["Revenue = SUM(order_items.quantity * order_items.unit_price)"],
     },
 }
 
-RELATIONSHIPS = """
-- orders.customer_id -> customers.id
-- order_items.order_id -> orders.id
-- order_items.product_id -> products.id
-- Revenue = SUM(order_items.quantity * order_items.unit_price)
-"""
+# Zero-LLM fast path: questions matching one of these shapes get pre-vetted SQL
+# without calling the model (see app/services/query_templates.py). Slots only
+# resolve to the vocabularies below, bounded integers and calendar periods.
+SALES_FROM = (
+    "order_items oi JOIN orders o ON o.id = oi.order_id "
+    "JOIN customers c ON c.id = o.customer_id JOIN products p ON p.id = oi.product_id"
+)
+
+# Order counts start from orders: SALES_FROM inner-joins the line items, which
+# would drop orders that have none.
+ORDERS_FROM = (
+    "orders o JOIN customers c ON c.id = o.customer_id "
+    "LEFT JOIN order_items oi ON oi.order_id = o.id LEFT JOIN products p ON p.id = oi.product_id"
+)
+
+# "from" overrides SALES_FROM for a metric.
+TEMPLATE_METRICS = {
+    "revenue": {
+        "sql": "SUM(oi.quantity * oi.unit_price)",
+        "aliases": ["revenue", "sales", "total revenue", "total sales", "sales revenue"],
+    },
+    "units_sold": {
+        "sql": "SUM(oi.quantity)",
+        "aliases": ["units sold", "units", "quantity sold", "quantity", "items sold"],
+    },
+    "order_count": {
+        "sql": "COUNT(DISTINCT o.id)",
+        "from": ORDERS_FROM,
+        "aliases": ["orders", "order count", "number of orders", "count of orders"],
+    },
+}
+
+TEMPLATE_DIMENSIONS = {
+    "country": {"sql": "c.country", "aliases": ["country", "countries", "customer country"]},
+    "customer": {"sql": "c.name", "aliases": ["customer", "customers", "client", "clients"]},
+    "product": {"sql": "p.name", "aliases": ["product", "products"]},
+    "category": {"sql": "p.category", "aliases": ["category", "categories", "product category", "product categories"]},
+    "status": {"sql": "o.status", "aliases": ["status", "order status"]},
+    "month": {"sql": "date_trunc('month', o.order_date)::date", "aliases": ["month", "months"], "order_by": "1"},
+}
+
+# Patterns are matched against the whole lower-cased question. {lead}, {metric},
+# {dimension} and {period} expand to shared fragments; {period} is optional unless
+# the template's SQL needs {period_filter}.
+QUERY_TEMPLATES = [
+    {
+        "name": "top_n_by_metric",
+        "pattern": (
+            r"{lead}(?:top|best|highest) (?:(?P<n>\d+) )?(?P<dimension>{dimension}) by (?P<metric>{metric}){period}"
+        ),
+        "sql": (
+            "SELECT {dimension} AS {dimension_name}, {metric} AS {metric_name} FROM {sales_from} {where} "
+            "GROUP BY 1 ORDER BY 2 DESC LIMIT {n}"
+        ),
+        "defaults": {"n": 10},
+        "tables": ["order_items", "orders", "customers", "products"],
+    },
+    {
+        "name": "best_selling",
+        "pattern": r"{lead}(?:top|best)(?: |-)selling (?:(?P<n>\d+) )?(?P<dimension>{dimension}){period}",
+        "sql": (
+            "SELECT {dimension} AS {dimension_name}, {metric} AS {metric_name} FROM {sales_from} {where} "
+            "GROUP BY 1 ORDER BY 2 DESC LIMIT {n}"
+        ),
+        "defaults": {"n": 10, "metric": "units_sold"},
+        "tables": ["order_items", "orders", "customers", "products"],
+    },
+    {
+        "name": "metric_by_dimension",
+        "pattern": r"{lead}(?P<metric>{metric}) (?:by|per|for each|broken down by) (?P<dimension>{dimension}){period}",
+        "sql": (
+            "SELECT {dimension} AS {dimension_name}, {metric} AS {metric_name} FROM {sales_from} {where} "
+            "GROUP BY 1 ORDER BY {order_by} LIMIT {limit}"
+        ),
+        "tables": ["order_items", "orders", "customers", "products"],
+    },
+    {
+        "name": "orders_in_period",
+        "pattern": r"(?:list |show(?: me)? )?(?:all )?(?:the )?orders(?: placed)?{period}",
+        "sql": (
+            "SELECT o.id, o.order_date, o.status, c.name AS customer FROM orders o "
+            "JOIN customers c ON c.id = o.customer_id WHERE {period_filter} ORDER BY o.order_date LIMIT {limit}"
+        ),
+        "tables": ["orders", "customers"],
+    },
+    {
+        "name": "metric_in_period",
+        "pattern": r"(?:{lead}|how many )(?P<metric>{metric}){period}",
+        "sql": "SELECT {metric} AS {metric_name} FROM {sales_from} WHERE {period_filter}",
+        "tables": ["order_items", "orders", "customers", "products"],
+    },
+]
@@ -0,0 +1,150 @@
+"""Record/replay chat model for reproducible agent runs (``LLM_PROVIDER=replay``).
+
+In ``record`` mode prompts go to a live provider (``LLM_CASSETTE_RECORD_PROVIDER``)
+and each reply is written to the cassette (``LLM_CASSETTE_PATH``) under a hash of
+the prompt, together with its token usage and measured latency. Prompts already on
+the cassette are replayed rather than paid for again. In ``replay`` mode nothing
+leaves the process: replies come from the cassette after a simulated delay of the
+recorded latency times ``LLM_CASSETTE_LATENCY_SCALE`` plus ``LLM_CASSETTE_LATENCY_MS``.
+A prompt that is not on the cassette raises ``CassetteMiss``, so a prompt change
+shows up as a failure rather than a silent live call.
+
+The cassette is JSON with sorted keys, so re-recording after a prompt change
+produces a reviewable diff. Each recorded reply rewrites the file through a
+unique temp file and ``os.replace``; async callers do it in a worker thread.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import ConfigDict
+
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+CASSETTE_FORMAT = 1
+
+
+class CassetteMiss(LookupError):
+    """Replay mode met a prompt that was never recorded."""
+
+
+def prompt_key(messages: list[BaseMessage]) -> str:
+    """Hash of the message types and contents, in order."""
+    canonical = json.dumps([[m.type, m.content] for m in messages], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:32]
+
+
+class Cassette:
+    """Prompt-hash -> recorded reply, persisted to a JSON file."""
+
+    def __init__(self, path: Path, entries: dict[str, dict[str, Any]] | None = None) -> None:
+        self.path = path
+        self.entries = entries or {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Path) -> "Cassette":
+        """The cassette at ``path``; an empty one if the file does not exist yet."""
+        try:
+            data = json.loads(path.read_text())
+        except FileNotFoundError:
+            return cls(path)
+        if data.get("format") != CASSETTE_FORMAT:
+            raise ValueError(f"{path}: unsupported cassette format {data.get('format')!r}")
+        return cls(path, data["entries"])
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        return self.entries.get(key)
+
+    def put(self, key: str, entry: dict[str, Any]) -> None:
+        """Add an entry and rewrite the file atomically, so an interrupted recording keeps what it has."""
+        with self._lock:
+            self.entries[key] = entry
+            data = json.dumps({"format": CASSETTE_FORMAT, "entries": self.entries}, indent=2, sort_keys=True)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # A unique temp file per write: two recorders sharing a cassette must not clobber each other's file.
+            with tempfile.NamedTemporaryFile(
+                "w", dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp", delete=False
+            ) as tmp:
+                tmp.write(data)
+            try:
+                os.replace(tmp.name, self.path)
+            except OSError:
+                os.unlink(tmp.name)
+                raise
+
+    async def aput(self, key: str, entry: dict[str, Any]) -> None:
+        """``put`` in a worker thread, keeping the serialization and file write off the event loop."""
+        await asyncio.to_thread(self.put, key, entry)
+
+
+class CassetteChatModel(BaseChatModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    cassette: Cassette
+    # Set in record mode: where prompts missing from the cassette go
+    live: BaseChatModel | None = None
+    latency_scale: float = 1.0
+    latency_ms: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def _recorded(self, messages: list[BaseMessage]) -> tuple[str, dict[str, Any] | None]:
+        key = prompt_key(messages)
+        entry = self.cassette.get(key)
+        if entry is None and self.live is None:
+            raise CassetteMiss(f"prompt {key} is not on cassette {self.cassette.path}; re-record it")
+        return key, entry
+
+    def _delay(self, entry: dict[str, Any]) -> float:
+        return max(entry.get("latency_ms", 0.0) * self.latency_scale + self.latency_ms, 0.0) / 1000
+
+    def _entry(self, key: str, messages: list[BaseMessage], reply: BaseMessage, elapsed: float) -> dict[str, Any]:
+        entry = {
+            "content": reply.content,
+            "usage": dict(getattr(reply, "usage_metadata", None) or {}),
+            "latency_ms": round(elapsed * 1000, 1),
+            "prompt_tail": str(messages[-1].content)[-200:] if messages else "",
+        }
+        logger.info("cassette_recorded", key=key, latency_ms=entry["latency_ms"])
+        return entry
+
+    def _result(self, entry: dict[str, Any]) -> ChatResult:
+        message = AIMessage(content=entry["content"], usage_metadata=entry["usage"] or None)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        key, entry = self._recorded(messages)
+        if entry is None:
+            start = time.perf_counter()
+            reply = self.live.invoke(messages, stop=stop, **kwargs)
+            entry = self._entry(key, messages, reply, time.perf_counter() - start)
+            self.cassette.put(key, entry)
+            return self._result(entry)
+        time.sleep(self._delay(entry))
+        return self._result(entry)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        key, entry = self._recorded(messages)
+        if entry is None:
+            start = time.perf_counter()
+            reply = await self.live.ainvoke(messages, stop=stop, **kwargs)
+            entry = self._entry(key, messages, reply, time.perf_counter() - start)
+            await self.cassette.aput(key, entry)
+            return self._result(entry)
+        await asyncio.sleep(self._delay(entry))
+        return self._result(entry)
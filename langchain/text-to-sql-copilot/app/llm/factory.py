@@ -1,3 +1,6 @@
+from functools import lru_cache
+from pathlib import Path
+
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_groq import ChatGroq
 from langchain_ollama import ChatOllama
@@ -9,6 +12,30 @@ def create_llm(settings: Settings | None = None) -> BaseChatModel:
     """Factory for cost-efficient LLM backends."""
     cfg = settings or get_settings()
 
+    if cfg.llm_provider == "replay":
+        from app.llm.cassette import Cassette, CassetteChatModel
+
+        live = None
+        if cfg.llm_cassette_mode == "record":
+            live = create_llm(cfg.model_copy(update={"llm_provider": cfg.llm_cassette_record_provider}))
+        return CassetteChatModel(
+            cassette=Cassette.load(Path(cfg.llm_cassette_path)),
+            live=live,
+            latency_scale=cfg.llm_cassette_latency_scale,
+            latency_ms=cfg.llm_cassette_latency_ms,
+        )
+
+    if cfg.llm_provider == "stub":
+        from app.llm.stub import StubChatModel, load_script
+
+        return StubChatModel(
+            script=load_script(cfg.stub_llm_script),
+            latency_ms=cfg.stub_llm_latency_ms,
+            jitter_ms=cfg.stub_llm_jitter_ms,
+            failure_rate=cfg.stub_llm_failure_rate,
+            seed=cfg.stub_llm_seed,
+        )
+
     if cfg.llm_provider == "groq":
         if not cfg.groq_api_key:
             raise ValueError("GROQ_API_KEY is required when LLM_PROVIDER=groq")
@@ -25,3 +52,9 @@ def create_llm(settings: Settings | None = None) -> BaseChatModel:
         temperature=0,
         num_predict=512,
     )
+
+
+@lru_cache
+def get_llm() -> BaseChatModel:
+    """Shared client for the configured provider — keeps one HTTP connection pool per process."""
+    return create_llm()
@@ -0,0 +1,118 @@
+"""Deterministic offline chat model for load tests (``LLM_PROVIDER=stub``).
+
+Replies with scripted SQL in the JSON shape the SQL prompt asks for, after a
+configurable delay. Questions are looked up case- and punctuation-insensitively
+in the script; anything else gets ``SELECT COUNT(*)`` from the first table in the
+schema context. With ``failure_rate`` > 0 some replies name a table that does not
+exist, so validation fails and the retry path runs. Both the delay and the
+failures are derived from a hash of (seed, question, attempt), so a given
+workload behaves the same on every run regardless of concurrency.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import Field, PrivateAttr
+
+DEFAULT_SCRIPT = {
+    "what is the total revenue": "SELECT SUM(quantity * unit_price) AS revenue FROM order_items LIMIT 100",
+    "how many customers do we have": "SELECT COUNT(*) AS customers FROM customers LIMIT 100",
+    "which customers placed the most orders": (
+        "SELECT c.name, COUNT(o.id) AS orders FROM customers c JOIN orders o ON o.customer_id = c.id "
+        "GROUP BY c.name ORDER BY orders DESC LIMIT 100"
+    ),
+    "average order value per customer": (
+        "SELECT c.name, SUM(oi.quantity * oi.unit_price) / COUNT(DISTINCT o.id) AS avg_order_value "
+        "FROM customers c JOIN orders o ON o.customer_id = c.id JOIN order_items oi ON oi.order_id = o.id "
+        "GROUP BY c.name ORDER BY avg_order_value DESC LIMIT 100"
+    ),
+    "list all products in the furniture category": (
+        "SELECT name, price FROM products WHERE category = 'Furniture' ORDER BY name LIMIT 100"
+    ),
+}
+FAILED_SQL = "SELECT * FROM stub_unknown_table LIMIT 1"
+
+_QUESTION_RE = re.compile(r"^Question: (.+)$", re.MULTILINE)
+_TABLE_RE = re.compile(r"^  (\w+)\(", re.MULTILINE)
+
+
+def normalize_question(question: str) -> str:
+    return re.sub(r"[^\w\s]", "", question.lower()).strip()
+
+
+def load_script(path: str) -> dict[str, str]:
+    """``{"question": "SELECT ..."}`` from a JSON file, merged over the built-in script."""
+    script = dict(DEFAULT_SCRIPT)
+    if path:
+        script.update(json.loads(Path(path).read_text()))
+    return {normalize_question(q): sql for q, sql in script.items()}
+
+
+class StubChatModel(BaseChatModel):
+    script: dict[str, str] = Field(default_factory=lambda: load_script(""))
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    failure_rate: float = 0.0
+    seed: int = 0
+
+    _attempts: Counter = PrivateAttr(default_factory=Counter)
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _unit(self, *parts: Any) -> float:
+        """Deterministic value in [0, 1) for the given key."""
+        digest = hashlib.blake2b(repr((self.seed, *parts)).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big") / 2**64
+
+    def _reply(self, messages: list[BaseMessage]) -> tuple[str, float]:
+        prompt = "\n".join(str(m.content) for m in messages)
+        match = _QUESTION_RE.search(prompt)
+        question = normalize_question(match.group(1)) if match else ""
+        attempt = self._attempts[question]
+        self._attempts[question] += 1
+
+        if self.failure_rate and self._unit(question, attempt, "fail") < self.failure_rate:
+            sql = FAILED_SQL
+        elif question in self.script:
+            sql = self.script[question]
+        else:
+            tables = _TABLE_RE.findall(prompt)
+            sql = f"SELECT COUNT(*) AS n FROM {tables[0] if tables else 'customers'} LIMIT 100"
+
+        delay_ms = self.latency_ms + self.jitter_ms * (2 * self._unit(question, attempt, "latency") - 1)
+        content = json.dumps({"sql": sql})
+        return content, max(delay_ms, 0.0) / 1000
+
+    def _result(self, messages: list[BaseMessage], content: str) -> ChatResult:
+        input_tokens = sum(len(str(m.content)) for m in messages) // 4
+        output_tokens = len(content) // 4
+        message = AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        content, delay = self._reply(messages)
+        time.sleep(delay)
+        return self._result(messages, content)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        content, delay = self._reply(messages)
+        await asyncio.sleep(delay)
+        return self._result(messages, content)
@@ -1,23 +1,149 @@
-from contextlib import asynccontextmanager
+import asyncio
+from collections.abc import Coroutine
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 
-from app.api.routes import router
+from app.agents.graph import get_compiled_graph
+from app.api.routes import router, warm_question
 from app.config import get_settings
-from app.logging_config import setup_logging
+from app.db.datasources import DEFAULT_DATASOURCE, use_datasource
+from app.db.engine import SessionLocal, get_datasources, pool_stats
+from app.logging_config import get_logger, setup_logging
+from app.services.cache_factory import (
+    get_cache_backend,
+    get_ledger,
+    get_plan_cache,
+    get_query_cache,
+    get_result_cache,
+    get_semantic_cache,
+    get_table_versions,
+    get_view_advisor,
+    get_warmup_status,
+)
+from app.services.cache_snapshot import load_cache_snapshot, run_snapshot_writer, save_cache_snapshot
+from app.services.cache_warmup import load_questions, warm_up
+from app.services.catalog import init_catalog
+from app.services.query_cache import run_expiry_sweeper
+from app.services.table_versions import listen_for_table_changes
+from app.services.view_advisor import run_view_maintenance, view_reader
+from app.telemetry import METRICS_CONTENT_TYPE, configure_tracing, render_metrics
 
 settings = get_settings()
+logger = get_logger(__name__)
 STATIC_DIR = Path(__file__).resolve().parent / "static"
 
 
+def _snapshot_paths() -> dict[str, Path]:
+    """One question-cache snapshot per datasource: CACHE_SNAPSHOT_PATH for the default, ``<stem>.<name><suffix>``
+    beside it for the others. Snapshots cover the per-process memory backend; Redis already outlives restarts."""
+    if not (settings.cache_snapshot_path and settings.cache_enabled and settings.cache_backend == "memory"):
+        return {}
+    path = Path(settings.cache_snapshot_path)
+    return {
+        name: path if name == DEFAULT_DATASOURCE else path.with_name(f"{path.stem}.{name}{path.suffix}")
+        for name in get_datasources().names()
+    }
+
+
+async def _warm_cache(path: Path) -> None:
+    status = get_warmup_status()
+    try:
+        questions = load_questions(path)
+    except OSError as exc:
+        logger.warning("cache_warmup_unreadable", path=str(path), error=str(exc))
+        status.running = False
+        return
+    await warm_up(questions, warm_question, settings.cache_warmup_concurrency, status)
+
+
+def _background_jobs() -> list[Coroutine]:
+    jobs: list[Coroutine] = []
+    interval = settings.cache_sweep_interval_seconds
+    datasources = get_datasources()
+    if interval > 0:
+        for name in datasources.names():
+            if settings.cache_enabled and settings.cache_backend == "memory":
+                jobs.append(run_expiry_sweeper(get_query_cache(name), interval))
+            if settings.cache_enabled and settings.semantic_cache_enabled:
+                jobs.append(run_expiry_sweeper(get_semantic_cache(name), interval))
+            if settings.result_cache_enabled:
+                jobs.append(run_expiry_sweeper(get_result_cache(name), interval))
+    if settings.cache_snapshot_interval_seconds > 0:
+        for name, snapshot in _snapshot_paths().items():
+            jobs.append(
+                run_snapshot_writer(
+                    get_query_cache(name), get_table_versions(name), snapshot, settings.cache_snapshot_interval_seconds
+                )
+            )
+    if get_ledger() is not None:
+        jobs.append(get_ledger().run())
+    if settings.table_versions_listen:
+        for source in datasources:
+            shared = settings.cache_backend == "redis"
+            publish = get_cache_backend(source.name).set_version if shared else None
+            jobs.append(listen_for_table_changes(source.url, get_table_versions(source.name), publish))
+    if settings.datasource_idle_seconds > 0:
+        jobs.append(datasources.run_idle_reaper(settings.datasource_idle_seconds))
+    if settings.matview_advisor_enabled and settings.matview_refresh_interval_seconds > 0:
+        jobs.append(
+            run_view_maintenance(
+                settings.matview_owner_url,
+                get_view_advisor(),
+                get_table_versions(DEFAULT_DATASOURCE),
+                settings.matview_refresh_interval_seconds,
+                create=settings.matview_auto_create,
+                reader=view_reader(settings.database_url),
+                statement_timeout=settings.matview_statement_timeout_seconds,
+            )
+        )
+    return jobs
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     setup_logging(settings.log_level)
+    configure_tracing(settings.otlp_endpoint, settings.otlp_service_name)
+    if settings.catalog_source == "introspect":
+        for source in get_datasources():
+            try:
+                with use_datasource(source.name):
+                    await init_catalog(SessionLocal, source.catalog_schema, source.snapshot_path)
+            except Exception as exc:
+                # Database unreachable at boot: keep the built-in catalog, POST /catalog/refresh later
+                logger.warning("catalog_introspection_failed", datasource=source.name, error=str(exc))
+    try:
+        get_compiled_graph()
+    except ValueError as exc:
+        # e.g. missing GROQ_API_KEY — keep serving /health; /query reports 503 until fixed
+        logger.warning("agent_graph_unavailable", error=str(exc))
+    snapshots = _snapshot_paths()
+    for name, snapshot in snapshots.items():
+        load_cache_snapshot(get_query_cache(name), get_table_versions(name), snapshot)
+    tasks = [asyncio.create_task(job) for job in _background_jobs()]
+    if settings.cache_warmup_path:
+        # Mark warming before the first request can reach /health
+        get_warmup_status().running = True
+        tasks.append(asyncio.create_task(_warm_cache(Path(settings.cache_warmup_path))))
     yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    ledger = get_ledger()
+    if ledger is not None:
+        await ledger.flush()
+        ledger.close()
+    for name, snapshot in snapshots.items():
+        saved = save_cache_snapshot(get_query_cache(name), get_table_versions(name), snapshot)
+        logger.info("cache_snapshot_saved", datasource=name, path=str(snapshot), entries=saved)
+    for name in get_datasources().names():
+        await get_cache_backend(name).close()
+    await get_datasources().close()
 
 
 app = FastAPI(
@@ -48,3 +174,29 @@ async def root():
     if index.exists():
         return FileResponse(index)
     return {"message": "Text-to-SQL Copilot API", "docs": "/docs"}
+
+
+def _cache_lookups() -> dict[str, tuple[int, int]]:
+    """Hits and misses per tier, summed over datasources."""
+    tiers = {
+        "semantic": (settings.semantic_cache_enabled, get_semantic_cache),
+        "result": (settings.result_cache_enabled, get_result_cache),
+        "plan": (settings.plan_guard_enabled, get_plan_cache),
+    }
+    lookups: dict[str, tuple[int, int]] = {}
+    for name in get_datasources().names():
+        counts = {"question": get_cache_backend(name).lookups()}
+        for tier, (enabled, get_cache) in tiers.items():
+            if enabled:
+                stats = get_cache(name).stats()
+                counts[tier] = (stats["hits"], stats["misses"])
+        for tier, (hits, misses) in counts.items():
+            total_hits, total_misses = lookups.get(tier, (0, 0))
+            lookups[tier] = (total_hits + hits, total_misses + misses)
+    return lookups
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """Prometheus scrape target: span latencies, LLM tokens, retries, agent outcomes, cache hit ratios, DB pools."""
+    return Response(content=render_metrics(_cache_lookups(), pool_stats()), media_type=METRICS_CONTENT_TYPE)
@@ -0,0 +1,167 @@
+"""Admission control for LLM calls: a global concurrency limit with a bounded, fair wait queue.
+
+At most ``max_concurrency`` LLM calls run at once per process. Further calls wait
+in per-client FIFO queues that are served round-robin, so one client sending a
+burst cannot starve the others. The client is bound per request with
+``llm_client`` (API key or IP, see ``client_key``); calls outside a request share
+the ``anonymous`` client. When ``max_queue`` calls are already waiting, a new call
+fails fast with ``LLMOverloaded`` (HTTP 429 with Retry-After) instead of
+queueing behind a backlog it would time out in.
+"""
+
+import asyncio
+import math
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator, Iterator, Mapping
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from app.telemetry import LLM_IN_FLIGHT, LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT_SECONDS, LLM_REJECTED
+
+ANONYMOUS = "anonymous"
+_client: ContextVar[str] = ContextVar("copilot_llm_client", default=ANONYMOUS)
+
+
+class LLMOverloaded(Exception):
+    """The LLM wait queue is full; retry after ``retry_after`` seconds."""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f"LLM is at capacity; retry in {retry_after}s.")
+        self.retry_after = retry_after
+
+
+def client_key(
+    headers: Mapping[str, str], peer: str | None, api_key_header: str, ip_header: str, trusted_proxies: int = 0
+) -> str:
+    """API key if sent, else the address the outermost trusted proxy saw, else the socket peer.
+
+    Each of the ``trusted_proxies`` proxies in front of the app appends the address it received from to
+    the forwarded-IP header, so the client is the ``trusted_proxies``-th hop from the right; anything to
+    its left was sent by the client and is ignored. With no trusted proxies the header is ignored.
+    """
+    api_key = headers.get(api_key_header) if api_key_header else None
+    if api_key:
+        return f"key:{api_key}"
+    ip = peer
+    forwarded = headers.get(ip_header) if ip_header and trusted_proxies > 0 else None
+    if forwarded:
+        hops = [hop.strip() for hop in forwarded.split(",")]
+        if len(hops) >= trusted_proxies and hops[-trusted_proxies]:
+            ip = hops[-trusted_proxies]
+    return f"ip:{ip}" if ip else ANONYMOUS
+
+
+@contextmanager
+def llm_client(key: str) -> Iterator[None]:
+    """LLM calls made inside the block (and in tasks it starts) queue as ``key``."""
+    token = _client.set(key)
+    try:
+        yield
+    finally:
+        try:
+            _client.reset(token)
+        except ValueError:
+            # Closed from another context (an abandoned streaming response).
+            pass
+
+
+class LLMLimiter:
+    def __init__(self, max_concurrency: int, max_queue: int) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.rejected = 0
+        self._active = 0
+        self._queued = 0
+        self._queues: OrderedDict[str, deque[asyncio.Future]] = OrderedDict()
+        # Smoothed seconds a call holds its slot, for the Retry-After estimate.
+        self._hold_seconds = 1.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrency > 0
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue has likely drained, at least 1."""
+        rounds = (self._queued + 1) / max(self.max_concurrency, 1)
+        return max(math.ceil(rounds * self._hold_seconds), 1)
+
+    async def acquire(self, client: str) -> None:
+        if self._active < self.max_concurrency and not self._queued:
+            self._active += 1
+            self._publish()
+            return
+        if self._queued >= self.max_queue:
+            self.rejected += 1
+            LLM_REJECTED.inc()
+            raise LLMOverloaded(self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(client, deque()).append(waiter)
+        self._queued += 1
+        self._publish()
+        start = perf_counter()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we were cancelled: pass it on.
+                self.release()
+            else:
+                self._discard(client, waiter)
+            raise
+        finally:
+            LLM_QUEUE_WAIT_SECONDS.observe(perf_counter() - start)
+
+    def release(self) -> None:
+        """Hand the slot to the next waiter, taking clients in turn; otherwise free it."""
+        while self._queues:
+            client, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._queues.move_to_end(client)
+            else:
+                del self._queues[client]
+            if not waiter.done():
+                waiter.set_result(None)
+                self._publish()
+                return
+        self._active -= 1
+        self._publish()
+
+    def _discard(self, client: str, waiter: asyncio.Future) -> None:
+        queue = self._queues.get(client)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self._queued -= 1
+            if not queue:
+                del self._queues[client]
+        self._publish()
+
+    def _publish(self) -> None:
+        LLM_IN_FLIGHT.set(self._active)
+        LLM_QUEUE_DEPTH.set(self._queued)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one LLM slot for the block, queueing as the bound client."""
+        if not self.enabled:
+            yield
+            return
+        await self.acquire(_client.get())
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * (perf_counter() - start)
+            self.release()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._active,
+            "queued": self._queued,
+            "clients_waiting": len(self._queues),
+            "rejected": self.rejected,
+        }
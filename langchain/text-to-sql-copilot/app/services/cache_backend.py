@@ -0,0 +1,89 @@
+"""Question-cache backends: per-process memory, or a Redis-protocol server shared by all workers."""
+
+from abc import ABC, abstractmethod
+from collections.abc import Iterable
+from typing import Any
+
+from app.services.query_cache import QueryCache
+from app.services.table_versions import TableVersions
+
+
+class CacheBackend(ABC):
+    """Async interface the /query routes use for the question cache.
+
+    Cached answers are checked against ``versions``, the process's table versions. A
+    backend shared by several processes also shares the versions: ``sync_versions``
+    pulls them in before a check, and bumps go to the shared copy, so every worker
+    judges a shared entry the same way.
+    """
+
+    name: str
+    versions: TableVersions
+
+    @abstractmethod
+    async def get(self, question: str) -> dict[str, Any] | None: ...
+
+    @abstractmethod
+    async def set(self, question: str, response: dict[str, Any]) -> None: ...
+
+    @abstractmethod
+    async def delete(self, question: str) -> bool: ...
+
+    @abstractmethod
+    async def clear(self) -> int: ...
+
+    @abstractmethod
+    async def stats(self) -> dict[str, Any]: ...
+
+    @abstractmethod
+    def lookups(self) -> tuple[int, int]:
+        """(hits, misses) seen by this process — cheap enough to read on every metrics scrape."""
+
+    async def get_many(self, questions: list[str]) -> list[dict[str, Any] | None]:
+        return [await self.get(q) for q in questions]
+
+    async def set_many(self, items: list[tuple[str, dict[str, Any]]]) -> None:
+        for question, response in items:
+            await self.set(question, response)
+
+    async def sync_versions(self, tables: Iterable[str]) -> None:
+        """Bring ``versions`` up to date for ``tables``; nothing to do when they are only local."""
+        return None
+
+    async def bump_version(self, table: str) -> int:
+        return self.versions.bump(table)
+
+    async def set_version(self, table: str, version: int) -> int:
+        return self.versions.set(table, version)
+
+    async def close(self) -> None:
+        return None
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Wraps the in-process sharded QueryCache (one copy per worker)."""
+
+    name = "memory"
+
+    def __init__(self, cache: QueryCache, versions: TableVersions | None = None) -> None:
+        self._cache = cache
+        self.versions = versions or TableVersions()
+
+    async def get(self, question: str) -> dict[str, Any] | None:
+        return self._cache.get(question)
+
+    async def set(self, question: str, response: dict[str, Any]) -> None:
+        self._cache.set(question, response)
+
+    async def delete(self, question: str) -> bool:
+        return self._cache.delete(question)
+
+    async def clear(self) -> int:
+        return self._cache.clear()
+
+    async def stats(self) -> dict[str, Any]:
+        return {**self._cache.stats(), "backend": self.name}
+
+    def lookups(self) -> tuple[int, int]:
+        stats = self._cache.stats()
+        return stats["hits"], stats["misses"]
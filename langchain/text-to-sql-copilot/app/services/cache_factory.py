@@ -1,10 +1,160 @@
-from functools import lru_cache
+import secrets
+from collections.abc import Callable
+from functools import lru_cache, wraps
+from pathlib import Path
+from typing import TypeVar
 
 from app.config import get_settings
+from app.db.datasources import DEFAULT_DATASOURCE, current_datasource, use_datasource
+from app.db.engine import get_datasources
+from app.services.admission import LLMLimiter
+from app.services.cache_backend import CacheBackend, MemoryCacheBackend
+from app.services.cache_warmup import WarmupStatus
+from app.services.catalog import get_catalog
+from app.services.exporter import ExportSlots, ExportTokens
+from app.services.ledger import Ledger
 from app.services.query_cache import QueryCache
+from app.services.result_cache import ResultCache, make_sql_cache_key
+from app.services.semantic_cache import SemanticCache, schema_terms
+from app.services.singleflight import SingleFlight
+from app.services.table_versions import TableVersions
+from app.services.view_advisor import ViewAdvisor
+
+T = TypeVar("T")
+
+
+def per_datasource(build: Callable[[str], T]) -> Callable[..., T]:
+    """One instance per datasource. Called without a name, returns the request's datasource's instance."""
+    cached = lru_cache(build)
+
+    @wraps(build)
+    def get(datasource: str | None = None) -> T:
+        return cached(datasource or current_datasource())
+
+    get.cache_clear = cached.cache_clear
+    return get
+
+
+@per_datasource
+def get_query_cache(datasource: str) -> QueryCache:
+    settings = get_settings()
+    return QueryCache(
+        max_size=settings.cache_max_size,
+        ttl_seconds=settings.cache_ttl_seconds,
+        shards=settings.cache_shards,
+    )
+
+
+@per_datasource
+def get_cache_backend(datasource: str) -> CacheBackend:
+    """Question cache used by the routes — shared across workers when CACHE_BACKEND=redis."""
+    settings = get_settings()
+    if settings.cache_backend == "redis":
+        from app.services.redis_cache import RedisCacheBackend
+
+        return RedisCacheBackend(
+            settings.redis_url,
+            namespace=get_datasources().get(datasource).cache_namespace,
+            ttl_seconds=settings.cache_ttl_seconds,
+            versions=get_table_versions(datasource),
+        )
+    return MemoryCacheBackend(get_query_cache(datasource), get_table_versions(datasource))
+
+
+@per_datasource
+def get_semantic_cache(datasource: str) -> SemanticCache:
+    settings = get_settings()
+    with use_datasource(datasource):
+        guard_terms = schema_terms(get_catalog().tables)
+    return SemanticCache(
+        max_size=settings.semantic_cache_max_size,
+        ttl_seconds=settings.semantic_cache_ttl_seconds,
+        threshold=settings.semantic_cache_threshold,
+        guard_terms=guard_terms,
+    )
+
+
+@per_datasource
+def get_table_versions(datasource: str) -> TableVersions:
+    return TableVersions()
+
+
+@per_datasource
+def get_result_cache(datasource: str) -> ResultCache:
+    settings = get_settings()
+    return ResultCache(
+        get_table_versions(datasource),
+        max_size=settings.result_cache_max_size,
+        ttl_seconds=settings.result_cache_ttl_seconds,
+        shards=settings.cache_shards,
+    )
+
+
+@per_datasource
+def get_plan_cache(datasource: str) -> QueryCache:
+    """EXPLAIN verdicts keyed by normalized SQL, so repeated statements skip the planner round trip."""
+    settings = get_settings()
+    return QueryCache(
+        max_size=settings.plan_cache_max_size,
+        ttl_seconds=settings.plan_cache_ttl_seconds,
+        shards=settings.cache_shards,
+        key_func=make_sql_cache_key,
+    )
 
 
 @lru_cache
-def get_query_cache() -> QueryCache:
+def get_view_advisor() -> ViewAdvisor:
+    """Executed-aggregate stats and the materialized views built from them (default datasource only)."""
     settings = get_settings()
-    return QueryCache(max_size=settings.cache_max_size, ttl_seconds=settings.cache_ttl_seconds)
+    return ViewAdvisor(
+        get_table_versions(DEFAULT_DATASOURCE),
+        min_calls=settings.matview_min_calls,
+        min_mean_ms=settings.matview_min_mean_ms,
+        max_views=settings.matview_max_views,
+    )
+
+
+@per_datasource
+def get_inflight_queries(datasource: str) -> SingleFlight:
+    """In-flight /query agent runs, keyed by question cache key."""
+    return SingleFlight()
+
+
+@lru_cache
+def get_warmup_status() -> WarmupStatus:
+    """Progress of the startup warm-up; /health reports "warming" while it runs."""
+    return WarmupStatus()
+
+
+@lru_cache
+def get_ledger() -> Ledger | None:
+    """Request ledger, or None when LEDGER_PATH is empty."""
+    settings = get_settings()
+    if not settings.ledger_path:
+        return None
+    return Ledger(
+        Path(settings.ledger_path),
+        flush_interval=settings.ledger_flush_interval_seconds,
+        retention_days=settings.ledger_retention_days,
+    )
+
+
+@lru_cache
+def get_llm_limiter() -> LLMLimiter:
+    """Process-wide LLM admission limiter; LLM_MAX_CONCURRENCY=0 lets every call through."""
+    settings = get_settings()
+    return LLMLimiter(settings.llm_max_concurrency, settings.llm_max_queue)
+
+
+@lru_cache
+def get_export_tokens() -> ExportTokens:
+    """Signs /query export tokens. Without EXPORT_TOKEN_SECRET the key is per process: one worker only."""
+    settings = get_settings()
+    secret = settings.export_token_secret.encode() or secrets.token_bytes(32)
+    return ExportTokens(secret, settings.export_token_ttl_seconds)
+
+
+@lru_cache
+def get_export_slots() -> ExportSlots:
+    """Process-wide cap on concurrent /export streams; EXPORT_MAX_CONCURRENCY=0 lets every export through."""
+    return ExportSlots(get_settings().export_max_concurrency)
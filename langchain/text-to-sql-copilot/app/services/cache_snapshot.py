@@ -0,0 +1,93 @@
+"""On-disk snapshot of the in-memory question cache, so restarts do not start cold.
+
+The file is zlib-compressed orjson: the live entries (already-hashed key,
+wall-clock expiry, payload) plus the table versions at save time. Loading skips
+entries whose TTL ran out while the process was down and entries whose
+``table_versions`` are no longer current, so a snapshot never resurrects an
+answer the running cache would have dropped. Written atomically, periodically
+and on shutdown.
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+import zlib
+from pathlib import Path
+
+import orjson
+
+from app.logging_config import get_logger
+from app.services.json_codec import json_default
+from app.services.query_cache import QueryCache
+from app.services.table_versions import TableVersions
+
+logger = get_logger(__name__)
+
+SNAPSHOT_FORMAT = "copilot-question-cache/1"
+
+
+def save_cache_snapshot(cache: QueryCache, versions: TableVersions, path: Path) -> int:
+    """Write the live entries; returns how many were saved."""
+    now = time.time()
+    entries = [[key, now + ttl_left, value] for key, value, ttl_left in cache.export()]
+    document = {
+        "format": SNAPSHOT_FORMAT,
+        "saved_at": now,
+        "table_versions": versions.all(),
+        "entries": entries,
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = zlib.compress(orjson.dumps(document, default=json_default), 6)
+    # A unique temp file per write: workers sharing CACHE_SNAPSHOT_PATH must not clobber each other's half-written file.
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp", delete=False) as tmp:
+        tmp.write(data)
+    try:
+        os.replace(tmp.name, path)
+    except OSError:
+        os.unlink(tmp.name)
+        raise
+    return len(entries)
+
+
+def load_cache_snapshot(cache: QueryCache, versions: TableVersions, path: Path) -> int:
+    """Restore unexpired, still-current entries into an empty cache; returns how many were loaded."""
+    try:
+        document = orjson.loads(zlib.decompress(path.read_bytes()))
+    except FileNotFoundError:
+        return 0
+    except (OSError, ValueError, zlib.error) as exc:
+        logger.warning("cache_snapshot_unreadable", path=str(path), error=str(exc))
+        return 0
+    if document.get("format") != SNAPSHOT_FORMAT:
+        logger.info("cache_snapshot_ignored", path=str(path), format=document.get("format"))
+        return 0
+
+    # Versions only move forward; a listener that loads newer ones from the database still wins.
+    for table, version in document.get("table_versions", {}).items():
+        if version > versions.get(table):
+            versions.set(table, version)
+
+    now = time.time()
+    loaded = expired = stale = 0
+    for key, expires_at, payload in document["entries"]:
+        if expires_at <= now:
+            expired += 1
+        elif not versions.is_current(payload.get("table_versions", {})):
+            stale += 1
+        else:
+            cache.restore(key, payload, expires_at - now)
+            loaded += 1
+    logger.info("cache_snapshot_loaded", path=str(path), loaded=loaded, expired=expired, stale=stale)
+    return loaded
+
+
+async def run_snapshot_writer(cache: QueryCache, versions: TableVersions, path: Path, interval: float) -> None:
+    """Background task: rewrite the snapshot every ``interval`` seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            saved = await asyncio.to_thread(save_cache_snapshot, cache, versions, path)
+            logger.info("cache_snapshot_saved", path=str(path), entries=saved)
+        except Exception as exc:
+            logger.warning("cache_snapshot_failed", path=str(path), error=str(exc))
@@ -0,0 +1,72 @@
+"""Startup warm-up: replay a curated question list through the agent before reporting healthy.
+
+The list is a text file with one question per line (blank lines and ``#``
+comments ignored). Questions already answered from the loaded snapshot cost a
+cache lookup; the rest run through the agent, ``concurrency`` at a time, and
+land in the cache like any other answer. ``/health`` reports ``warming`` (503)
+until the run finishes, so a load balancer keeps traffic away until then.
+"""
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class WarmupStatus:
+    total: int = 0
+    done: int = 0
+    failed: int = 0
+    running: bool = False
+    elapsed_ms: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "total": self.total,
+            "done": self.done,
+            "failed": self.failed,
+            "running": self.running,
+            "elapsed_ms": round(self.elapsed_ms, 2),
+        }
+
+
+def load_questions(path: Path) -> list[str]:
+    lines = (line.strip() for line in path.read_text().splitlines())
+    return list(dict.fromkeys(line for line in lines if line and not line.startswith("#")))
+
+
+async def warm_up(
+    questions: list[str],
+    answer: Callable[[str], Awaitable[Any]],
+    concurrency: int,
+    status: WarmupStatus,
+) -> WarmupStatus:
+    """Run ``answer`` for every question, at most ``concurrency`` at a time; failures are counted, not raised."""
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    status.total, status.done, status.failed, status.running = len(questions), 0, 0, True
+    started = time.perf_counter()
+
+    async def one(question: str) -> None:
+        async with semaphore:
+            try:
+                await answer(question)
+            except Exception as exc:
+                status.failed += 1
+                logger.warning("cache_warmup_question_failed", question=question[:100], error=str(exc))
+            finally:
+                status.done += 1
+
+    try:
+        await asyncio.gather(*(one(q) for q in questions))
+    finally:
+        status.running = False
+        status.elapsed_ms = (time.perf_counter() - started) * 1000
+    logger.info("cache_warmup_complete", **status.as_dict())
+    return status
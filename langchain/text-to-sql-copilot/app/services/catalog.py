@@ -0,0 +1,289 @@
+"""Table catalog: what the copilot may query and how tables relate.
+
+By default the catalog is the hand-written ``TABLE_CATALOG``. With
+``CATALOG_SOURCE=introspect`` it is built at startup from ``pg_catalog`` /
+``information_schema`` (columns, table comments, foreign keys) and persisted to
+a versioned JSON snapshot, so later boots skip introspection. Hand-written
+entries still contribute keywords, descriptions, companions and notes for the
+tables they name.
+
+Refreshes are incremental: one query returns a signature (md5 of columns, types,
+comment and FK definitions) per table, and only tables whose signature changed
+are re-introspected.
+
+Each datasource (``app.db.datasources``) has its own catalog and snapshot;
+``get_catalog`` returns the one for the request's source, limited to that
+source's ``allowed_tables``.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass, field
+from functools import cached_property
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.datasources import current_datasource
+from app.db.engine import get_datasources
+from app.db.schema import MATVIEW_PREFIX, TABLE_CATALOG
+from app.logging_config import get_logger
+from app.services.schema_index import SchemaIndex
+
+logger = get_logger(__name__)
+
+SNAPSHOT_FORMAT = 1
+INTERNAL_TABLES = frozenset({"copilot_table_versions"})
+# The view advisor's own materialized views: queries reach them only through its rewrite.
+INTERNAL_PREFIXES = (MATVIEW_PREFIX,)
+
+SIGNATURES_SQL = text(
+    """
+    SELECT c.relname AS table_name,
+           md5(
+               coalesce(obj_description(c.oid, 'pg_class'), '') || '|' ||
+               coalesce((SELECT string_agg(a.attname || ':' || format_type(a.atttypid, a.atttypmod), ','
+                                           ORDER BY a.attnum)
+                         FROM pg_attribute a
+                         WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped), '') || '|' ||
+               coalesce((SELECT string_agg(pg_get_constraintdef(con.oid), ',' ORDER BY con.conname)
+                         FROM pg_constraint con
+                         WHERE con.conrelid = c.oid AND con.contype = 'f'), '')
+           ) AS signature
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = :schema AND c.relkind IN ('r', 'p', 'v', 'm')
+    """
+)
+
+COLUMNS_SQL = text(
+    """
+    SELECT table_name, column_name
+    FROM information_schema.columns
+    WHERE table_schema = :schema AND table_name IN :tables
+    ORDER BY table_name, ordinal_position
+    """
+).bindparams(bindparam("tables", expanding=True))
+
+COMMENTS_SQL = text(
+    """
+    SELECT c.relname AS table_name, obj_description(c.oid, 'pg_class') AS description
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = :schema AND c.relname IN :tables
+    """
+).bindparams(bindparam("tables", expanding=True))
+
+FOREIGN_KEYS_SQL = text(
+    """
+    SELECT src.relname AS table_name, a.attname AS column_name, dst.relname AS ref_table, b.attname AS ref_column
+    FROM pg_constraint con
+    JOIN pg_class src ON src.oid = con.conrelid
+    JOIN pg_class dst ON dst.oid = con.confrelid
+    JOIN pg_namespace n ON n.oid = src.relnamespace
+    CROSS JOIN LATERAL unnest(con.conkey, con.confkey) AS k(src_attnum, dst_attnum)
+    JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.src_attnum
+    JOIN pg_attribute b ON b.attrelid = con.confrelid AND b.attnum = k.dst_attnum
+    WHERE con.contype = 'f' AND n.nspname = :schema AND src.relname IN :tables
+    ORDER BY src.relname, a.attname
+    """
+).bindparams(bindparam("tables", expanding=True))
+
+
+@dataclass
+class Catalog:
+    """Tables in ``TABLE_CATALOG`` shape, plus per-table signatures from the last introspection."""
+
+    tables: dict[str, dict[str, Any]]
+    source: str = "static"
+    signatures: dict[str, str] = field(default_factory=dict)
+    introspected_at: float | None = None
+
+    @cached_property
+    def version(self) -> str:
+        """Content hash: changes whenever any table's columns, keys or metadata change."""
+        encoded = json.dumps(self.tables, sort_keys=True).encode()
+        return hashlib.sha256(encoded).hexdigest()[:16]
+
+    @cached_property
+    def allowed_tables(self) -> frozenset[str]:
+        return frozenset(self.tables)
+
+    @cached_property
+    def index(self) -> SchemaIndex:
+        return SchemaIndex(self.tables)
+
+    def relationships(self, tables: list[str]) -> list[str]:
+        """FK edges between the given tables, then their notes (e.g. how revenue is computed)."""
+        selected = set(tables)
+        lines = []
+        for table in tables:
+            for column, target in self.tables[table].get("foreign_keys", {}).items():
+                if target.split(".", 1)[0] in selected:
+                    lines.append(f"{table}.{column} -> {target}")
+        for table in tables:
+            lines.extend(self.tables[table].get("notes", []))
+        return lines
+
+    def restricted(self, allowed: frozenset[str] | None) -> "Catalog":
+        """This catalog limited to ``allowed`` tables (None: all of them)."""
+        if allowed is None or allowed >= self.allowed_tables:
+            return self
+        return Catalog(
+            tables={table: meta for table, meta in self.tables.items() if table in allowed},
+            source=self.source,
+            signatures={table: sig for table, sig in self.signatures.items() if table in allowed},
+            introspected_at=self.introspected_at,
+        )
+
+    def to_snapshot(self, schema: str) -> dict[str, Any]:
+        return {
+            "format": SNAPSHOT_FORMAT,
+            "version": self.version,
+            "schema": schema,
+            "introspected_at": self.introspected_at,
+            "signatures": self.signatures,
+            "tables": self.tables,
+        }
+
+
+STATIC_CATALOG = Catalog(tables=TABLE_CATALOG)
+# Per datasource; a source with nothing loaded yet uses the built-in tables within its allow-list.
+_current: dict[str, Catalog] = {}
+
+
+def get_catalog() -> Catalog:
+    name = current_datasource()
+    catalog = _current.get(name)
+    if catalog is None:
+        catalog = _current[name] = STATIC_CATALOG.restricted(get_datasources().get(name).allowed_tables)
+    return catalog
+
+
+def set_catalog(catalog: Catalog) -> None:
+    """Install ``catalog`` for the current datasource, limited to its allow-list."""
+    source = get_datasources().current()
+    catalog = catalog.restricted(source.allowed_tables)
+    _current[source.name] = catalog
+    logger.info(
+        "catalog_loaded",
+        datasource=source.name,
+        source=catalog.source,
+        version=catalog.version,
+        tables=len(catalog.tables),
+    )
+
+
+def _with_overlay(table: str, meta: dict[str, Any]) -> dict[str, Any]:
+    """Introspected columns and keys, plus hand-written keywords/companions/notes for known tables."""
+    curated = TABLE_CATALOG.get(table, {})
+    merged = dict(meta)
+    merged["description"] = curated.get("description") or meta.get("description", "")
+    merged["keywords"] = list(curated.get("keywords", []))
+    for key in ("companions", "notes"):
+        if key in curated:
+            merged[key] = list(curated[key])
+    return merged
+
+
+def is_internal(table: str) -> bool:
+    return table in INTERNAL_TABLES or table.startswith(INTERNAL_PREFIXES)
+
+
+async def fetch_signatures(session: AsyncSession, schema: str) -> dict[str, str]:
+    result = await session.execute(SIGNATURES_SQL, {"schema": schema})
+    return {row.table_name: row.signature for row in result if not is_internal(row.table_name)}
+
+
+async def introspect_tables(session: AsyncSession, schema: str, tables: list[str]) -> dict[str, dict[str, Any]]:
+    """Columns, comments and foreign keys for the named tables."""
+    if not tables:
+        return {}
+    params = {"schema": schema, "tables": tables}
+    found: dict[str, dict[str, Any]] = {}
+    for row in await session.execute(COLUMNS_SQL, params):
+        found.setdefault(row.table_name, {"columns": [], "foreign_keys": {}})["columns"].append(row.column_name)
+    for row in await session.execute(COMMENTS_SQL, params):
+        if row.table_name in found and row.description:
+            found[row.table_name]["description"] = row.description
+    for row in await session.execute(FOREIGN_KEYS_SQL, params):
+        if row.table_name in found and not is_internal(row.ref_table):
+            found[row.table_name]["foreign_keys"][row.column_name] = f"{row.ref_table}.{row.ref_column}"
+    return {table: _with_overlay(table, meta) for table, meta in found.items()}
+
+
+async def refresh_catalog(
+    session: AsyncSession, schema: str, current: Catalog | None = None
+) -> tuple[Catalog, dict[str, list[str]]]:
+    """Re-introspect tables whose signature changed since ``current``; returns (catalog, diff)."""
+    previous = current.signatures if current is not None and current.source != "static" else {}
+    signatures = await fetch_signatures(session, schema)
+    added = sorted(set(signatures) - set(previous))
+    removed = sorted(set(previous) - set(signatures))
+    changed = sorted(t for t in set(signatures) & set(previous) if signatures[t] != previous[t])
+
+    fresh = await introspect_tables(session, schema, added + changed)
+    tables = {
+        table: fresh[table] if table in fresh else current.tables[table]
+        for table in sorted(signatures)
+        if table in fresh or (current is not None and table in current.tables)
+    }
+    catalog = Catalog(tables=tables, source="introspected", signatures=signatures, introspected_at=time.time())
+    return catalog, {"added": added, "removed": removed, "changed": changed}
+
+
+def load_snapshot(path: Path, schema: str) -> Catalog | None:
+    """Catalog from a snapshot file, or None if missing, unreadable or for another format/schema."""
+    try:
+        data = json.loads(path.read_text())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as exc:
+        logger.warning("catalog_snapshot_unreadable", path=str(path), error=str(exc))
+        return None
+    if data.get("format") != SNAPSHOT_FORMAT or data.get("schema") != schema:
+        logger.info("catalog_snapshot_ignored", path=str(path), format=data.get("format"), schema=data.get("schema"))
+        return None
+    return Catalog(
+        tables=data["tables"],
+        source="snapshot",
+        signatures=data.get("signatures", {}),
+        introspected_at=data.get("introspected_at"),
+    )
+
+
+async def init_catalog(session_factory, schema: str, snapshot_path: Path) -> Catalog:
+    """Startup: load the snapshot if present, otherwise introspect and write one."""
+    catalog = load_snapshot(snapshot_path, schema)
+    if catalog is None:
+        async with session_factory() as session:
+            catalog, _ = await refresh_catalog(session, schema)
+        if not catalog.tables:
+            logger.warning("catalog_introspection_empty", schema=schema)
+            return get_catalog()
+        save_snapshot(catalog, snapshot_path, schema)
+    set_catalog(catalog)
+    return get_catalog()
+
+
+def save_snapshot(catalog: Catalog, path: Path, schema: str) -> None:
+    """Write atomically so a crash mid-write never leaves a truncated snapshot.
+
+    Each write has its own temp file, so workers booting together do not clobber each other's.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = json.dumps(catalog.to_snapshot(schema), indent=2, sort_keys=True)
+    with tempfile.NamedTemporaryFile(
+        "w", dir=path.parent, prefix=f".{path.name}.", suffix=".tmp", delete=False
+    ) as tmp:
+        tmp.write(data)
+    try:
+        os.replace(tmp.name, path)
+    except OSError:
+        os.unlink(tmp.name)
+        raise
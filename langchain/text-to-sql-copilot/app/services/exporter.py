@@ -0,0 +1,147 @@
+"""Bulk export of a validated query through a server-side cursor.
+
+Only SQL this server answered can be exported: ``/query`` responses carry an
+``export_token``, an HMAC-signed handle on the answer's SQL and datasource with an
+expiry (``ExportTokens``), and ``/export`` accepts nothing else. Tokens hold no
+server-side state, so any worker with the same ``EXPORT_TOKEN_SECRET`` opens them.
+
+``/query`` materializes at most ``MAX_RESULT_ROWS`` rows. An export re-runs the
+SQL on its own pooled connection (the same read-only role), inside a transaction
+with ``statement_timeout = EXPORT_TIMEOUT_SECONDS``, and reads it with a
+server-side cursor ``EXPORT_BATCH_ROWS`` rows at a time. Each batch is encoded
+(``app.api.exports``) and handed to the response before the next is fetched, so
+memory stays at one batch no matter how many rows the query returns.
+The trailing LIMIT of generated SQL is replaced by ``EXPORT_MAX_ROWS`` unless the
+caller asks to keep it. ``ExportSlots`` caps how many exports hold a connection at once.
+"""
+
+import base64
+import hmac
+import time
+from collections.abc import AsyncIterator, Callable, Sequence
+from contextlib import AsyncExitStack
+from typing import Any
+
+import orjson
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.logging_config import get_logger
+from app.services.query_planner import cap_limit
+from app.telemetry import span
+
+logger = get_logger(__name__)
+
+
+def export_sql(sql: str, max_rows: int, keep_limit: bool = False) -> str:
+    """Validated SQL with its row cap raised (or kept and capped) to ``max_rows``."""
+    return cap_limit(sql, max_rows, keep_limit=keep_limit)
+
+
+class InvalidExportToken(ValueError):
+    """The export token is malformed, was not signed with this secret, or has expired."""
+
+
+def _b64encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def _b64decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+class ExportTokens:
+    """Issues and opens ``<claims>.<signature>`` tokens: base64url JSON of (sql, datasource, expiry) and its HMAC."""
+
+    def __init__(self, secret: bytes, ttl_seconds: float) -> None:
+        self._secret = secret
+        self.ttl_seconds = ttl_seconds
+
+    def _signature(self, claims: bytes) -> bytes:
+        return _b64encode(hmac.digest(self._secret, claims, "sha256"))
+
+    def issue(self, sql: str, datasource: str) -> str:
+        claims = _b64encode(
+            orjson.dumps({"sql": sql, "datasource": datasource, "exp": int(time.time() + self.ttl_seconds)})
+        )
+        return (claims + b"." + self._signature(claims)).decode()
+
+    def open(self, token: str) -> tuple[str, str]:
+        """(sql, datasource) of an unexpired token issued with this secret, else ``InvalidExportToken``."""
+        claims, _, signature = token.encode().partition(b".")
+        if not signature or not hmac.compare_digest(signature, self._signature(claims)):
+            raise InvalidExportToken("Invalid export token.")
+        data = orjson.loads(_b64decode(claims))
+        if data["exp"] < time.time():
+            raise InvalidExportToken("Export token expired; run the query again.")
+        return data["sql"], data["datasource"]
+
+
+class ExportSlots:
+    """Concurrent exports per process (0 = unlimited). Each one holds a pooled connection while it streams."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.in_use = 0
+
+    def try_acquire(self) -> bool:
+        if self.limit and self.in_use >= self.limit:
+            return False
+        self.in_use += 1
+        return True
+
+    def release(self) -> None:
+        self.in_use -= 1
+
+
+class ExportCursor:
+    """One export query on its own connection; ``open`` returns the columns, ``batches`` streams rows.
+
+    ``on_close`` runs once, when the connection is released (e.g. to free an ``ExportSlots`` slot).
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        sql: str,
+        batch_rows: int,
+        timeout_seconds: int,
+        on_close: Callable[[], None] | None = None,
+    ) -> None:
+        self.engine = engine
+        self.sql = sql
+        self.batch_rows = batch_rows
+        self.timeout_seconds = timeout_seconds
+        self.rows = 0
+        self._stack = AsyncExitStack()
+        if on_close is not None:
+            self._stack.callback(on_close)
+        self._result = None
+
+    async def open(self) -> list[str]:
+        """Start the query; errors (timeout, bad SQL) surface here, before any response is sent."""
+        try:
+            conn = await self._stack.enter_async_context(self.engine.connect())
+            # Server-side cursors live inside a transaction.
+            await self._stack.enter_async_context(conn.begin())
+            await conn.execute(text(f"SET LOCAL statement_timeout = {self.timeout_seconds * 1000}"))
+            with span("db.export"):
+                self._result = await conn.stream(text(self.sql).execution_options(yield_per=self.batch_rows))
+        except BaseException as exc:
+            # Unwind with the error so the transaction rolls back rather than committing after a failed statement.
+            await self._stack.__aexit__(type(exc), exc, exc.__traceback__)
+            raise
+        return list(self._result.keys())
+
+    async def batches(self) -> AsyncIterator[Sequence[Sequence[Any]]]:
+        """Row batches of at most ``batch_rows``; the connection is released when iteration ends or stops."""
+        try:
+            async for batch in self._result.partitions(self.batch_rows):
+                self.rows += len(batch)
+                yield batch
+        finally:
+            await self.close()
+            logger.info("export_complete", rows=self.rows)
+
+    async def close(self) -> None:
+        await self._stack.aclose()
@@ -0,0 +1,16 @@
+"""orjson ``default`` hook shared by the response encoders, the Redis cache and the cache snapshot."""
+
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any
+
+
+def json_default(value: Any) -> Any:
+    """Types orjson does not encode natively — Decimal as string, matching Pydantic's JSON output."""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).hex()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
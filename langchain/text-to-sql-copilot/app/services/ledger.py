@@ -0,0 +1,274 @@
+"""Per-request ledger: where each question spent its time, in a local SQLite file.
+
+``record_request`` wraps one answered question. While it is open, spans add
+their time to the request's ``RequestRecord`` (``llm`` → LLM time, ``db.*`` → DB
+time) and ``record_llm_usage`` adds token counts; see ``app.telemetry``. On exit
+the record is queued in memory, and a background task writes queued records in
+batches (one transaction each) on a worker thread, so ``/query`` never waits on
+disk. The file is in WAL mode, so admin reads do not block the writer. When the
+queue is full, records are dropped and counted rather than slowing requests.
+
+Each record carries the request's datasource, and ``top_questions`` groups by
+(datasource, question): the same question against two regions is two entries.
+"""
+
+import asyncio
+import math
+import sqlite3
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import astuple, dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Any
+
+from app.db.datasources import current_datasource
+from app.logging_config import get_logger
+from app.services.query_cache import make_cache_key
+from app.telemetry import bind_request, unbind_request
+
+logger = get_logger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS requests (
+    ts REAL NOT NULL,
+    question_hash TEXT NOT NULL,
+    question TEXT NOT NULL,
+    sql TEXT,
+    row_count INTEGER NOT NULL,
+    total_ms REAL NOT NULL,
+    db_ms REAL NOT NULL,
+    llm_ms REAL NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    llm_calls INTEGER NOT NULL,
+    retries INTEGER NOT NULL,
+    cache TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    datasource TEXT NOT NULL DEFAULT 'default'
+);
+CREATE INDEX IF NOT EXISTS requests_ts ON requests (ts);
+CREATE INDEX IF NOT EXISTS requests_question ON requests (question_hash, ts);
+"""
+# Files written before the datasource column; it is appended last so positional INSERTs fit both.
+ADD_DATASOURCE = "ALTER TABLE requests ADD COLUMN datasource TEXT NOT NULL DEFAULT 'default'"
+INSERT = "INSERT INTO requests VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+QUESTION_PREVIEW_CHARS = 200
+PRUNE_EVERY_SECONDS = 3600
+TOP_QUESTION_ORDER = {
+    "total_ms": "total_ms",
+    "llm_ms": "llm_ms",
+    "tokens": "tokens",
+    "count": "requests",
+}
+
+
+@dataclass(slots=True)
+class RequestRecord:
+    """One answered question. Field order is the column order of ``requests``."""
+
+    ts: float
+    question_hash: str
+    question: str
+    sql: str | None = None
+    row_count: int = 0
+    total_ms: float = 0.0
+    db_ms: float = 0.0
+    llm_ms: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    llm_calls: int = 0
+    retries: int = 0
+    cache: str = "miss"  # miss | hit | semantic | coalesced | bypass
+    status: int = 200
+    datasource: str = "default"
+
+    def observe(self, span: str, seconds: float) -> None:
+        if span == "llm":
+            self.llm_ms += seconds * 1000
+        elif span.startswith("db."):
+            self.db_ms += seconds * 1000
+
+    def add_tokens(self, kind: str, tokens: int) -> None:
+        if kind == "input":
+            self.input_tokens += tokens
+        else:
+            self.output_tokens += tokens
+
+    def fill(self, payload: dict[str, Any], cached: bool = False) -> None:
+        """SQL and row count from an answer payload; LLM calls and retries only if this request paid for them."""
+        self.sql = payload.get("sql")
+        self.row_count = len(payload.get("rows", []))
+        if not cached:
+            self.llm_calls = payload.get("llm_calls", 0)
+            self.retries = payload.get("retry_count", 0)
+
+
+def percentiles(values: list[float], points: tuple[int, ...] = (50, 95, 99)) -> dict[str, float]:
+    """Nearest-rank percentiles of ``values`` (0.0 each when empty)."""
+    ordered = sorted(values)
+    result = {}
+    for p in points:
+        rank = max(math.ceil(p / 100 * len(ordered)), 1)
+        result[f"p{p}"] = round(ordered[rank - 1], 2) if ordered else 0.0
+    return result
+
+
+class Ledger:
+    """Queued, batched writer and admin queries over the ``requests`` table."""
+
+    def __init__(
+        self,
+        path: Path,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        max_pending: int = 10_000,
+        retention_days: float = 7.0,
+    ) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.retention_days = retention_days
+        self.dropped = 0
+        self._pending: deque[RequestRecord] = deque()
+        self._conn: sqlite3.Connection | None = None
+        self._reader: sqlite3.Connection | None = None
+        self._lock = Lock()
+        self._read_lock = Lock()
+        self._pruned_at = 0.0
+
+    def append(self, record: RequestRecord) -> None:
+        """Queue a record; never blocks. Drops (and counts) it when the writer is behind."""
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self._pending.append(record)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            if "datasource" not in {row["name"] for row in conn.execute("PRAGMA table_info(requests)")}:
+                conn.execute(ADD_DATASOURCE)
+            self._conn = conn
+        return self._conn
+
+    def _write(self, rows: list[tuple]) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                conn.executemany(INSERT, rows)
+                now = time.time()
+                if now - self._pruned_at > PRUNE_EVERY_SECONDS:
+                    conn.execute("DELETE FROM requests WHERE ts < ?", (now - self.retention_days * 86400,))
+                    self._pruned_at = now
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _read(self, sql: str, params: tuple = ()) -> list[sqlite3.Row]:
+        """Own connection: under WAL a reader sees the last commit and never waits for the writer."""
+        with self._read_lock:
+            if self._reader is None:
+                with self._lock:
+                    self._connect()
+                self._reader = sqlite3.connect(self.path, check_same_thread=False)
+                self._reader.row_factory = sqlite3.Row
+            return self._reader.execute(sql, params).fetchall()
+
+    async def flush(self) -> int:
+        """Write everything queued so far; returns the number of records written."""
+        written = 0
+        while self._pending:
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            await asyncio.to_thread(self._write, [astuple(record) for record in batch])
+            written += len(batch)
+        return written
+
+    async def run(self) -> None:
+        """Background task: flush every ``flush_interval`` seconds."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as exc:
+                logger.warning("ledger_write_failed", path=str(self.path), error=str(exc))
+
+    def close(self) -> None:
+        with self._read_lock, self._lock:
+            for conn in (self._reader, self._conn):
+                if conn is not None:
+                    conn.close()
+            self._reader = self._conn = None
+
+    def _slow_queries(self, since: float, limit: int) -> dict[str, Any]:
+        rows = self._read("SELECT total_ms, db_ms, llm_ms FROM requests WHERE ts >= ?", (since,))
+        slowest = self._read(
+            "SELECT ts, datasource, question, sql, row_count, total_ms, db_ms, llm_ms, input_tokens, output_tokens, "
+            "llm_calls, retries, cache, status FROM requests WHERE ts >= ? ORDER BY total_ms DESC LIMIT ?",
+            (since, limit),
+        )
+        return {
+            "requests": len(rows),
+            "percentiles": {
+                column: percentiles([row[column] for row in rows]) for column in ("total_ms", "db_ms", "llm_ms")
+            },
+            "slowest": [dict(row) for row in slowest],
+        }
+
+    def _top_questions(self, since: float, limit: int, order: str) -> list[dict[str, Any]]:
+        rows = self._read(
+            "SELECT datasource, question_hash, MAX(question) AS question, COUNT(*) AS requests, "
+            "SUM(total_ms) AS total_ms, AVG(total_ms) AS avg_ms, MAX(total_ms) AS max_ms, "
+            "SUM(db_ms) AS db_ms, SUM(llm_ms) AS llm_ms, SUM(input_tokens + output_tokens) AS tokens, "
+            "SUM(cache != 'miss' AND cache != 'bypass') AS cache_hits, SUM(status >= 400) AS errors "
+            "FROM requests WHERE ts >= ? GROUP BY datasource, question_hash "
+            f"ORDER BY {TOP_QUESTION_ORDER[order]} DESC LIMIT ?",
+            (since, limit),
+        )
+        return [dict(row) for row in rows]
+
+    async def slow_queries(self, since: float, limit: int) -> dict[str, Any]:
+        """Latency percentiles since ``since`` and the ``limit`` slowest requests."""
+        return await asyncio.to_thread(self._slow_queries, since, limit)
+
+    async def top_questions(self, since: float, limit: int, order: str = "total_ms") -> list[dict[str, Any]]:
+        """Questions per datasource ranked by total time, LLM time, tokens or count since ``since``."""
+        return await asyncio.to_thread(self._top_questions, since, limit, order)
+
+
+@contextmanager
+def record_request(ledger: Ledger | None, question: str) -> Iterator[RequestRecord]:
+    """Time one question on the current datasource; spans inside the block add DB/LLM time and tokens to the record."""
+    record = RequestRecord(
+        time.time(), make_cache_key(question), question[:QUESTION_PREVIEW_CHARS], datasource=current_datasource()
+    )
+    token = bind_request(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except (asyncio.CancelledError, GeneratorExit):
+        # Client went away (see app.api.disconnect): nginx's "client closed request".
+        record.status = 499
+        raise
+    except Exception as exc:
+        record.status = getattr(exc, "status_code", 500)
+        raise
+    finally:
+        unbind_request(token)
+        record.total_ms = (time.perf_counter() - start) * 1000
+        if ledger is not None:
+            ledger.append(record)
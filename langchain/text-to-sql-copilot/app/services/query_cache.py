@@ -1,6 +1,9 @@
+import asyncio
 import hashlib
 import re
 import time
+from collections import OrderedDict
+from collections.abc import Callable
 from dataclasses import dataclass
 from threading import Lock
 from typing import Any
@@ -9,6 +12,9 @@ from app.logging_config import get_logger
 
 logger = get_logger(__name__)
 
+# Small caches stay single-sharded so max_size remains an exact bound.
+MIN_SHARD_CAPACITY = 64
+
 
 def normalize_question(question: str) -> str:
     """Canonical form for cache keys — case/whitespace insensitive."""
@@ -21,58 +27,183 @@ def make_cache_key(question: str) -> str:
     return hashlib.sha256(normalized.encode()).hexdigest()
 
 
-@dataclass
+@dataclass(slots=True)
 class CacheEntry:
     value: dict[str, Any]
     expires_at: float
 
 
-class QueryCache:
-    """Thread-safe in-memory TTL cache for successful query responses."""
+class _Shard:
+    """One lock-protected slice of the cache.
+
+    ``entries`` is kept in LRU order (most recently used last) and ``expiries``
+    in insertion order. With a single TTL per cache, insertion order is also
+    expiry order, so both eviction and expiry sweeps pop from the front in O(1).
+    """
+
+    __slots__ = ("lock", "capacity", "entries", "expiries", "hits", "misses", "evictions", "expired")
+
+    def __init__(self, capacity: int) -> None:
+        self.lock = Lock()
+        self.capacity = capacity
+        self.entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self.expiries: OrderedDict[str, float] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def remove(self, key: str) -> None:
+        del self.entries[key]
+        del self.expiries[key]
 
-    def __init__(self, max_size: int = 256, ttl_seconds: int = 300) -> None:
+
+class QueryCache:
+    """Thread-safe, sharded in-memory LRU cache with TTL for successful query responses."""
+
+    def __init__(
+        self,
+        max_size: int = 256,
+        ttl_seconds: int = 300,
+        shards: int = 8,
+        key_func: Callable[[str], str] = make_cache_key,
+    ) -> None:
         self._max_size = max_size
         self._ttl_seconds = ttl_seconds
-        self._store: dict[str, CacheEntry] = {}
-        self._lock = Lock()
+        self._key_func = key_func
+        num_shards = max(1, min(shards, max_size // MIN_SHARD_CAPACITY))
+        base, extra = divmod(max_size, num_shards)
+        self._shards = [_Shard(base + (1 if i < extra else 0)) for i in range(num_shards)]
+
+    def _shard_for(self, key: str) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
 
     def get(self, question: str) -> dict[str, Any] | None:
-        key = make_cache_key(question)
+        key = self._key_func(question)
+        shard = self._shard_for(key)
         now = time.monotonic()
 
-        with self._lock:
-            entry = self._store.get(key)
+        with shard.lock:
+            entry = shard.entries.get(key)
             if entry is None:
+                shard.misses += 1
                 return None
             if entry.expires_at <= now:
-                del self._store[key]
+                shard.remove(key)
+                shard.expired += 1
+                shard.misses += 1
                 return None
+            shard.entries.move_to_end(key)
+            shard.hits += 1
             return entry.value
 
     def set(self, question: str, response: dict[str, Any]) -> None:
-        key = make_cache_key(question)
-        expires_at = time.monotonic() + self._ttl_seconds
+        self._put(self._key_func(question), response, time.monotonic() + self._ttl_seconds)
 
-        with self._lock:
-            if len(self._store) >= self._max_size and key not in self._store:
-                self._evict_oldest()
-            self._store[key] = CacheEntry(value=response, expires_at=expires_at)
+    def restore(self, key: str, response: dict[str, Any], ttl_left: float) -> None:
+        """Insert under an already-hashed key with the TTL it had left (snapshot load, soonest-expiring first)."""
+        if ttl_left > 0:
+            self._put(key, response, time.monotonic() + min(ttl_left, self._ttl_seconds))
+
+    def export(self) -> list[tuple[str, dict[str, Any], float]]:
+        """``(key, value, ttl_left)`` for every live entry, soonest-expiring first."""
+        now = time.monotonic()
+        items = []
+        for shard in self._shards:
+            with shard.lock:
+                items.extend(
+                    (key, entry.value, entry.expires_at - now)
+                    for key, entry in shard.entries.items()
+                    if entry.expires_at > now
+                )
+        items.sort(key=lambda item: item[2])
+        return items
+
+    def _put(self, key: str, response: dict[str, Any], expires_at: float) -> None:
+        shard = self._shard_for(key)
+        with shard.lock:
+            if key in shard.entries:
+                shard.remove(key)
+            elif len(shard.entries) >= shard.capacity:
+                if shard.capacity == 0:
+                    return
+                self._evict_oldest(shard)
+            shard.entries[key] = CacheEntry(value=response, expires_at=expires_at)
+            shard.expiries[key] = expires_at
+
+    def delete(self, question: str) -> bool:
+        key = self._key_func(question)
+        shard = self._shard_for(key)
+        with shard.lock:
+            if key not in shard.entries:
+                return False
+            shard.remove(key)
+            return True
+
+    def purge_expired(self) -> int:
+        """Drop expired entries from every shard; returns the number removed."""
+        now = time.monotonic()
+        removed = 0
+        for shard in self._shards:
+            with shard.lock:
+                while shard.expiries:
+                    key, expires_at = next(iter(shard.expiries.items()))
+                    if expires_at > now:
+                        break
+                    shard.remove(key)
+                    shard.expired += 1
+                    removed += 1
+        return removed
 
     def clear(self) -> int:
-        with self._lock:
-            count = len(self._store)
-            self._store.clear()
-            return count
-
-    def stats(self) -> dict[str, int]:
-        with self._lock:
-            return {"size": len(self._store), "max_size": self._max_size, "ttl_seconds": self._ttl_seconds}
-
-    def _evict_oldest(self) -> None:
-        if not self._store:
-            return
-        oldest_key = min(self._store, key=lambda k: self._store[k].expires_at)
-        del self._store[oldest_key]
+        count = 0
+        for shard in self._shards:
+            with shard.lock:
+                count += len(shard.entries)
+                shard.entries.clear()
+                shard.expiries.clear()
+        return count
+
+    def stats(self) -> dict[str, Any]:
+        size = hits = misses = evictions = expired = 0
+        for shard in self._shards:
+            with shard.lock:
+                size += len(shard.entries)
+                hits += shard.hits
+                misses += shard.misses
+                evictions += shard.evictions
+                expired += shard.expired
+        lookups = hits + misses
+        return {
+            "size": size,
+            "max_size": self._max_size,
+            "ttl_seconds": self._ttl_seconds,
+            "shards": len(self._shards),
+            "hits": hits,
+            "misses": misses,
+            "evictions": evictions,
+            "expired": expired,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+    @staticmethod
+    def _evict_oldest(shard: _Shard) -> None:
+        """Evict the least recently used entry — O(1) via the ordered dict."""
+        key, _ = shard.entries.popitem(last=False)
+        del shard.expiries[key]
+        shard.evictions += 1
+
+
+async def run_expiry_sweeper(cache, interval_seconds: float) -> None:
+    """Background task: periodically drop expired entries that nobody reads.
+
+    Works with any cache exposing ``purge_expired()`` (question and semantic tiers).
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        removed = cache.purge_expired()
+        if removed:
+            logger.info("cache_expired_purged", entries=removed)
 
 
 def is_cacheable_response(response: dict[str, Any]) -> bool:
@@ -1,27 +1,77 @@
+import asyncio
+from time import perf_counter
 from typing import Any
 
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import get_settings
+from app.db.datasources import DEFAULT_DATASOURCE, current_datasource
+from app.logging_config import get_logger
+from app.services.cache_factory import get_plan_cache, get_view_advisor
+from app.services.query_planner import check_plan
+from app.telemetry import DB_QUERIES_CANCELLED, span
 
+logger = get_logger(__name__)
 settings = get_settings()
 
 
-async def execute_readonly_query(session: AsyncSession, sql: str) -> tuple[list[str], list[dict[str, Any]]]:
-    """Execute validated SQL with timeout and row cap."""
-    timeout_ms = settings.sql_timeout_seconds * 1000
-    try:
-        await session.execute(text(f"SET LOCAL statement_timeout = {timeout_ms}"))
-        result = await session.execute(text(sql))
+async def _run(session: AsyncSession, sql: str) -> tuple[list[str], list[list[Any]]]:
+    await session.execute(text(f"SET LOCAL statement_timeout = {settings.sql_timeout_seconds * 1000}"))
+    if settings.plan_guard_enabled:
+        sql = await check_plan(
+            session,
+            sql,
+            max_cost=settings.plan_max_cost,
+            max_plan_rows=settings.plan_max_rows,
+            row_cap=settings.max_result_rows,
+            cache=get_plan_cache(),
+        )
+    with span("db.execute"):
+        try:
+            result = await session.execute(text(sql))
+        except asyncio.CancelledError:
+            # The request was abandoned or lost a speculative race. asyncpg has already sent
+            # Postgres a cancel request; the session's rollback waits for it before reuse.
+            DB_QUERIES_CANCELLED.inc()
+            raise
         columns = list(result.keys())
         rows_raw = result.fetchmany(settings.max_result_rows + 1)
 
-        if len(rows_raw) > settings.max_result_rows:
-            rows_raw = rows_raw[: settings.max_result_rows]
+    if len(rows_raw) > settings.max_result_rows:
+        rows_raw = rows_raw[: settings.max_result_rows]
+
+    # Arrays aligned with columns; the default API format expands them to objects at the edge.
+    return columns, [list(row) for row in rows_raw]
+
 
-        rows = [dict(zip(columns, row)) for row in rows_raw]
-        return columns, rows
+async def execute_readonly_query(session: AsyncSession, sql: str) -> tuple[list[str], list[list[Any]]]:
+    """Execute validated SQL with timeout, plan budget and row cap.
+
+    With the view advisor on, SQL matching a fresh materialized view reads the view
+    instead (falling back to the base tables if that fails), and base-table run
+    times feed the advisor. The advisor manages views in the default datasource only.
+    """
+    use_views = settings.matview_advisor_enabled and current_datasource() == DEFAULT_DATASOURCE
+    advisor = get_view_advisor() if use_views else None
+    rewrite = advisor.rewrite(sql) if advisor is not None else None
+    if rewrite is not None:
+        view_sql, view = rewrite
+        start = perf_counter()
+        try:
+            result = await _run(session, view_sql)
+        except Exception as exc:
+            await session.rollback()
+            logger.warning("matview_rewrite_failed", view=view.name, error=str(exc))
+        else:
+            advisor.record_hit(view, (perf_counter() - start) * 1000)
+            return result
+    start = perf_counter()
+    try:
+        result = await _run(session, sql)
     except Exception:
         await session.rollback()
         raise
+    if advisor is not None:
+        advisor.record(sql, (perf_counter() - start) * 1000)
+    return result
@@ -0,0 +1,157 @@
+"""Pre-execution plan guard: EXPLAIN generated SQL and refuse plans over budget.
+
+``statement_timeout`` only stops a runaway query after it has held a backend for
+the full timeout. The guard asks the planner first (``EXPLAIN (FORMAT JSON)``,
+which does not run the query) and rejects the statement when the estimated total
+cost, or the widest join or sort output, exceeds the configured budget. Scans are
+not row-budgeted (an aggregate over a large table is fine when its cost is), and
+nodes under a Limit are not either, since the Limit stops them early.
+The rejection message names the likely cause (e.g. a join without a condition)
+so the retry prompt can fix it.
+
+A top-level ``LIMIT`` larger than the row cap is tightened to the cap before
+planning: rows past the cap are never returned, so the result is unchanged and
+the planner can pick a cheaper plan. Verdicts are cached by normalized SQL, so
+repeated statements skip the EXPLAIN.
+"""
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.logging_config import get_logger
+from app.services.query_cache import QueryCache
+from app.telemetry import span
+
+logger = get_logger(__name__)
+
+EXPLAIN_PREFIX = "EXPLAIN (FORMAT JSON) "
+
+# Only a trailing LIMIT is rewritten: at the end of validated SQL it is always top level.
+_TRAILING_LIMIT_RE = re.compile(r"\bLIMIT\s+(\d+)(\s+OFFSET\s+\d+)?\s*$", re.IGNORECASE)
+# Inner-side keys that mean a nested loop is driven by a join condition after all.
+_JOIN_CONDITION_KEYS = ("Join Filter", "Index Cond", "Recheck Cond", "Filter", "Hash Cond", "Merge Cond")
+# Nodes whose estimated output counts against the row budget: intermediate results that fan out.
+_ROW_BUDGET_NODES = frozenset({"Nested Loop", "Hash Join", "Merge Join", "Sort", "Incremental Sort"})
+
+
+class QueryPlanRejected(Exception):
+    """The planner's estimate is over budget; the message is written for the retry prompt."""
+
+
+@dataclass
+class PlanSummary:
+    total_cost: float
+    plan_rows: float
+    max_rows: float
+    hints: list[str] = field(default_factory=list)
+
+
+def _relations(node: dict[str, Any]) -> list[str]:
+    found = [node["Relation Name"]] if "Relation Name" in node else []
+    for child in node.get("Plans", []):
+        found.extend(r for r in _relations(child) if r not in found)
+    return found
+
+
+def _has_condition(node: dict[str, Any]) -> bool:
+    return any(key in node for key in _JOIN_CONDITION_KEYS) or any(
+        _has_condition(child) for child in node.get("Plans", [])
+    )
+
+
+def summarize_plan(plan: dict[str, Any]) -> PlanSummary:
+    """Cost and rows of the root node, the widest join/sort output outside a Limit, and hints about cross joins."""
+    summary = PlanSummary(total_cost=plan.get("Total Cost", 0.0), plan_rows=plan.get("Plan Rows", 0), max_rows=0)
+    stack = [(plan, False)]
+    while stack:
+        node, limited = stack.pop()
+        limited = limited or node.get("Node Type") == "Limit"
+        if not limited and node.get("Node Type") in _ROW_BUDGET_NODES:
+            summary.max_rows = max(summary.max_rows, node.get("Plan Rows", 0))
+        children = node.get("Plans", [])
+        if node.get("Node Type") == "Nested Loop" and "Join Filter" not in node and len(children) == 2:
+            if not _has_condition(children[1]):
+                left, right = ", ".join(_relations(children[0])), ", ".join(_relations(children[1]))
+                summary.hints.append(f"cartesian product between {left or '?'} and {right or '?'} (no join condition)")
+        stack.extend((child, limited) for child in children)
+    return summary
+
+
+def tighten_limit(sql: str, max_rows: int) -> str:
+    """Lower a trailing ``LIMIT n`` above ``max_rows`` to ``max_rows``; other SQL is returned unchanged."""
+    match = _TRAILING_LIMIT_RE.search(sql)
+    if match is None or int(match.group(1)) <= max_rows:
+        return sql
+    return f"{sql[: match.start()]}LIMIT {max_rows}{match.group(2) or ''}"
+
+
+def cap_limit(sql: str, max_rows: int, keep_limit: bool = True) -> str:
+    """SQL ending in ``LIMIT`` at most ``max_rows``. Without ``keep_limit`` a trailing LIMIT/OFFSET is replaced."""
+    match = _TRAILING_LIMIT_RE.search(sql)
+    if match is None:
+        return f"{sql} LIMIT {max_rows}"
+    if keep_limit:
+        return tighten_limit(sql, max_rows)
+    return f"{sql[: match.start()]}LIMIT {max_rows}"
+
+
+def over_budget(summary: PlanSummary, max_cost: float, max_plan_rows: float) -> str | None:
+    """Rejection message, or None when the plan fits both budgets."""
+    reasons = []
+    if summary.total_cost > max_cost:
+        reasons.append(f"estimated cost {summary.total_cost:.3g} exceeds budget {max_cost:.3g}")
+    if summary.max_rows > max_plan_rows:
+        reasons.append(f"estimated {summary.max_rows:.3g} intermediate rows exceeds budget {max_plan_rows:.3g}")
+    if not reasons:
+        return None
+    message = "Query plan rejected: " + "; ".join(reasons) + "."
+    if summary.hints:
+        message += " Likely cause: " + "; ".join(summary.hints) + ". Add the missing JOIN ... ON condition."
+    else:
+        message += " Add filters, join on keys, or aggregate before joining."
+    return message
+
+
+async def explain(session: AsyncSession, sql: str) -> dict[str, Any]:
+    """Root plan node from ``EXPLAIN (FORMAT JSON)``."""
+    with span("db.explain"):
+        result = await session.execute(text(EXPLAIN_PREFIX + sql))
+        document = result.scalar()
+    if isinstance(document, str):
+        document = json.loads(document)
+    return document[0]["Plan"]
+
+
+async def check_plan(
+    session: AsyncSession,
+    sql: str,
+    *,
+    max_cost: float,
+    max_plan_rows: float,
+    row_cap: int,
+    cache: QueryCache | None = None,
+) -> str:
+    """SQL to execute (LIMIT possibly tightened), or raise ``QueryPlanRejected``."""
+    verdict = cache.get(sql) if cache is not None else None
+    if verdict is None:
+        planned = tighten_limit(sql, row_cap)
+        summary = summarize_plan(await explain(session, planned))
+        verdict = {
+            "sql": planned,
+            "cost": summary.total_cost,
+            "rows": summary.max_rows,
+            "error": over_budget(summary, max_cost, max_plan_rows),
+        }
+        if cache is not None:
+            cache.set(sql, verdict)
+        if planned != sql:
+            logger.info("plan_limit_tightened", limit=row_cap)
+    if verdict["error"]:
+        logger.warning("plan_rejected", cost=verdict["cost"], rows=verdict["rows"])
+        raise QueryPlanRejected(verdict["error"])
+    return verdict["sql"]
@@ -0,0 +1,142 @@
+"""Zero-LLM fast path: match common question shapes to pre-vetted SQL.
+
+Templates are declared in ``app/db/schema.py`` next to ``TABLE_CATALOG``. A
+template matches only when its pattern covers the whole question and every slot
+resolves — metric and dimension to a declared vocabulary entry, N to a bounded
+integer, the period to a calendar month, quarter or year. Slot values are never
+copied from the question into SQL; they select from vetted fragments or are
+rendered from parsed numbers/dates. Anything else falls through to the LLM.
+"""
+
+import calendar
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from functools import lru_cache
+from typing import Any
+
+from app.db.schema import QUERY_TEMPLATES, SALES_FROM, TEMPLATE_DIMENSIONS, TEMPLATE_METRICS
+
+LEAD = r"(?:(?:what (?:is|was|are|were)|show(?: me)?|give me|get|list|tell me) )?(?:the )?(?:total )?"
+
+_MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+_MONTHS.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+_PERIOD = (
+    r" (?:in|during|for) (?:(?P<month>{months}) (?P<month_year>\d{{4}})"
+    r"|(?P<quarter>q[1-4]) (?P<quarter_year>\d{{4}})|(?P<year>\d{{4}}))"
+).format(months="|".join(sorted(_MONTHS, key=len, reverse=True)))
+
+
+@dataclass
+class TemplateMatch:
+    name: str
+    sql: str
+    tables: list[str]
+    slots: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class _Template:
+    name: str
+    pattern: re.Pattern
+    sql: str
+    tables: list[str]
+    defaults: dict[str, Any]
+
+
+def _alternation(vocabulary: dict[str, dict]) -> tuple[str, dict[str, str]]:
+    """Regex alternation of every alias (longest first) and alias -> vocabulary key."""
+    lookup = {alias: key for key, meta in vocabulary.items() for alias in meta["aliases"]}
+    return "|".join(re.escape(a) for a in sorted(lookup, key=len, reverse=True)), lookup
+
+
+_METRIC_RE, _METRIC_ALIASES = _alternation(TEMPLATE_METRICS)
+_DIMENSION_RE, _DIMENSION_ALIASES = _alternation(TEMPLATE_DIMENSIONS)
+
+
+@lru_cache
+def _compiled_templates() -> tuple[_Template, ...]:
+    compiled = []
+    for spec in QUERY_TEMPLATES:
+        period = _PERIOD if "{period_filter}" in spec["sql"] else f"(?:{_PERIOD})?"
+        pattern = spec["pattern"].format(lead=LEAD, metric=_METRIC_RE, dimension=_DIMENSION_RE, period=period)
+        compiled.append(
+            _Template(
+                name=spec["name"],
+                pattern=re.compile(pattern),
+                sql=spec["sql"],
+                tables=list(spec["tables"]),
+                defaults=dict(spec.get("defaults", {})),
+            )
+        )
+    return tuple(compiled)
+
+
+def _normalize(question: str) -> str:
+    return re.sub(r"\s+", " ", question.lower()).strip().rstrip("?.!").strip()
+
+
+def _period(match: re.Match) -> tuple[date, date] | None:
+    """[start, end) of the month, quarter or year named in the question."""
+    groups = match.groupdict()
+    if groups.get("month"):
+        year, month = int(groups["month_year"]), _MONTHS[groups["month"]]
+        start = date(year, month, 1)
+        end = date(year + month // 12, month % 12 + 1, 1)
+    elif groups.get("quarter"):
+        year, quarter = int(groups["quarter_year"]), int(groups["quarter"][1])
+        start = date(year, 3 * quarter - 2, 1)
+        end = date(year + quarter // 4, (3 * quarter) % 12 + 1, 1)
+    elif groups.get("year"):
+        year = int(groups["year"])
+        start, end = date(year, 1, 1), date(year + 1, 1, 1)
+    else:
+        return None
+    return start, end
+
+
+def match_template(question: str, allowed_tables: frozenset[str], max_rows: int) -> TemplateMatch | None:
+    """First template whose pattern covers the whole question, rendered to SQL; None to use the LLM."""
+    text = _normalize(question)
+    for template in _compiled_templates():
+        if not set(template.tables) <= allowed_tables:
+            continue
+        match = template.pattern.fullmatch(text)
+        if match is None:
+            continue
+        groups = {k: v for k, v in match.groupdict().items() if v is not None}
+        metric = _METRIC_ALIASES.get(groups.get("metric", ""), template.defaults.get("metric"))
+        dimension = _DIMENSION_ALIASES.get(groups.get("dimension", ""), template.defaults.get("dimension"))
+        n = min(max(int(groups.get("n", template.defaults.get("n", max_rows))), 1), max_rows)
+        try:
+            period = _period(match)
+        except ValueError:
+            continue  # e.g. year 0000
+
+        slots: dict[str, Any] = {"n": n} if "{n}" in template.sql else {}
+        values: dict[str, Any] = {
+            "sales_from": SALES_FROM,
+            "n": n,
+            "limit": max_rows,
+            "where": "",
+            "order_by": "2 DESC",
+        }
+        if metric:
+            slots["metric"] = metric
+            meta = TEMPLATE_METRICS[metric]
+            values.update(metric=meta["sql"], metric_name=metric, sales_from=meta.get("from", SALES_FROM))
+        if dimension:
+            slots["dimension"] = dimension
+            meta = TEMPLATE_DIMENSIONS[dimension]
+            values.update(dimension=meta["sql"], dimension_name=dimension, order_by=meta.get("order_by", "2 DESC"))
+        if period:
+            start, end = (d.isoformat() for d in period)
+            slots["period"] = [start, end]
+            values["period_filter"] = f"o.order_date >= DATE '{start}' AND o.order_date < DATE '{end}'"
+            values["where"] = f"WHERE {values['period_filter']}"
+        try:
+            sql = template.sql.format(**values)
+        except KeyError:
+            continue  # a slot the SQL needs was not resolved
+        return TemplateMatch(name=template.name, sql=" ".join(sql.split()), tables=template.tables, slots=slots)
+    return None
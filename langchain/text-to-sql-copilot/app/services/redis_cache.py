@@ -0,0 +1,146 @@
+"""Redis-protocol question cache shared by every worker and instance.
+
+Payloads are encoded with orjson and zlib-compressed above a small threshold.
+Expiry is handled server-side with ``SET ... EX`` and batch operations are
+pipelined, so a batch of N lookups costs one round trip. The client speaks
+RESP2, which every Redis-compatible server (KeyDB, Dragonfly, Redis < 6) accepts.
+
+Table versions live next to the entries (``{namespace}:tv:{table}``, bumped with
+INCR), so an invalidation on one worker makes the shared entries stale for all of
+them, and no worker deletes entries another wrote just because its own in-memory
+versions lag behind.
+"""
+
+import zlib
+from collections.abc import Iterable
+from typing import Any
+
+import orjson
+from redis.asyncio import Redis
+
+from app.services.cache_backend import CacheBackend
+from app.services.json_codec import json_default
+from app.services.query_cache import make_cache_key
+from app.services.table_versions import TableVersions
+
+COMPRESS_MIN_BYTES = 512
+_RAW = b"j"
+_ZLIB = b"z"
+SCAN_BATCH = 500
+
+
+def encode_payload(payload: dict[str, Any]) -> bytes:
+    raw = orjson.dumps(payload, default=json_default)
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        return _ZLIB + zlib.compress(raw, 1)
+    return _RAW + raw
+
+
+def decode_payload(data: bytes) -> dict[str, Any]:
+    tag, body = data[:1], data[1:]
+    if tag == _ZLIB:
+        body = zlib.decompress(body)
+    return orjson.loads(body)
+
+
+class RedisCacheBackend(CacheBackend):
+    """Size is bounded by the server's ``maxmemory`` policy; hit/miss counters are per worker."""
+
+    name = "redis"
+
+    def __init__(
+        self,
+        url: str,
+        namespace: str = "copilot",
+        ttl_seconds: int = 300,
+        client: Redis | None = None,
+        versions: TableVersions | None = None,
+    ) -> None:
+        self._client = client or Redis.from_url(url, protocol=2)
+        # "q2": rows are stored as arrays; entries written in the old object layout are never read.
+        self._prefix = f"{namespace}:q2:"
+        self._versions_prefix = f"{namespace}:tv:"
+        # Local mirror of the shared versions; the result cache and view advisor read it too.
+        self.versions = versions or TableVersions()
+        self._ttl_seconds = ttl_seconds
+        self._hits = 0
+        self._misses = 0
+
+    def _key(self, question: str) -> str:
+        return self._prefix + make_cache_key(question)
+
+    async def get(self, question: str) -> dict[str, Any] | None:
+        return (await self.get_many([question]))[0]
+
+    async def get_many(self, questions: list[str]) -> list[dict[str, Any] | None]:
+        if not questions:
+            return []
+        values = await self._client.mget([self._key(q) for q in questions])
+        results = [decode_payload(v) if v is not None else None for v in values]
+        hits = sum(r is not None for r in results)
+        self._hits += hits
+        self._misses += len(results) - hits
+        return results
+
+    async def set(self, question: str, response: dict[str, Any]) -> None:
+        await self.set_many([(question, response)])
+
+    async def set_many(self, items: list[tuple[str, dict[str, Any]]]) -> None:
+        if not items:
+            return
+        async with self._client.pipeline(transaction=False) as pipe:
+            for question, response in items:
+                pipe.set(self._key(question), encode_payload(response), ex=self._ttl_seconds)
+            await pipe.execute()
+
+    async def delete(self, question: str) -> bool:
+        return bool(await self._client.delete(self._key(question)))
+
+    async def clear(self) -> int:
+        removed = 0
+        batch: list[bytes] = []
+        async for key in self._client.scan_iter(match=f"{self._prefix}*", count=SCAN_BATCH):
+            batch.append(key)
+            if len(batch) >= SCAN_BATCH:
+                removed += await self._client.unlink(*batch)
+                batch.clear()
+        if batch:
+            removed += await self._client.unlink(*batch)
+        return removed
+
+    async def stats(self) -> dict[str, Any]:
+        size = 0
+        async for _ in self._client.scan_iter(match=f"{self._prefix}*", count=SCAN_BATCH):
+            size += 1
+        lookups = self._hits + self._misses
+        return {
+            "backend": self.name,
+            "size": size,
+            "max_size": 0,
+            "ttl_seconds": self._ttl_seconds,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def lookups(self) -> tuple[int, int]:
+        return self._hits, self._misses
+
+    async def sync_versions(self, tables: Iterable[str]) -> None:
+        tables = list(tables)
+        if not tables:
+            return
+        values = await self._client.mget([self._versions_prefix + table for table in tables])
+        for table, value in zip(tables, values):
+            if value is not None:
+                self.versions.set(table, int(value))
+
+    async def bump_version(self, table: str) -> int:
+        return self.versions.set(table, await self._client.incr(self._versions_prefix + table))
+
+    async def set_version(self, table: str, version: int) -> int:
+        await self._client.set(self._versions_prefix + table, version)
+        return self.versions.set(table, version)
+
+    async def close(self) -> None:
+        await self._client.aclose()
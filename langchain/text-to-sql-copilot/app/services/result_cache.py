@@ -0,0 +1,70 @@
+"""SQL-result cache: different questions that compile to the same SQL share one DB round trip."""
+
+import hashlib
+import re
+from typing import Any
+
+from app.services.query_cache import QueryCache
+from app.services.table_versions import TableVersions
+
+# Quoted literals/identifiers are kept verbatim; whitespace between them is collapsed.
+_SQL_CHUNK_RE = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")|(\s+)|([^'\"\s]+)")
+
+
+def normalize_sql(sql: str) -> str:
+    """Whitespace-insensitive canonical form of validated SQL (literals untouched)."""
+    parts: list[str] = []
+    for quoted, space, other in _SQL_CHUNK_RE.findall(sql.strip().rstrip(";").strip()):
+        if quoted:
+            parts.append(quoted)
+        elif space:
+            parts.append(" ")
+        else:
+            parts.append(other)
+    return "".join(parts)
+
+
+def make_sql_cache_key(sql: str) -> str:
+    return hashlib.sha256(normalize_sql(sql).encode()).hexdigest()
+
+
+class ResultCache:
+    """Columns/rows keyed by normalized SQL, tagged with the versions of the tables read."""
+
+    def __init__(
+        self, versions: TableVersions, max_size: int = 512, ttl_seconds: int = 300, shards: int = 8
+    ) -> None:
+        self._versions = versions
+        self._cache = QueryCache(
+            max_size=max_size, ttl_seconds=ttl_seconds, shards=shards, key_func=make_sql_cache_key
+        )
+        self._stale = 0
+
+    def get(self, sql: str) -> tuple[list[str], list[Any]] | None:
+        entry = self._cache.get(sql)
+        if entry is None:
+            return None
+        if not self._versions.is_current(entry["table_versions"]):
+            self._cache.delete(sql)
+            self._stale += 1
+            return None
+        return entry["columns"], entry["rows"]
+
+    def set(self, sql: str, columns: list[str], rows: list[Any], table_versions: dict[str, int]) -> None:
+        """``table_versions`` must be snapshotted before the query ran, so a change during it leaves the entry stale."""
+        entry = {
+            "columns": columns,
+            "rows": rows,
+            "tables": sorted(table_versions),
+            "table_versions": table_versions,
+        }
+        self._cache.set(sql, entry)
+
+    def purge_expired(self) -> int:
+        return self._cache.purge_expired()
+
+    def clear(self) -> int:
+        return self._cache.clear()
+
+    def stats(self) -> dict[str, Any]:
+        return {**self._cache.stats(), "stale": self._stale}
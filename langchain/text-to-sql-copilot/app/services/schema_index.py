@@ -0,0 +1,122 @@
+"""Precomputed index for keyword-based schema linking.
+
+Table names, keywords and column names are normalized into token phrases
+("unit_price" -> ("unit", "price")) and stored in a phrase -> {table: weight}
+map when the catalog loads. Linking a question then costs one dictionary probe
+per (question token, phrase length) pair, independent of catalog size, and
+matches whole tokens only — "id" no longer matches inside "did".
+
+Linked tables are expanded along foreign keys: tables on the shortest FK path
+between two linked tables are added as join bridges, and each table's declared
+``companions`` (e.g. orders <-> order_items for revenue) are always pulled in.
+"""
+
+import re
+from collections import defaultdict, deque
+
+from app.services.text_utils import stem
+
+KEYWORD_WEIGHT = 2
+COLUMN_WEIGHT = 1
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> tuple[str, ...]:
+    """Lowercased, stemmed word tokens; underscores separate words."""
+    return tuple(stem(token) for token in _TOKEN_RE.findall(text.lower()))
+
+
+class SchemaIndex:
+    """Inverted phrase index over a table catalog, built once per catalog."""
+
+    def __init__(self, catalog: dict[str, dict], max_bridge_hops: int = 2) -> None:
+        self._tables = list(catalog)
+        self._order = {table: i for i, table in enumerate(self._tables)}
+        self._max_bridge_hops = max_bridge_hops
+        self._phrases: dict[tuple[str, ...], dict[str, int]] = defaultdict(dict)
+        self._neighbors: dict[str, set[str]] = defaultdict(set)
+        self._companions: dict[str, list[str]] = {}
+
+        for table, meta in catalog.items():
+            weights: dict[tuple[str, ...], int] = defaultdict(int)
+            for phrase in {tokenize(kw) for kw in (table, *meta.get("keywords", []))}:
+                weights[phrase] += KEYWORD_WEIGHT
+            for phrase in {tokenize(col) for col in meta["columns"]}:
+                weights[phrase] += COLUMN_WEIGHT
+            for phrase, weight in weights.items():
+                if phrase:
+                    self._phrases[phrase][table] = weight
+            for target in meta.get("foreign_keys", {}).values():
+                ref = target.split(".", 1)[0]
+                if ref in catalog and ref != table:
+                    self._neighbors[table].add(ref)
+                    self._neighbors[ref].add(table)
+            self._companions[table] = [t for t in meta.get("companions", []) if t in catalog]
+
+        # A phrase shared by most tables ("id", "created_at") cannot tell them apart.
+        common = max(2, len(catalog) // 2)
+        self._phrases = {p: t for p, t in self._phrases.items() if len(t) <= common}
+        self._max_phrase_len = max((len(p) for p in self._phrases), default=1)
+
+    def __len__(self) -> int:
+        return len(self._tables)
+
+    def score(self, question: str) -> dict[str, int]:
+        """Sum of weights of distinct catalog phrases found in the question, per table."""
+        tokens = tokenize(question)
+        matched: set[tuple[str, ...]] = set()
+        for start in range(len(tokens)):
+            for length in range(1, min(self._max_phrase_len, len(tokens) - start) + 1):
+                phrase = tokens[start:start + length]
+                if phrase in self._phrases:
+                    matched.add(phrase)
+
+        scores: dict[str, int] = defaultdict(int)
+        for phrase in matched:
+            for table, weight in self._phrases[phrase].items():
+                scores[table] += weight
+        return scores
+
+    def link(self, question: str, limit: int = 4) -> list[str]:
+        """Best-scoring tables plus FK bridges and companions, capped at ``limit``."""
+        scores = self.score(question)
+        if not scores:
+            return self._tables[:limit]
+
+        ranked = sorted(scores, key=lambda t: (-scores[t], self._order[t]))[:limit]
+        linked = list(ranked)
+        for table in ranked[1:]:
+            for bridge in self._bridge(table, linked):
+                if bridge not in linked:
+                    linked.append(bridge)
+        for table in list(linked):
+            for companion in self._companions[table]:
+                if companion not in linked:
+                    linked.append(companion)
+        return linked[:limit]
+
+    def _bridge(self, table: str, linked: list[str]) -> list[str]:
+        """Intermediate tables on the shortest FK path from ``table`` to any other linked table."""
+        targets = set(linked) - {table}
+        if not targets or self._neighbors[table] & targets:
+            return []
+        parents: dict[str, str | None] = {table: None}
+        frontier = deque([(table, 0)])
+        while frontier:
+            node, depth = frontier.popleft()
+            if depth > self._max_bridge_hops:
+                break
+            for neighbor in sorted(self._neighbors[node], key=self._order.__getitem__):
+                if neighbor in parents:
+                    continue
+                parents[neighbor] = node
+                if neighbor in targets:
+                    path = []
+                    step = parents[neighbor]
+                    while step is not None and step != table:
+                        path.append(step)
+                        step = parents[step]
+                    return path[::-1]
+                frontier.append((neighbor, depth + 1))
+        return []
@@ -0,0 +1,226 @@
+"""Second cache tier: near-duplicate questions answered from earlier results.
+
+Questions are embedded locally on CPU (no model download, no LLM call) into a
+sparse bag of word and character-trigram features, L2-normalized. Cached
+questions are kept in an inverted index, so a lookup only scores entries that
+share at least one feature with the incoming question.
+"""
+
+import math
+import re
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Protocol
+
+from app.services.query_cache import normalize_question
+from app.services.text_utils import stem
+
+STOPWORDS = frozenset(
+    "a an the of for in on at to by per each and or is are was were be what which who whom how many much "
+    "me my our we us you your show list give get find tell please do does did with from all there have has "
+    "this that these those it its can could would".split()
+)
+
+# Phrasings that mean the same aggregate are folded onto one token before embedding.
+CANONICAL_PHRASES = (
+    (re.compile(r"\b(?:how many|number of|count of)\b"), "count"),
+    (re.compile(r"\b(?:avg|mean)\b"), "average"),
+)
+
+_WORD_RE = re.compile(r"[a-z0-9_]+")
+
+# Time words change the period a question covers ("last month" vs "this month"); some are also stopwords,
+# so the guard reads them from the normalized question rather than from its content words.
+TEMPORAL_TERMS = frozenset(
+    stem(w)
+    for w in (
+        "last this previous prior next current past recent latest ago today yesterday tomorrow now "
+        "day week month quarter year daily weekly monthly quarterly yearly annual ytd mtd qtd "
+        "january february march april may june july august september october november december "
+        "monday tuesday wednesday thursday friday saturday sunday weekend"
+    ).split()
+)
+
+SparseVector = dict[str, float]
+
+
+class Embedder(Protocol):
+    def embed(self, text: str) -> SparseVector: ...
+
+
+def content_words(question: str) -> list[str]:
+    text = normalize_question(question)
+    for pattern, replacement in CANONICAL_PHRASES:
+        text = pattern.sub(replacement, text)
+    return [stem(w) for w in _WORD_RE.findall(text) if w not in STOPWORDS]
+
+
+def schema_terms(catalog: dict[str, dict]) -> frozenset[str]:
+    """Table and column name parts — a question's schema terms must match exactly to reuse an answer."""
+    terms: set[str] = set()
+    for table, meta in catalog.items():
+        for name in (table, *meta["columns"]):
+            terms.update(stem(part) for part in name.lower().split("_") if part)
+    return frozenset(terms - {"id", "at"})
+
+
+class NgramEmbedder:
+    """Local CPU embedder: stemmed content words plus character trigrams."""
+
+    def __init__(self, trigram_weight: float = 0.3) -> None:
+        self._trigram_weight = trigram_weight
+
+    def embed(self, text: str) -> SparseVector:
+        vec: dict[str, float] = defaultdict(float)
+        for word in content_words(text):
+            vec[f"w:{word}"] += 1.0
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                vec[f"t:{padded[i:i + 3]}"] += self._trigram_weight
+        norm = math.sqrt(sum(v * v for v in vec.values()))
+        if not norm:
+            return {}
+        return {k: v / norm for k, v in vec.items()}
+
+
+def _guard(question: str, guard_terms: frozenset[str]) -> frozenset[str]:
+    """Tokens that must match exactly: numbers ("top 3" vs "top 5"), time words ("last month" vs
+    "this month") and schema terms ("revenue by product" vs "revenue by product category")."""
+    numbers = re.findall(r"\d+(?:\.\d+)?", question)
+    temporal = (stem(w) for w in _WORD_RE.findall(normalize_question(question)))
+    return (
+        frozenset(numbers)
+        .union(w for w in temporal if w in TEMPORAL_TERMS)
+        .union(w for w in content_words(question) if w in guard_terms)
+    )
+
+
+@dataclass(slots=True)
+class SemanticEntry:
+    key: str
+    vector: SparseVector
+    guard: frozenset[str]
+    value: dict[str, Any]
+    expires_at: float
+
+
+class SemanticCache:
+    """Thread-safe LRU + TTL cache keyed by question similarity."""
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl_seconds: int = 300,
+        threshold: float = 0.8,
+        embedder: Embedder | None = None,
+        guard_terms: frozenset[str] = frozenset(),
+    ) -> None:
+        self._max_size = max_size
+        self._ttl_seconds = ttl_seconds
+        self._threshold = threshold
+        self._embedder = embedder or NgramEmbedder()
+        self._guard_terms = guard_terms
+        self._entries: OrderedDict[int, SemanticEntry] = OrderedDict()
+        self._postings: dict[str, set[int]] = defaultdict(set)
+        self._ids: dict[str, int] = {}
+        self._next_id = 0
+        self._lock = Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def lookup(self, question: str) -> tuple[dict[str, Any], float] | None:
+        """Return ``(payload, similarity)`` for the closest cached question above the threshold."""
+        vector = self._embedder.embed(question)
+        if not vector:
+            return None
+        guard = _guard(question, self._guard_terms)
+        now = time.monotonic()
+
+        with self._lock:
+            scores: dict[int, float] = defaultdict(float)
+            for feature, weight in vector.items():
+                for entry_id in self._postings.get(feature, ()):
+                    scores[entry_id] += weight * self._entries[entry_id].vector[feature]
+
+            for entry_id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+                if score < self._threshold:
+                    break
+                entry = self._entries[entry_id]
+                if entry.expires_at <= now:
+                    self._remove(entry_id)
+                    continue
+                if entry.guard != guard:
+                    continue
+                self._entries.move_to_end(entry_id)
+                self._hits += 1
+                return entry.value, round(min(score, 1.0), 4)
+
+            self._misses += 1
+            return None
+
+    def add(self, question: str, response: dict[str, Any]) -> None:
+        vector = self._embedder.embed(question)
+        if not vector:
+            return
+        normalized = normalize_question(question)
+        expires_at = time.monotonic() + self._ttl_seconds
+
+        with self._lock:
+            existing = self._ids.get(normalized)
+            if existing is not None:
+                self._remove(existing)
+            elif len(self._entries) >= self._max_size:
+                if not self._max_size:
+                    return
+                self._remove(next(iter(self._entries)))
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = SemanticEntry(
+                normalized, vector, _guard(question, self._guard_terms), response, expires_at
+            )
+            self._ids[normalized] = entry_id
+            for feature in vector:
+                self._postings[feature].add(entry_id)
+
+    def purge_expired(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            stale = [eid for eid, entry in self._entries.items() if entry.expires_at <= now]
+            for entry_id in stale:
+                self._remove(entry_id)
+            return len(stale)
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self._postings.clear()
+            self._ids.clear()
+            return count
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_size": self._max_size,
+                "ttl_seconds": self._ttl_seconds,
+                "threshold": self._threshold,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        for feature in entry.vector:
+            ids = self._postings.get(feature)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._postings[feature]
+        if self._ids.get(entry.key) == entry_id:
+            del self._ids[entry.key]
@@ -0,0 +1,47 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key onto one in-flight task.
+
+    The first caller starts the work; callers arriving before it finishes await the
+    same task and receive its result or its exception. Waiters are shielded, so one
+    caller being cancelled does not cancel the work for the others — but once every
+    caller has been cancelled (e.g. all their clients disconnected), the work is
+    cancelled too rather than finished for nobody.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._waiters: dict[asyncio.Task, int] = {}
+        self._coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """Run ``fn`` once per key at a time; returns ``(result, shared)``."""
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            self._coalesced += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task), shared
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    task.cancel()
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def stats(self) -> dict[str, int]:
+        return {"in_flight": len(self._inflight), "coalesced": self._coalesced}
@@ -1,8 +1,23 @@
+"""Read-only SQL validation in one tokenizer pass.
+
+A single compiled regex splits the SQL into words, literals, quoted identifiers,
+comments and punctuation; one walk over those tokens then finds the statement
+count, statement type, forbidden keywords, table references and whether a
+top-level LIMIT exists. Literals, quoted identifiers and comments are opaque, so
+``WHERE status = 'DELETE'`` is not a forbidden keyword and ``'a;b'`` is not a
+second statement. Table references include comma-separated FROM lists,
+schema-qualified names, subqueries and parenthesized joins; CTE names and function-call syntax such
+as ``EXTRACT(YEAR FROM order_date)`` are not tables.
+
+Results are memoized per (SQL, allow-list), so retries and cached SQL skip the
+pass entirely.
+"""
+
 import re
+from dataclasses import dataclass, field
+from functools import lru_cache
 
-import sqlparse
-from sqlparse.sql import Statement
-from sqlparse.tokens import DML, Keyword
+from app.services.catalog import get_catalog
 
 FORBIDDEN_KEYWORDS = {
     "INSERT",
@@ -19,59 +34,225 @@ FORBIDDEN_KEYWORDS = {
     "CALL",
 }
 
-ALLOWED_TABLES = {"customers", "products", "orders", "order_items"}
+DEFAULT_SCHEMA = "public"
+VALIDATION_CACHE_SIZE = 1024
+DEFAULT_LIMIT = 100
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<space>\s+)
+    | (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+    | (?P<string>[eE]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*'|\$(?P<tag>[A-Za-z_]\w*|)\$.*?\$(?P=tag)\$)
+    | (?P<ident>"(?:[^"]|"")*")
+    | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    | (?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+)
+    | (?P<punct>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+# Keywords that end a FROM item list at the current nesting level.
+_FROM_LIST_END = frozenset(
+    "WHERE GROUP HAVING ORDER LIMIT OFFSET FETCH UNION INTERSECT EXCEPT WINDOW FOR RETURNING SELECT".split()
+)
+_JOIN_MODIFIERS = frozenset({"LATERAL", "ONLY"})
+# TABLE name is shorthand for SELECT * FROM name, in a subquery or after UNION as much as on its own.
+_QUERY_STARTS = frozenset({"SELECT", "WITH", "VALUES", "TABLE"})
+_MAIN_STATEMENTS = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE", "MERGE", "VALUES"})
 
 
 class SQLValidationError(Exception):
     pass
 
 
-def _strip_comments(sql: str) -> str:
-    return sqlparse.format(sql, strip_comments=True).strip()
+@dataclass
+class SQLAnalysis:
+    cleaned: str
+    statements: int = 0
+    statement_type: str = "UNKNOWN"
+    forbidden: list[str] = field(default_factory=list)
+    tables: set[str] = field(default_factory=set)
+    ctes: set[str] = field(default_factory=set)
+    has_limit: bool = False
 
 
-def _extract_tables(sql: str) -> set[str]:
-    """Simple table name extraction from FROM/JOIN clauses."""
-    pattern = r"(?:FROM|JOIN)\s+([a-zA-Z_][a-zA-Z0-9_]*)"
-    return {m.lower() for m in re.findall(pattern, sql, re.IGNORECASE)}
+def _name(kind: str, text: str) -> str:
+    return text[1:-1].replace('""', '"') if kind == "ident" else text.lower()
 
 
-def validate_sql(sql: str, allowed_tables: set[str] | None = None) -> str:
-    """
-    Validate and normalize SQL for safe read-only execution.
-    Returns cleaned SQL or raises SQLValidationError.
-    """
-    if not sql or not sql.strip():
-        raise SQLValidationError("Empty SQL query.")
+def analyze_sql(sql: str) -> SQLAnalysis:
+    """Tokenize once and collect everything validation needs."""
+    tokens: list[tuple[str, str]] = []
+    pieces: list[str] = []
+    for match in _TOKEN_RE.finditer(sql):
+        kind = match.lastgroup
+        text = match.group()
+        if kind == "comment":
+            pieces.append(" ")
+            continue
+        pieces.append(text)
+        if kind != "space":
+            tokens.append((kind, text))
+
+    cleaned = "".join(pieces).strip()
+    while cleaned.endswith(";"):
+        cleaned = cleaned[:-1].rstrip()
+    result = SQLAnalysis(cleaned=cleaned)
+    if not tokens:
+        return result
+
+    result.statements = 1
+    refs: list[tuple[str, bool]] = []
+    query_ctx = [True]  # per paren depth: does this level hold a query (vs. function args)?
+    from_list = [False]  # per paren depth: inside a FROM item list
+    paren_openers: list[str | None] = []  # name before each open paren (CTE column lists)
+    expect_table = False
+    after_semicolon = False
+    fresh_paren = False
+    table_paren = False  # the fresh paren opened where a table was expected: FROM (a JOIN b) or a subquery
+    first_word = ""
+    prev_word = ""
+    prev_name: str | None = None
+
+    i, n = 0, len(tokens)
+    while i < n:
+        kind, text = tokens[i]
+        if after_semicolon and text != ";":
+            result.statements += 1
+            after_semicolon = False
+        upper = text.upper() if kind == "word" else ""
+
+        if fresh_paren:
+            query_ctx[-1] = upper in _QUERY_STARTS
+            if table_paren and not query_ctx[-1]:
+                # A parenthesized join: still a FROM item list, starting with a table reference.
+                query_ctx[-1] = from_list[-1] = expect_table = True
+            fresh_paren = False
 
-    cleaned = _strip_comments(sql)
+        if kind == "punct":
+            if text == ";":
+                after_semicolon = True
+                expect_table = False
+            elif text == "(":
+                paren_openers.append(prev_name)
+                query_ctx.append(False)
+                from_list.append(False)
+                fresh_paren = True
+                table_paren = expect_table
+                expect_table = False
+            elif text == ")":
+                if len(query_ctx) > 1:
+                    query_ctx.pop()
+                    from_list.pop()
+                opener = paren_openers.pop() if paren_openers else None
+                # name(col, ...) AS ( — a CTE with a column list
+                if _is_cte_body(tokens, i + 1) and opener:
+                    result.ctes.add(opener)
+            elif text == "," and from_list[-1]:
+                expect_table = True
+            prev_word, prev_name = "", None
+            i += 1
+            continue
 
-    # Reject multiple statements
-    statements: list[Statement] = sqlparse.parse(cleaned)
-    if len(statements) != 1:
-        raise SQLValidationError("Only a single SQL statement is allowed.")
+        if kind == "word":
+            if not first_word:
+                first_word = upper
+                if upper != "WITH":
+                    result.statement_type = upper
+            elif first_word == "WITH" and result.statement_type == "UNKNOWN" and len(query_ctx) == 1:
+                if upper in _MAIN_STATEMENTS:
+                    result.statement_type = upper
+            if upper in FORBIDDEN_KEYWORDS and upper not in result.forbidden:
+                result.forbidden.append(upper)
+            if len(query_ctx) == 1 and upper in ("LIMIT", "FETCH"):
+                result.has_limit = True
 
-    stmt = statements[0]
-    stmt_type = stmt.get_type()
-    if stmt_type and stmt_type.upper() != "SELECT":
-        raise SQLValidationError(f"Only SELECT queries are allowed, got {stmt_type}.")
+        if expect_table and (kind == "word" or kind == "ident"):
+            if upper in _JOIN_MODIFIERS:
+                i += 1
+                continue
+            parts = [_name(kind, text)]
+            while i + 2 < n and tokens[i + 1][1] == "." and tokens[i + 2][0] in ("word", "ident"):
+                parts.append(_name(*tokens[i + 2]))
+                i += 2
+            # Only unqualified names can refer to a CTE; public.x is the table x.
+            qualified = len(parts) > 1
+            if qualified and parts[0] == DEFAULT_SCHEMA:
+                parts = parts[1:]
+            refs.append((".".join(parts), qualified))
+            expect_table = False
+            prev_word, prev_name = "", None
+            i += 1
+            continue
+        expect_table = False
 
-    upper = cleaned.upper()
-    for kw in FORBIDDEN_KEYWORDS:
-        if re.search(rf"\b{kw}\b", upper):
-            raise SQLValidationError(f"Forbidden keyword: {kw}")
+        if kind == "word" and query_ctx[-1]:
+            if upper == "FROM" and prev_word != "DISTINCT":
+                expect_table = True
+                from_list[-1] = True
+            elif upper in ("JOIN", "TABLE"):
+                expect_table = True
+            elif upper in _FROM_LIST_END:
+                from_list[-1] = False
+        if kind in ("word", "ident") and _is_cte_body(tokens, i + 1):
+            result.ctes.add(_name(kind, text))
 
-    if ";" in cleaned.rstrip(";"):
-        raise SQLValidationError("Multiple statements detected.")
+        prev_word = upper if kind == "word" else ""
+        prev_name = _name(kind, text) if kind in ("word", "ident") else None
+        i += 1
 
-    tables = _extract_tables(cleaned)
-    permitted = allowed_tables or ALLOWED_TABLES
-    unknown = tables - permitted
+    result.tables = {name for name, qualified in refs if qualified or name not in result.ctes}
+    return result
+
+
+def _is_cte_body(tokens: list[tuple[str, str]], i: int) -> bool:
+    """True if tokens[i:] is ``AS [NOT] [MATERIALIZED] (`` — the body of a CTE."""
+    if i >= len(tokens) or tokens[i][1].upper() != "AS":
+        return False
+    i += 1
+    while i < len(tokens) and tokens[i][1].upper() in ("NOT", "MATERIALIZED"):
+        i += 1
+    return i < len(tokens) and tokens[i][1] == "("
+
+
+def extract_tables(sql: str) -> set[str]:
+    """Tables read by the query (FROM/JOIN items, subqueries included; CTE names excluded)."""
+    return analyze_sql(sql).tables
+
+
+@lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def _validate(sql: str, permitted: frozenset[str]) -> tuple[str, str | None]:
+    """(cleaned SQL, error message or None) — cached, so failures are cached too."""
+    analysis = analyze_sql(sql)
+    if not analysis.cleaned:
+        return "", "Empty SQL query."
+    if analysis.statements != 1:
+        return "", "Only a single SQL statement is allowed."
+    if analysis.statement_type != "SELECT":
+        return "", f"Only SELECT queries are allowed, got {analysis.statement_type}."
+    if analysis.forbidden:
+        return "", f"Forbidden keyword: {analysis.forbidden[0]}"
+
+    unknown = analysis.tables - permitted
     if unknown:
-        raise SQLValidationError(f"Access to table(s) not allowed: {', '.join(sorted(unknown))}")
+        return "", f"Access to table(s) not allowed: {', '.join(sorted(unknown))}"
+
+    cleaned = analysis.cleaned
+    if not analysis.has_limit:
+        cleaned = f"{cleaned} LIMIT {DEFAULT_LIMIT}"
+    return cleaned, None
 
-    # Ensure LIMIT exists (caller may append; warn if missing)
-    if "LIMIT" not in upper:
-        cleaned = cleaned.rstrip(";") + " LIMIT 100"
 
+def validate_sql(sql: str, allowed_tables: set[str] | None = None) -> str:
+    """
+    Validate and normalize SQL for safe read-only execution.
+    Returns cleaned SQL or raises SQLValidationError.
+    """
+    if not sql or not sql.strip():
+        raise SQLValidationError("Empty SQL query.")
+
+    permitted = frozenset(allowed_tables) if allowed_tables else get_catalog().allowed_tables
+    cleaned, error = _validate(sql, permitted)
+    if error:
+        raise SQLValidationError(error)
     return cleaned
@@ -0,0 +1,111 @@
+"""Per-table version counters used to invalidate cached results after data changes.
+
+Cached entries record the versions of the tables they read. Any change to one of
+those versions makes the entry stale. Versions are bumped by the Postgres trigger
+in ``TABLE_VERSIONS_DDL`` (delivered via LISTEN/NOTIFY) or set from the admin API.
+With ``CACHE_BACKEND=redis`` the shared copy in Redis is authoritative and this map
+mirrors it (see ``RedisCacheBackend``).
+"""
+
+import asyncio
+from collections.abc import Awaitable, Callable, Iterable
+from threading import Lock
+
+import asyncpg
+from sqlalchemy.engine import make_url
+
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+NOTIFY_CHANNEL = "copilot_table_changes"
+RECONNECT_DELAY_SECONDS = 5
+
+
+class TableVersions:
+    """Thread-safe table → version map. Unknown tables are at version 0."""
+
+    def __init__(self) -> None:
+        self._versions: dict[str, int] = {}
+        self._lock = Lock()
+
+    def get(self, table: str) -> int:
+        with self._lock:
+            return self._versions.get(table, 0)
+
+    def snapshot(self, tables: Iterable[str]) -> dict[str, int]:
+        with self._lock:
+            return {table: self._versions.get(table, 0) for table in tables}
+
+    def is_current(self, snapshot: dict[str, int]) -> bool:
+        with self._lock:
+            return all(self._versions.get(table, 0) == version for table, version in snapshot.items())
+
+    def bump(self, table: str) -> int:
+        with self._lock:
+            version = self._versions.get(table, 0) + 1
+            self._versions[table] = version
+            return version
+
+    def set(self, table: str, version: int) -> int:
+        with self._lock:
+            self._versions[table] = version
+            return version
+
+    def all(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._versions)
+
+
+def asyncpg_dsn(database_url: str) -> str:
+    """SQLAlchemy ``postgresql+asyncpg://`` URL → plain DSN for asyncpg.connect()."""
+    return make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+def apply_notification(versions: TableVersions, payload: str) -> str:
+    """Payload is ``table:version`` from the trigger, or a bare ``table`` to bump. Returns the table."""
+    table, _, version = payload.partition(":")
+    if version.isdigit():
+        versions.set(table, int(version))
+    else:
+        versions.bump(table)
+    logger.info("table_version_changed", table=table, version=versions.get(table))
+    return table
+
+
+async def listen_for_table_changes(
+    database_url: str,
+    versions: TableVersions,
+    publish: Callable[[str, int], Awaitable[int]] | None = None,
+) -> None:
+    """Background task: load persisted versions, then follow NOTIFYs until cancelled.
+
+    ``publish`` receives every (table, version) — the shared Redis copy, when there is one.
+    """
+    dsn = asyncpg_dsn(database_url)
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(dsn)
+            try:
+                for row in await conn.fetch("SELECT table_name, version FROM copilot_table_versions"):
+                    versions.set(row["table_name"], row["version"])
+                    if publish is not None:
+                        await publish(row["table_name"], row["version"])
+            except asyncpg.UndefinedTableError:
+                logger.warning("table_versions_table_missing")
+            changes: asyncio.Queue[str] = asyncio.Queue()
+            await conn.add_listener(NOTIFY_CHANNEL, lambda _conn, _pid, _channel, payload: changes.put_nowait(payload))
+            logger.info("table_versions_listening", channel=NOTIFY_CHANNEL)
+            while True:
+                table = apply_notification(versions, await changes.get())
+                if publish is not None:
+                    await publish(table, versions.get(table))
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.warning("table_versions_listener_failed", error=str(exc))
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+        finally:
+            if conn is not None and not conn.is_closed():
+                await conn.close()
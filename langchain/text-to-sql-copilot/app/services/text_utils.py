@@ -0,0 +1,10 @@
+"""Word normalization shared by the semantic cache and schema linking."""
+
+
+def stem(word: str) -> str:
+    """Light plural stripping: "categories" -> "category", "orders" -> "order", "address" unchanged."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
@@ -0,0 +1,321 @@
+"""Materialized-view advisor for hot aggregate queries.
+
+Every executed statement is recorded by shape: normalized SQL without its
+top-level ``ORDER BY`` / ``LIMIT``. Aggregates (``GROUP BY`` or aggregate
+functions) that run at least ``min_calls`` times with a mean above
+``min_mean_ms`` are advised as materialized views over that shape. Once a view
+exists and has been refreshed, matching SQL is rewritten to
+``SELECT * FROM <view> [ORDER BY ...] [LIMIT n]``; the ORDER BY is kept only when
+it names output columns, so the rewrite returns the same rows in the same order.
+
+A view answers only while the tables it reads are at the versions recorded at
+its last refresh (see ``TableVersions``); after a data change, queries go back to
+the base tables until the next scheduled refresh. Views are created, owned and
+refreshed by a dedicated role (``MATVIEW_OWNER_URL``) with SELECT on the base
+tables and CREATE on the schema, since the query role is read-only and the view
+bodies come from generated SQL. Superuser connections are refused, and every
+statement runs under ``statement_timeout``. A pass holds a Postgres advisory lock
+on that connection, so with several workers only one of them creates and
+refreshes at a time; the others skip the pass.
+"""
+
+import asyncio
+import hashlib
+import re
+import time
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any
+
+import asyncpg
+from sqlalchemy.engine import make_url
+
+from app.db.schema import MATVIEW_PREFIX
+from app.logging_config import get_logger
+from app.services.result_cache import normalize_sql
+from app.services.sql_validator import extract_tables
+from app.services.table_versions import TableVersions, asyncpg_dsn
+
+logger = get_logger(__name__)
+
+VIEW_PREFIX = MATVIEW_PREFIX
+# pg_try_advisory_lock key for the maintenance pass (any app-wide constant; "copilot_" in ASCII)
+MAINTENANCE_LOCK_KEY = 0x636F70696C6F745F
+
+_TRAILING_LIMIT_RE = re.compile(r"\s+LIMIT\s+(\d+)\s*$", re.IGNORECASE)
+_TRAILING_ORDER_RE = re.compile(r"\s+ORDER\s+BY\s+([^()]+?)\s*$", re.IGNORECASE)
+_ORDER_ITEM_RE = re.compile(r'^(?:\w+|"[^"]+")(?:\s+(?:ASC|DESC))?(?:\s+NULLS\s+(?:FIRST|LAST))?$', re.IGNORECASE)
+_AGGREGATE_RE = re.compile(r"\bGROUP\s+BY\b|\b(?:COUNT|SUM|AVG|MIN|MAX)\s*\(", re.IGNORECASE)
+_ORDER_OR_OFFSET_RE = re.compile(r"\b(?:ORDER\s+BY|OFFSET)\b", re.IGNORECASE)
+_QUOTED_RE = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"")
+
+
+@dataclass(frozen=True)
+class QueryShape:
+    body: str  # view definition: normalized SQL without top-level ORDER BY / LIMIT
+    order_by: str = ""
+    limit: int | None = None
+
+
+@dataclass
+class QueryStats:
+    body: str
+    tables: list[str]
+    calls: int = 0
+    total_ms: float = 0.0
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ms / self.calls if self.calls else 0.0
+
+
+@dataclass
+class MaterializedView:
+    name: str
+    body: str
+    tables: list[str]
+    baseline_ms: float  # mean duration against the base tables when the view was created
+    created_at: float = field(default_factory=time.time)
+    refreshed_at: float | None = None
+    versions: dict[str, int] = field(default_factory=dict)
+    hits: int = 0
+    saved_ms: float = 0.0
+
+
+def view_name(body: str) -> str:
+    return VIEW_PREFIX + hashlib.sha256(body.encode()).hexdigest()[:12]
+
+
+def view_reader(database_url: str) -> str:
+    """Role the app queries as; views are granted to it because they are owned by the view-owner role."""
+    return make_url(database_url).username or ""
+
+
+def _has_top_level_order(body: str) -> bool:
+    """ORDER BY / OFFSET outside parentheses (window and subquery clauses are fine)."""
+    unquoted = _QUOTED_RE.sub("''", body)
+    return any(
+        unquoted[: m.start()].count("(") == unquoted[: m.start()].count(")")
+        for m in _ORDER_OR_OFFSET_RE.finditer(unquoted)
+    )
+
+
+def split_query(sql: str) -> QueryShape | None:
+    """Shape of a rewritable aggregate, or None (not an aggregate, OFFSET, or ORDER BY on expressions)."""
+    body = normalize_sql(sql)
+    limit = None
+    match = _TRAILING_LIMIT_RE.search(body)
+    if match:
+        body, limit = body[: match.start()], int(match.group(1))
+    order_by = ""
+    match = _TRAILING_ORDER_RE.search(body)
+    if match:
+        items = [item.strip() for item in match.group(1).split(",")]
+        if not all(_ORDER_ITEM_RE.match(item) for item in items):
+            return None
+        body, order_by = body[: match.start()], ", ".join(items)
+    if _has_top_level_order(body) or not _AGGREGATE_RE.search(body):
+        return None
+    return QueryShape(body=body, order_by=order_by, limit=limit)
+
+
+class ViewAdvisor:
+    """Tracks executed aggregates, advises views for the hot ones and rewrites SQL onto active views."""
+
+    def __init__(
+        self,
+        versions: TableVersions,
+        min_calls: int = 5,
+        min_mean_ms: float = 50.0,
+        max_views: int = 10,
+        max_tracked: int = 1000,
+    ) -> None:
+        self._versions = versions
+        self.min_calls = min_calls
+        self.min_mean_ms = min_mean_ms
+        self.max_views = max_views
+        self.max_tracked = max_tracked
+        self._stats: dict[str, QueryStats] = {}
+        self._views: dict[str, MaterializedView] = {}  # by body
+        self._lock = Lock()
+
+    def record(self, sql: str, elapsed_ms: float) -> None:
+        """Time spent running ``sql`` against the base tables."""
+        shape = split_query(sql)
+        if shape is None:
+            return
+        with self._lock:
+            stats = self._stats.get(shape.body)
+            if stats is None:
+                if len(self._stats) >= self.max_tracked:
+                    coldest = min(self._stats.values(), key=lambda s: s.total_ms)
+                    del self._stats[coldest.body]
+                stats = self._stats[shape.body] = QueryStats(shape.body, sorted(extract_tables(shape.body)))
+            stats.calls += 1
+            stats.total_ms += elapsed_ms
+
+    def advised(self) -> list[QueryStats]:
+        """Hot aggregates without a view yet, most total time first, up to the free view slots."""
+        with self._lock:
+            hot = [
+                s
+                for s in self._stats.values()
+                if s.body not in self._views and s.calls >= self.min_calls and s.mean_ms >= self.min_mean_ms
+            ]
+            slots = max(self.max_views - len(self._views), 0)
+        return sorted(hot, key=lambda s: s.total_ms, reverse=True)[:slots]
+
+    def activate(self, stats: QueryStats) -> MaterializedView:
+        """Register a created (not yet refreshed) view for ``stats``."""
+        with self._lock:
+            view = self._views.get(stats.body)
+            if view is None:
+                view = MaterializedView(view_name(stats.body), stats.body, stats.tables, baseline_ms=stats.mean_ms)
+                self._views[stats.body] = view
+            return view
+
+    def mark_refreshed(self, view: MaterializedView, versions: dict[str, int]) -> None:
+        """``versions`` must be snapshotted before the refresh started, so concurrent changes count as stale."""
+        with self._lock:
+            view.versions = versions
+            view.refreshed_at = time.time()
+
+    def views(self) -> list[MaterializedView]:
+        with self._lock:
+            return list(self._views.values())
+
+    def rewrite(self, sql: str) -> tuple[str, MaterializedView] | None:
+        """``SELECT * FROM <view> ...`` for SQL matching a fresh view, else None."""
+        with self._lock:
+            if not self._views:
+                return None
+        shape = split_query(sql)
+        if shape is None:
+            return None
+        with self._lock:
+            view = self._views.get(shape.body)
+        if view is None or view.refreshed_at is None or not self._versions.is_current(view.versions):
+            return None
+        rewritten = f"SELECT * FROM {view.name}"
+        if shape.order_by:
+            rewritten += f" ORDER BY {shape.order_by}"
+        if shape.limit is not None:
+            rewritten += f" LIMIT {shape.limit}"
+        return rewritten, view
+
+    def record_hit(self, view: MaterializedView, elapsed_ms: float) -> None:
+        with self._lock:
+            view.hits += 1
+            view.saved_ms += max(view.baseline_ms - elapsed_ms, 0.0)
+
+    def stats(self) -> dict[str, Any]:
+        advised = self.advised()
+        views = self.views()
+        return {
+            "advised": [
+                {
+                    "name": view_name(s.body),
+                    "sql": s.body,
+                    "tables": s.tables,
+                    "calls": s.calls,
+                    "mean_ms": round(s.mean_ms, 2),
+                    "total_ms": round(s.total_ms, 2),
+                }
+                for s in advised
+            ],
+            "active": [
+                {
+                    "name": v.name,
+                    "sql": v.body,
+                    "tables": v.tables,
+                    "baseline_ms": round(v.baseline_ms, 2),
+                    "hits": v.hits,
+                    "saved_ms": round(v.saved_ms, 2),
+                    "refreshed_at": v.refreshed_at,
+                    "fresh": v.refreshed_at is not None and self._versions.is_current(v.versions),
+                }
+                for v in views
+            ],
+            "saved_ms": round(sum(v.saved_ms for v in views), 2),
+        }
+
+
+async def sync_views(conn: Any, advisor: ViewAdvisor, versions: TableVersions, *, create: bool, reader: str) -> dict:
+    """One maintenance pass on a view-owner connection: create advised views (when allowed), refresh active ones."""
+    created, refreshed, failed = [], [], []
+    if create:
+        for stats in advisor.advised():
+            name = view_name(stats.body)
+            try:
+                await conn.execute(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS {stats.body} WITH NO DATA")
+                if reader:
+                    await conn.execute(f'GRANT SELECT ON {name} TO "{reader}"')
+            except Exception as exc:
+                logger.warning("matview_create_failed", view=name, error=str(exc))
+                failed.append(name)
+                continue
+            advisor.activate(stats)
+            created.append(name)
+            logger.info("matview_created", view=name, calls=stats.calls, mean_ms=round(stats.mean_ms, 2))
+    for view in advisor.views():
+        snapshot = versions.snapshot(view.tables)
+        try:
+            await conn.execute(f"REFRESH MATERIALIZED VIEW {view.name}")
+        except Exception as exc:
+            logger.warning("matview_refresh_failed", view=view.name, error=str(exc))
+            failed.append(view.name)
+            continue
+        advisor.mark_refreshed(view, snapshot)
+        refreshed.append(view.name)
+    if created or refreshed:
+        logger.info("matviews_synced", created=len(created), refreshed=len(refreshed), failed=len(failed))
+    return {"created": created, "refreshed": refreshed, "failed": failed}
+
+
+async def sync_views_once(
+    owner_url: str,
+    advisor: ViewAdvisor,
+    versions: TableVersions,
+    *,
+    create: bool,
+    reader: str,
+    statement_timeout: float,
+) -> dict:
+    """Connect as the view owner with ``statement_timeout`` (seconds) and run one pass.
+
+    Skipped (``skipped: True``) while another worker holds the maintenance lock; the
+    session-level lock is released when the connection closes.
+    """
+    conn = await asyncpg.connect(
+        asyncpg_dsn(owner_url), server_settings={"statement_timeout": str(int(statement_timeout * 1000))}
+    )
+    try:
+        if await conn.fetchval("SELECT rolsuper FROM pg_roles WHERE rolname = current_user"):
+            raise PermissionError("MATVIEW_OWNER_URL must not connect as a superuser")
+        if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", MAINTENANCE_LOCK_KEY):
+            logger.info("matview_sync_skipped", reason="another worker holds the maintenance lock")
+            return {"created": [], "refreshed": [], "failed": [], "skipped": True}
+        return await sync_views(conn, advisor, versions, create=create, reader=reader)
+    finally:
+        await conn.close()
+
+
+async def run_view_maintenance(
+    owner_url: str,
+    advisor: ViewAdvisor,
+    versions: TableVersions,
+    interval: float,
+    *,
+    create: bool,
+    reader: str,
+    statement_timeout: float,
+) -> None:
+    """Background task: every ``interval`` seconds, create newly advised views and refresh the active ones."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await sync_views_once(
+                owner_url, advisor, versions, create=create, reader=reader, statement_timeout=statement_timeout
+            )
+        except Exception as exc:
+            logger.warning("matview_sync_failed", error=str(exc))
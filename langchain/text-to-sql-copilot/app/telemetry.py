@@ -0,0 +1,198 @@
+"""Latency spans and Prometheus metrics, with optional OTLP trace export.
+
+``span("execute_sql")`` times a block into the ``copilot_span_seconds`` histogram
+(label ``span``) and counts exceptions in ``copilot_span_errors_total``. Every
+graph node is wrapped with ``traced_node``; the LLM call and the database calls
+open their own spans (``llm``, ``db.execute``, ``db.explain``). With
+``OTLP_ENDPOINT`` set, each span is also an OpenTelemetry span exported over
+OTLP/HTTP; otherwise no tracer is touched and a span costs one histogram
+observation.
+
+Metrics live in a dedicated registry rendered by ``GET /metrics``. Each worker
+process exposes its own values; scrape every worker (or sum them in PromQL).
+"""
+
+import functools
+from collections.abc import Awaitable, Callable, Mapping
+from contextvars import ContextVar, Token
+from time import perf_counter
+from typing import Any
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.exposition import CONTENT_TYPE_LATEST
+
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REGISTRY = CollectorRegistry()
+
+SPAN_SECONDS = Histogram(
+    "copilot_span_seconds",
+    "Latency of agent steps, LLM and DB calls",
+    ["span"],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+SPAN_ERRORS = Counter("copilot_span_errors_total", "Spans that ended with an exception", ["span"], registry=REGISTRY)
+LLM_TOKENS = Counter("copilot_llm_tokens_total", "LLM tokens reported by the provider", ["kind"], registry=REGISTRY)
+AGENT_RUNS = Counter("copilot_agent_runs_total", "Completed agent runs", ["outcome"], registry=REGISTRY)
+RETRIES = Counter("copilot_retries_total", "SQL regeneration attempts", ["reason"], registry=REGISTRY)
+LLM_IN_FLIGHT = Gauge("copilot_llm_in_flight", "LLM calls holding an admission slot", registry=REGISTRY)
+LLM_QUEUE_DEPTH = Gauge("copilot_llm_queue_depth", "LLM calls waiting for an admission slot", registry=REGISTRY)
+LLM_QUEUE_WAIT_SECONDS = Histogram(
+    "copilot_llm_queue_wait_seconds",
+    "Time LLM calls waited for an admission slot",
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+LLM_REJECTED = Counter("copilot_llm_rejected_total", "LLM calls rejected with a full queue", registry=REGISTRY)
+REQUESTS_CANCELLED = Counter(
+    "copilot_requests_cancelled_total", "Requests cancelled because the client disconnected", ["endpoint"], registry=REGISTRY
+)
+DB_QUERIES_CANCELLED = Counter(
+    "copilot_db_queries_cancelled_total", "SQL statements cancelled while running", registry=REGISTRY
+)
+DB_POOL = Gauge(
+    "copilot_db_pool_connections", "Database pool connections", ["datasource", "state"], registry=REGISTRY
+)
+
+
+class CacheCollector:
+    """Cache hits and misses as counters, read from the caches' own tallies at scrape time.
+
+    The caches count lookups themselves; ``lookups`` maps tier -> (hits, misses) and is set by
+    ``render_metrics`` right before the registry is collected.
+    """
+
+    def __init__(self) -> None:
+        self.lookups: Mapping[str, tuple[int, int]] = {}
+
+    def collect(self):
+        hits = CounterMetricFamily("copilot_cache_hits", "Cache hits since process start", labels=["tier"])
+        misses = CounterMetricFamily("copilot_cache_misses", "Cache misses since process start", labels=["tier"])
+        ratio = GaugeMetricFamily("copilot_cache_hit_ratio", "Hits / lookups since process start", labels=["tier"])
+        for tier, (hit, miss) in self.lookups.items():
+            hits.add_metric([tier], hit)
+            misses.add_metric([tier], miss)
+            ratio.add_metric([tier], hit / (hit + miss) if hit + miss else 0.0)
+        yield hits
+        yield misses
+        yield ratio
+
+
+CACHE_LOOKUPS = CacheCollector()
+REGISTRY.register(CACHE_LOOKUPS)
+
+_series: dict[str, Any] = {}
+_tracer = None
+# Per-request accumulator (a ledger RequestRecord): spans and token counts inside the request add to it.
+_request: ContextVar[Any] = ContextVar("copilot_request", default=None)
+
+
+def bind_request(record: Any) -> Token:
+    """Route span times (``observe(name, seconds)``) and tokens (``add_tokens(kind, n)``) to ``record``."""
+    return _request.set(record)
+
+
+def unbind_request(token: Token) -> None:
+    try:
+        _request.reset(token)
+    except ValueError:
+        # An abandoned streaming response is closed from another context; nothing is bound there.
+        pass
+
+
+class span:
+    """Context manager timing one step. Cheap enough to wrap every node and call."""
+
+    __slots__ = ("name", "_start", "_otel")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> "span":
+        self._otel = _tracer.start_as_current_span(self.name) if _tracer is not None else None
+        if self._otel is not None:
+            self._otel.__enter__()
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        elapsed = perf_counter() - self._start
+        series = _series.get(self.name)
+        if series is None:
+            series = _series.setdefault(self.name, SPAN_SECONDS.labels(self.name))
+        series.observe(elapsed)
+        record = _request.get()
+        if record is not None:
+            record.observe(self.name, elapsed)
+        if exc_type is not None:
+            SPAN_ERRORS.labels(self.name).inc()
+        if self._otel is not None:
+            self._otel.__exit__(exc_type, exc, tb)
+
+
+def traced_node(name: str, node: Callable[..., Awaitable[dict]]) -> Callable[..., Awaitable[dict]]:
+    """Wrap an async graph node in a span; the signature is kept so LangGraph still passes ``config``."""
+
+    @functools.wraps(node)
+    async def wrapper(*args, **kwargs) -> dict:
+        with span(name):
+            return await node(*args, **kwargs)
+
+    return wrapper
+
+
+def record_llm_usage(message: Any) -> None:
+    """Token counts from ``AIMessage.usage_metadata``, when the provider reports them."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    record = _request.get()
+    for kind in ("input", "output"):
+        tokens = usage.get(f"{kind}_tokens")
+        if tokens:
+            LLM_TOKENS.labels(kind).inc(tokens)
+            if record is not None:
+                record.add_tokens(kind, tokens)
+
+
+def render_metrics(
+    cache_lookups: Mapping[str, tuple[int, int]], pools: Mapping[str, Mapping[str, int]] | None = None
+) -> bytes:
+    """Prometheus text exposition.
+
+    ``cache_lookups`` maps tier -> (hits, misses) and ``pools`` maps datasource -> state -> connections,
+    both read at scrape time.
+    """
+    for datasource, pool in (pools or {}).items():
+        for state, connections in pool.items():
+            DB_POOL.labels(datasource, state).set(connections)
+    CACHE_LOOKUPS.lookups = cache_lookups
+    return generate_latest(REGISTRY)
+
+
+def configure_tracing(endpoint: str, service_name: str) -> bool:
+    """Export spans over OTLP/HTTP. Needs the OpenTelemetry SDK and exporter; returns False without them."""
+    global _tracer
+    if not endpoint:
+        return False
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError as exc:
+        logger.warning("otlp_unavailable", error=str(exc))
+        return False
+
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint)))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("copilot")
+    logger.info("otlp_tracing_enabled", endpoint=endpoint, service=service_name)
+    return True
@@ -0,0 +1 @@
+"""Micro-benchmarks and load-test helpers for the copilot (not shipped in the image)."""
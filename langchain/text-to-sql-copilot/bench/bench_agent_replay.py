@@ -0,0 +1,148 @@
+"""Reproducible end-to-end baseline of ``run_agent`` from an LLM cassette.
+
+    python -m bench.bench_agent_replay --record [--record-provider groq]   # once, online; commit the cassette
+    python -m bench.bench_agent_replay --out baseline.json                 # offline replay
+    python -m bench.bench_agent_replay --compare baseline.json [--tolerance 0.15]
+
+Each question (default: scripts/warmup_questions.txt) runs --repeat times through
+the compiled graph with ``LLM_PROVIDER=replay``. Replies and their latency come
+from the cassette (app/llm/cassette.py), and SQL runs on a fixed-latency stub
+executor, so two runs on the same commit give the same numbers up to scheduler
+noise. The result and question caches are off, so every run pays for the full graph.
+
+--compare prints per-question and overall deltas against an earlier --out file and
+exits 1 when p50/p95 latency grew by more than --tolerance, or LLM calls or tokens changed.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _configure_env(args: argparse.Namespace) -> None:
+    os.environ.update(
+        {
+            "LLM_PROVIDER": "replay",
+            "LLM_CASSETTE_PATH": args.cassette,
+            "LLM_CASSETTE_MODE": "record" if args.record else "replay",
+            "LLM_CASSETTE_LATENCY_SCALE": str(args.latency_scale),
+            "RESULT_CACHE_ENABLED": "false",
+            "TEMPLATES_ENABLED": str(not args.no_templates).lower(),
+            "CATALOG_SOURCE": "static",
+            "LEDGER_PATH": "",
+            "LOG_LEVEL": "WARNING",
+        }
+    )
+    if args.record_provider:
+        os.environ["LLM_CASSETTE_RECORD_PROVIDER"] = args.record_provider
+
+
+async def _measure(questions: list[str], repeat: int, db_latency_ms: float) -> dict:
+    from app.agents import graph as graph_module
+    from app.agents.runner import run_agent
+    from app.telemetry import LLM_TOKENS
+
+    async def execute(session, sql):
+        await asyncio.sleep(db_latency_ms / 1000)
+        return ["n"], [[5]]
+
+    graph_module.execute_readonly_query = execute
+
+    def tokens() -> int:
+        return int(LLM_TOKENS.labels("input")._value.get() + LLM_TOKENS.labels("output")._value.get())
+
+    results = {}
+    for question in questions:
+        latencies = []
+        before = tokens()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            state = await run_agent(question, object())
+            latencies.append((time.perf_counter() - start) * 1000)
+        results[question] = {
+            "latency_ms": round(statistics.median(latencies), 2),
+            "llm_calls": state.get("llm_calls", 0),
+            "retries": state.get("retry_count", 0),
+            "tokens": (tokens() - before) // repeat,
+            "sql": state.get("sql"),
+        }
+    return results
+
+
+def _summary(results: dict) -> dict:
+    latencies = sorted(r["latency_ms"] for r in results.values())
+    return {
+        "questions": len(results),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0], 2),
+        "llm_calls": sum(r["llm_calls"] for r in results.values()),
+        "retries": sum(r["retries"] for r in results.values()),
+        "tokens": sum(r["tokens"] for r in results.values()),
+    }
+
+
+def _compare(current: dict, baseline: dict, tolerance: float) -> bool:
+    """Print deltas; True when nothing regressed."""
+    ok = True
+    print(f"{'metric':<10} {'baseline':>10} {'current':>10} {'delta':>8}")
+    for metric, value in current["summary"].items():
+        old = baseline["summary"].get(metric)
+        if old is None:
+            continue
+        delta = (value - old) / old if old else 0.0
+        regressed = (metric in ("p50_ms", "p95_ms") and delta > tolerance) or (
+            metric in ("llm_calls", "tokens") and value != old
+        )
+        ok = ok and not regressed
+        print(f"{metric:<10} {old:>10} {value:>10} {delta:>+7.1%}{'  <-- regression' if regressed else ''}")
+    for question, result in current["results"].items():
+        old = baseline["results"].get(question)
+        if old is not None and result["sql"] != old["sql"]:
+            print(f"SQL changed: {question}")
+    return ok
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", default=str(ROOT / "scripts" / "warmup_questions.txt"))
+    parser.add_argument("--cassette", default=str(ROOT / "bench" / "cassettes" / "agent.json"))
+    parser.add_argument("--record", action="store_true", help="send prompts missing from the cassette to a live model")
+    parser.add_argument("--record-provider", choices=["ollama", "groq", "stub"], default="")
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    parser.add_argument("--db-latency-ms", type=float, default=5.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-templates", action="store_true")
+    parser.add_argument("--out", default="")
+    parser.add_argument("--compare", default="")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    _configure_env(args)
+    from app.llm.cassette import CassetteMiss
+    from app.logging_config import setup_logging
+    from app.services.cache_warmup import load_questions
+
+    setup_logging("WARNING")
+    questions = load_questions(Path(args.questions))
+    try:
+        results = await _measure(questions, args.repeat, args.db_latency_ms)
+    except CassetteMiss as exc:
+        sys.exit(f"{exc} (run with --record)")
+    report = {"summary": _summary(results), "results": results}
+
+    print(json.dumps(report["summary"], indent=2))
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2, sort_keys=True))
+    if args.compare and not _compare(report, json.loads(Path(args.compare).read_text()), args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+"""Nightly-report workload: N sequential /query calls vs. one /query/batch call.
+
+    python -m bench.bench_batch [--questions 100] [--unique 60] [--latency-ms 50] [--concurrency 4]
+
+The agent is replaced by a stub that sleeps for --latency-ms (standing in for
+LLM + database time), so the numbers isolate request handling, deduplication
+and concurrency. Both runs start from an empty cache.
+"""
+
+import argparse
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from httpx import ASGITransport, AsyncClient
+
+from app.api import routes
+from app.db.engine import get_db_session
+from app.logging_config import setup_logging
+from app.main import app
+from app.services.cache_factory import get_cache_backend
+
+
+class _StubAgent:
+    def __init__(self, latency_s: float) -> None:
+        self.latency_s = latency_s
+        self.calls = 0
+
+    async def __call__(self, question: str, session) -> dict:
+        self.calls += 1
+        await asyncio.sleep(self.latency_s)
+        return {
+            "sql": "SELECT COUNT(*) AS n FROM customers LIMIT 100",
+            "answer": "Result: **5**",
+            "columns": ["n"],
+            "rows": [[5]],
+            "relevant_tables": ["customers"],
+            "llm_calls": 1,
+            "retry_count": 0,
+        }
+
+
+@asynccontextmanager
+async def _no_session():
+    yield object()
+
+
+async def _no_db():
+    yield object()
+
+
+def _workload(total: int, unique: int) -> list[str]:
+    return [f"Report metric number {i % unique}" for i in range(total)]
+
+
+async def _sequential(client: AsyncClient, questions: list[str]) -> float:
+    start = time.perf_counter()
+    for question in questions:
+        response = await client.post("/api/v1/query", json={"question": question})
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def _batch(client: AsyncClient, questions: list[str]) -> float:
+    start = time.perf_counter()
+    response = await client.post("/api/v1/query/batch", json={"questions": questions})
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--unique", type=int, default=60)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    setup_logging("WARNING")
+    routes.SessionLocal = _no_session
+    app.dependency_overrides[get_db_session] = _no_db
+    routes.settings.batch_max_concurrency = args.concurrency
+    routes.settings.batch_max_questions = max(routes.settings.batch_max_questions, args.questions)
+    questions = _workload(args.questions, args.unique)
+
+    rows = []
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        for label, run in (("sequential /query", _sequential), ("/query/batch", _batch)):
+            await get_cache_backend().clear()
+            agent = _StubAgent(args.latency_ms / 1000)
+            routes.run_agent = agent
+            elapsed = await run(client, questions)
+            rows.append((label, elapsed, agent.calls))
+
+    print(f"questions={args.questions} unique={args.unique} latency={args.latency_ms:.0f}ms "
+          f"concurrency={args.concurrency}")
+    print(f"{'mode':<18} {'total s':>8} {'q/s':>8} {'agent runs':>11}")
+    for label, elapsed, calls in rows:
+        print(f"{label:<18} {elapsed:8.2f} {args.questions / elapsed:8.1f} {calls:11d}")
+    print(f"speedup: {rows[0][1] / rows[1][1]:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
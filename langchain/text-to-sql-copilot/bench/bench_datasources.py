@@ -0,0 +1,127 @@
+"""Mixed traffic across three regional datasources: one shared pool vs. a pool per source.
+
+    python -m bench.bench_datasources [--requests 600] [--concurrency 48] [--pool-size 5]
+    python -m bench.bench_datasources --emea-ms 200 --other-ms 20   # one region with slow queries
+
+Requests are spread over emea/apac/amer (50/30/20) through the real /query route,
+selected with the X-Datasource header, with the cache bypassed. The agent is a stub
+that holds a "connection" (a slot in a pool of --pool-size) for the query time:
+--emea-ms for emea, --other-ms for the others. "shared" is the old single-engine
+setup, where every region queues for the same slots; "per source" gives each
+region its own pool, as DATASOURCES does. No Postgres or LLM is needed.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from collections import defaultdict
+
+REGIONS = {"emea": 0.5, "apac": 0.3, "amer": 0.2}
+
+
+def _configure_env() -> None:
+    sources = {name: {"url": f"postgresql+asyncpg://copilot:changeme@{name}-db/sales"} for name in REGIONS}
+    os.environ.update({"DATASOURCES": json.dumps(sources), "CATALOG_SOURCE": "static", "LEDGER_PATH": ""})
+
+
+class _StubAgent:
+    def __init__(self, pools: dict[str, asyncio.Semaphore], latency_s: dict[str, float]) -> None:
+        self.pools = pools
+        self.latency_s = latency_s
+
+    async def __call__(self, question: str, session) -> dict:
+        from app.db.datasources import current_datasource
+
+        region = current_datasource()
+        async with self.pools[region]:
+            await asyncio.sleep(self.latency_s[region])
+        return {
+            "sql": "SELECT COUNT(*) AS n FROM orders LIMIT 100",
+            "answer": "Result: **5**",
+            "columns": ["n"],
+            "rows": [[5]],
+            "relevant_tables": ["orders"],
+            "llm_calls": 1,
+        }
+
+
+async def _run(client, traffic: list[str], concurrency: int) -> tuple[float, dict[str, list[float]]]:
+    latencies: dict[str, list[float]] = defaultdict(list)
+    queue: asyncio.Queue = asyncio.Queue()
+    for i, region in enumerate(traffic):
+        queue.put_nowait((i, region))
+
+    async def worker() -> None:
+        while not queue.empty():
+            i, region = queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.post(
+                "/api/v1/query",
+                json={"question": f"Orders shipped in week {i}?"},
+                headers={"X-Datasource": region, "X-Cache-Bypass": "true"},
+            )
+            response.raise_for_status()
+            latencies[region].append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies
+
+
+def _p95(samples: list[float]) -> float:
+    return statistics.quantiles(samples, n=20)[-1] if len(samples) > 1 else samples[0]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=48)
+    parser.add_argument("--pool-size", type=int, default=5)
+    parser.add_argument("--emea-ms", type=float, default=50.0)
+    parser.add_argument("--other-ms", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    _configure_env()
+    from httpx import ASGITransport, AsyncClient
+
+    from app.api import routes
+    from app.db.engine import get_db_session
+    from app.logging_config import setup_logging
+    from app.main import app
+
+    async def no_db():
+        yield object()
+
+    setup_logging("WARNING")
+    app.dependency_overrides[get_db_session] = no_db
+    latency_s = {region: (args.emea_ms if region == "emea" else args.other_ms) / 1000 for region in REGIONS}
+    traffic = random.Random(args.seed).choices(list(REGIONS), weights=list(REGIONS.values()), k=args.requests)
+
+    shared = asyncio.Semaphore(args.pool_size)
+    modes = {
+        "shared": dict.fromkeys(REGIONS, shared),
+        "per source": {region: asyncio.Semaphore(args.pool_size) for region in REGIONS},
+    }
+    rows = []
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+        for label, pools in modes.items():
+            routes.run_agent = _StubAgent(pools, latency_s)
+            elapsed, latencies = await _run(client, traffic, args.concurrency)
+            rows.append((label, elapsed, latencies))
+
+    print(f"requests={args.requests} concurrency={args.concurrency} pool_size={args.pool_size} "
+          f"emea={args.emea_ms:.0f}ms apac/amer={args.other_ms:.0f}ms")
+    print(f"{'pools':<11} {'total s':>8} {'req/s':>8}  " + "  ".join(f"{r + ' p95 ms':>13}" for r in REGIONS))
+    for label, elapsed, latencies in rows:
+        p95s = "  ".join(f"{_p95(latencies[r]):13.0f}" for r in REGIONS)
+        print(f"{label:<11} {elapsed:8.2f} {args.requests / elapsed:8.1f}  {p95s}")
+    print(f"throughput gain: {rows[0][1] / rows[1][1]:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+"""Per-request agent overhead: build + compile per request vs. one compiled graph.
+
+    python -m bench.bench_graph_compile [--requests 200]
+
+Both paths run the full workflow with a stub chat model and a stub executor, so
+the difference is graph construction, compilation and LLM client creation.
+"Clients created" stands in for fresh HTTP connection pools: every ChatGroq /
+ChatOllama instance opens its own.
+"""
+
+import argparse
+import asyncio
+import time
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from app.agents import graph as graph_module
+from app.agents.graph import build_graph
+from app.logging_config import setup_logging
+
+SQL_REPLY = '{"sql": "SELECT COUNT(*) AS n FROM customers LIMIT 100"}'
+
+
+class _ClientCounter:
+    def __init__(self) -> None:
+        self.created = 0
+
+    def __call__(self) -> FakeListChatModel:
+        self.created += 1
+        return FakeListChatModel(responses=[SQL_REPLY])
+
+
+async def _stub_execute(session, sql):
+    return ["n"], [[5]]
+
+
+async def _invoke(graph) -> None:
+    initial = {"question": "How many customers?", "retry_count": 0, "llm_calls": 0}
+    await graph.ainvoke(initial, config={"configurable": {"session": object()}})
+
+
+async def _per_request(n: int, factory: _ClientCounter) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        await _invoke(build_graph(factory()))
+    return (time.perf_counter() - start) / n * 1e3
+
+
+async def _compiled_once(n: int, factory: _ClientCounter) -> float:
+    graph = build_graph(factory())
+    start = time.perf_counter()
+    for _ in range(n):
+        await _invoke(graph)
+    return (time.perf_counter() - start) / n * 1e3
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    setup_logging("WARNING")
+    graph_module.execute_readonly_query = _stub_execute
+    graph_module.settings.result_cache_enabled = False
+
+    before, after = _ClientCounter(), _ClientCounter()
+    before_ms = await _per_request(args.requests, before)
+    after_ms = await _compiled_once(args.requests, after)
+
+    print(f"requests={args.requests}")
+    print(f"build per request : {before_ms:7.3f} ms/request, LLM clients created: {before.created}")
+    print(f"compiled once     : {after_ms:7.3f} ms/request, LLM clients created: {after.created}")
+    print(f"overhead removed  : {before_ms - after_ms:7.3f} ms/request ({before_ms / after_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
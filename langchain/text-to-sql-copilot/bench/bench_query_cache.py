@@ -0,0 +1,93 @@
+"""Compare the sharded LRU QueryCache with the original min()-eviction cache.
+
+    python -m bench.bench_query_cache [--ops 500] [--sizes 1000 10000 100000]
+
+Each cache is filled to capacity first, then timed on a mixed workload of
+inserts (every one forces an eviction) and lookups of hot keys.
+"""
+
+import argparse
+import time
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any
+
+from app.services.query_cache import QueryCache, make_cache_key
+
+PAYLOAD = {"sql": "SELECT 1", "answer": "Result: **1**", "columns": ["?column?"], "rows": [[1]]}
+
+
+@dataclass
+class _LegacyEntry:
+    value: dict[str, Any]
+    expires_at: float
+
+
+class LegacyQueryCache:
+    """The pre-sharding implementation, kept verbatim as the benchmark baseline."""
+
+    def __init__(self, max_size: int = 256, ttl_seconds: int = 300) -> None:
+        self._max_size = max_size
+        self._ttl_seconds = ttl_seconds
+        self._store: dict[str, _LegacyEntry] = {}
+        self._lock = Lock()
+
+    def get(self, question: str) -> dict[str, Any] | None:
+        key = make_cache_key(question)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._store.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= now:
+                del self._store[key]
+                return None
+            return entry.value
+
+    def set(self, question: str, response: dict[str, Any]) -> None:
+        key = make_cache_key(question)
+        expires_at = time.monotonic() + self._ttl_seconds
+        with self._lock:
+            if len(self._store) >= self._max_size and key not in self._store:
+                oldest_key = min(self._store, key=lambda k: self._store[k].expires_at)
+                del self._store[oldest_key]
+            self._store[key] = _LegacyEntry(value=response, expires_at=expires_at)
+
+
+def _time_workload(cache, size: int, ops: int) -> tuple[float, float]:
+    for i in range(size):
+        cache.set(f"warm question {i}", PAYLOAD)
+
+    start = time.perf_counter()
+    for i in range(ops):
+        cache.set(f"new question {i}", PAYLOAD)
+    set_us = (time.perf_counter() - start) / ops * 1e6
+
+    start = time.perf_counter()
+    for i in range(ops):
+        cache.get(f"new question {i}")
+    get_us = (time.perf_counter() - start) / ops * 1e6
+    return set_us, get_us
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=500, help="timed operations per size (legacy is O(n) per insert)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--shards", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{'entries':>8} | {'legacy set µs':>14} | {'sharded set µs':>15} | {'speedup':>8} | "
+          f"{'legacy get µs':>14} | {'sharded get µs':>15}")
+    print("-" * 90)
+    for size in args.sizes:
+        legacy_set, legacy_get = _time_workload(LegacyQueryCache(max_size=size, ttl_seconds=3600), size, args.ops)
+        new_set, new_get = _time_workload(
+            QueryCache(max_size=size, ttl_seconds=3600, shards=args.shards), size, args.ops
+        )
+        print(f"{size:>8} | {legacy_set:>14.2f} | {new_set:>15.2f} | {legacy_set / new_set:>7.1f}x | "
+              f"{legacy_get:>14.2f} | {new_get:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
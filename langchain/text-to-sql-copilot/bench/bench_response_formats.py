@@ -0,0 +1,83 @@
+"""Encode one large /query result as records (QueryResponse) vs. the compact formats.
+
+    python -m bench.bench_response_formats [--rows 10000] [--repeat 20]
+
+Rows mix text, Decimal, date and int columns like a typical revenue query. Reports
+encode time and body size per format, plus the size of the cached payload when rows
+are stored as objects (the old layout) vs. arrays.
+"""
+
+import argparse
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from app.api.encoding import dumps
+from app.api.formats import compact_response, records
+from app.api.schemas import QueryResponse
+
+COLUMNS = ["customer_name", "country", "order_date", "status", "units", "revenue"]
+
+
+def synthetic_rows(n: int) -> list[list]:
+    start = date(2024, 1, 1)
+    return [
+        [
+            f"Customer {i}",
+            ("USA", "Canada", "UK", "Germany")[i % 4],
+            start + timedelta(days=i % 365),
+            ("shipped", "pending", "cancelled")[i % 3],
+            i % 17,
+            Decimal(f"{i % 5000}.{i % 100:02d}"),
+        ]
+        for i in range(n)
+    ]
+
+
+def _records_body(metadata: dict, rows: list[list]) -> bytes:
+    response = QueryResponse(**metadata, columns=COLUMNS, rows=records(COLUMNS, rows))
+    return response.model_dump_json().encode()
+
+
+def _time(fn, repeat: int) -> tuple[float, int]:
+    samples, size = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(fn())
+        samples.append((time.perf_counter() - start) * 1e3)
+    return statistics.median(samples), size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows)
+    metadata = {"question": "Orders with revenue", "sql": "SELECT ...", "answer": "Found rows.", "llm_calls": 1}
+
+    cases = {
+        "records": lambda: _records_body(metadata, rows),
+        "rows": lambda: compact_response("rows", metadata, COLUMNS, rows).body,
+        "columns": lambda: compact_response("columns", metadata, COLUMNS, rows).body,
+    }
+    print(f"rows={args.rows} columns={len(COLUMNS)}")
+    print(f"{'format':<10} {'encode ms':>10} {'body KB':>10}")
+    baseline = None
+    for name, fn in cases.items():
+        ms, size = _time(fn, args.repeat)
+        baseline = baseline or ms
+        print(f"{name:<10} {ms:10.2f} {size / 1024:10.1f}   ({baseline / ms:.1f}x)")
+
+    as_objects = len(dumps({**metadata, "columns": COLUMNS, "rows": records(COLUMNS, rows)}))
+    as_arrays = len(dumps({**metadata, "columns": COLUMNS, "rows": rows}))
+    print(
+        f"cached payload: objects {as_objects / 1024:.1f} KB -> arrays {as_arrays / 1024:.1f} KB "
+        f"({as_objects / as_arrays:.2f}x more entries per MB)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Schema linking on a synthetic catalog: original substring scan vs. SchemaIndex.
+
+    python -m bench.bench_schema_linker [--tables 5000] [--questions 500]
+
+Tables are built from a fixed vocabulary ("warehouse_shipments", ...) with a few
+shared columns (id, created_at) plus table-specific ones and an FK to an earlier
+table, so questions hit a handful of tables and bridging has work to do.
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from app.services.schema_index import SchemaIndex
+
+NOUNS = (
+    "account invoice payment shipment warehouse supplier vendor employee ticket campaign lead contract "
+    "asset device sensor reading subscription plan refund coupon review region store carrier route"
+).split()
+QUALIFIERS = "daily monthly archived pending regional partner legacy external internal audit".split()
+
+
+def synthetic_catalog(n: int, seed: int = 7) -> dict[str, dict]:
+    rng = random.Random(seed)
+    catalog: dict[str, dict] = {}
+    for i in range(n):
+        noun = NOUNS[i % len(NOUNS)]
+        table = f"{QUALIFIERS[(i // len(NOUNS)) % len(QUALIFIERS)]}_{noun}_{i}"
+        meta = {
+            "columns": ["id", "created_at", f"{noun}_code", f"{noun}_{i}_amount"],
+            "keywords": [f"{noun} {i}", f"{noun}{i}"],
+        }
+        if catalog:
+            parent = rng.choice(list(catalog)[-50:])
+            meta["foreign_keys"] = {f"{parent}_id": f"{parent}.id"}
+        catalog[table] = meta
+    return catalog
+
+
+def legacy_link(catalog: dict[str, dict], question: str) -> list[str]:
+    """The pre-index linker: substring tests for every keyword and column of every table."""
+    q = question.lower()
+    scores: dict[str, int] = {}
+    for table, meta in catalog.items():
+        score = 0
+        for kw in meta["keywords"]:
+            if kw in q:
+                score += 2
+        for col in meta["columns"]:
+            if col.replace("_", " ") in q or col in q:
+                score += 1
+        if score > 0:
+            scores[table] = score
+    if not scores:
+        return list(catalog)
+    return sorted(scores, key=scores.get, reverse=True)[:4]
+
+
+def _questions(n: int, tables: int, seed: int = 11) -> list[str]:
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        a, b = rng.randrange(tables), rng.randrange(tables)
+        out.append(f"Total {NOUNS[a % len(NOUNS)]} {a} amount per {NOUNS[b % len(NOUNS)]} {b} last month")
+    return out
+
+
+def _time(fn, questions: list[str]) -> list[float]:
+    samples = []
+    for question in questions:
+        start = time.perf_counter()
+        fn(question)
+        samples.append((time.perf_counter() - start) * 1e3)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tables", type=int, default=5000)
+    parser.add_argument("--questions", type=int, default=500)
+    args = parser.parse_args()
+
+    catalog = synthetic_catalog(args.tables)
+    questions = _questions(args.questions, args.tables)
+
+    start = time.perf_counter()
+    index = SchemaIndex(catalog)
+    build_ms = (time.perf_counter() - start) * 1e3
+
+    legacy = _time(lambda q: legacy_link(catalog, q), questions[: max(1, args.questions // 10)])
+    indexed = _time(index.link, questions)
+
+    print(f"tables={args.tables} questions={args.questions} index build={build_ms:.1f} ms")
+    print(f"{'linker':<16} {'p50 ms':>9} {'p99 ms':>9}")
+    for label, samples in (("substring scan", legacy), ("SchemaIndex", indexed)):
+        p99 = statistics.quantiles(samples, n=100)[98] if len(samples) > 1 else samples[0]
+        print(f"{label:<16} {statistics.median(samples):9.4f} {p99:9.4f}")
+    print(f"speedup (p50): {statistics.median(legacy) / statistics.median(indexed):.0f}x")
+
+
+if __name__ == "__main__":
+    main()
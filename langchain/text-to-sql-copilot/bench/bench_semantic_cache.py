@@ -0,0 +1,88 @@
+"""Hit rate and lookup latency of the semantic question cache on a paraphrase set.
+
+    python -m bench.bench_semantic_cache [--threshold 0.8] [--filler 1000]
+
+The first question of each group is cached; the others are paraphrases that
+should hit. ``DISTINCT`` questions must miss — any hit there is a wrong answer.
+``--filler`` adds synthetic cached questions to measure latency at realistic sizes.
+"""
+
+import argparse
+import statistics
+import time
+
+from app.db.schema import TABLE_CATALOG
+from app.services.semantic_cache import SemanticCache, schema_terms
+
+PARAPHRASES = [
+    ["total revenue per country", "revenue by country?", "What is the total revenue by country?",
+     "show revenue for each country", "countries by total revenue"],
+    ["How many customers do we have?", "how many customers are there", "customer count?",
+     "total number of customers"],
+    ["top 3 products by revenue", "Top 3 products by revenue?", "what are the top 3 products by revenue",
+     "show me the top 3 revenue products"],
+    ["total revenue", "What is the total revenue?", "total revenue overall", "show total revenue"],
+    ["revenue by product category", "revenue per category", "total revenue for each product category",
+     "category revenue"],
+    ["orders per customer", "number of orders by customer", "how many orders per customer",
+     "order count for each customer"],
+    ["average order value", "what is the average order value?", "avg order value"],
+]
+
+DISTINCT = [
+    "revenue by product",
+    "customers by country",
+    "top 5 products by revenue",
+    "how many orders",
+    "average product price",
+    "orders in 2024",
+    "total quantity sold",
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--filler", type=int, default=1000, help="extra synthetic cached questions")
+    args = parser.parse_args()
+
+    cache = SemanticCache(
+        max_size=args.filler + 100,
+        ttl_seconds=3600,
+        threshold=args.threshold,
+        guard_terms=schema_terms(TABLE_CATALOG),
+    )
+    for i in range(args.filler):
+        cache.add(f"metric{i % 97} breakdown for segment{i} in region{i % 13}", {"answer": "filler"})
+    for group in PARAPHRASES:
+        cache.add(group[0], {"answer": group[0]})
+
+    hits = correct = total = 0
+    latencies: list[float] = []
+    for group in PARAPHRASES:
+        for question in group[1:]:
+            total += 1
+            start = time.perf_counter()
+            match = cache.lookup(question)
+            latencies.append((time.perf_counter() - start) * 1e6)
+            if match is not None:
+                hits += 1
+                correct += match[0]["answer"] == group[0]
+
+    false_hits = 0
+    for question in DISTINCT:
+        start = time.perf_counter()
+        match = cache.lookup(question)
+        latencies.append((time.perf_counter() - start) * 1e6)
+        false_hits += match is not None
+
+    latencies.sort()
+    print(f"threshold={args.threshold} cached={cache.stats()['size']}")
+    print(f"paraphrase hit rate : {hits}/{total} ({hits / total:.0%}), correct {correct}/{hits or 1}")
+    print(f"false hits          : {false_hits}/{len(DISTINCT)}")
+    print(f"lookup latency µs   : p50={statistics.median(latencies):.1f} "
+          f"p95={latencies[int(len(latencies) * 0.95) - 1]:.1f} max={latencies[-1]:.1f}")
+
+
+if __name__ == "__main__":
+    main()
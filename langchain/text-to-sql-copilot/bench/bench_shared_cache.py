@@ -0,0 +1,82 @@
+"""Hit rate of per-worker memory caches vs. one shared Redis-protocol cache.
+
+    python -m bench.bench_shared_cache [--workers 4] [--requests 5000] [--questions 500]
+    python -m bench.bench_shared_cache --redis-url redis://localhost:6379/15   # real server
+
+Requests draw questions from a Zipf-like distribution and are spread across
+workers at random, like a load balancer in front of N uvicorn processes. Without
+``--redis-url`` an in-process stand-in server (bench/resp_server.py) is used.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from app.services.cache_backend import CacheBackend, MemoryCacheBackend
+from app.services.query_cache import QueryCache
+from app.services.redis_cache import RedisCacheBackend
+from bench.resp_server import RespServer
+
+PAYLOAD = {"sql": "SELECT 1", "answer": "Result: **1**", "columns": ["n"], "rows": [[1]]}
+
+
+def _question_stream(n_requests: int, n_questions: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(n_questions)]
+    return [f"question {i}" for i in rng.choices(range(n_questions), weights=weights, k=n_requests)]
+
+
+async def _run(workers: list[CacheBackend], stream: list[str], seed: int) -> tuple[float, float]:
+    rng = random.Random(seed)
+    hits = 0
+    start = time.perf_counter()
+    for question in stream:
+        worker = rng.choice(workers)
+        if await worker.get(question) is not None:
+            hits += 1
+        else:
+            await worker.set(question, PAYLOAD)
+    elapsed = time.perf_counter() - start
+    return hits / len(stream), elapsed / len(stream) * 1e6
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--redis-url", default="")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    stream = _question_stream(args.requests, args.questions, args.seed)
+
+    memory = [MemoryCacheBackend(QueryCache(max_size=10_000, ttl_seconds=3600)) for _ in range(args.workers)]
+    mem_hit, mem_us = await _run(memory, stream, args.seed)
+
+    server = None if args.redis_url else await RespServer().start()
+    url = args.redis_url or server.url
+    shared = [RedisCacheBackend(url, namespace="bench", ttl_seconds=3600) for _ in range(args.workers)]
+    await shared[0].clear()
+    try:
+        redis_hit, redis_us = await _run(shared, stream, args.seed)
+        await shared[0].clear()
+    finally:
+        for backend in shared:
+            await backend.close()
+        if server is not None:
+            await server.stop()
+
+    single = [MemoryCacheBackend(QueryCache(max_size=10_000, ttl_seconds=3600))]
+    ceiling, _ = await _run(single, stream, args.seed)
+
+    print(f"workers={args.workers} requests={args.requests} distinct questions={args.questions}")
+    print(f"per-worker memory : hit rate {mem_hit:6.1%}  {mem_us:7.1f} µs/op")
+    print(f"shared redis      : hit rate {redis_hit:6.1%}  {redis_us:7.1f} µs/op")
+    print(f"single-process max: hit rate {ceiling:6.1%}")
+    print(f"LLM calls saved by sharing: {(redis_hit - mem_hit) * args.requests:.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
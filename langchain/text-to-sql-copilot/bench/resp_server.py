@@ -0,0 +1,136 @@
+"""Minimal in-process Redis-protocol (RESP2) server for tests and benchmarks.
+
+Implements only the commands the cache backend uses: GET/MGET/SET (EX/PX)/INCR[BY]/
+DEL/UNLINK/EXISTS/TTL/SCAN/DBSIZE/FLUSHDB plus the connection handshake. Pipelined
+commands work because requests are parsed one after another from the stream.
+
+    async with RespServer() as server:
+        backend = RedisCacheBackend(server.url)
+"""
+
+import asyncio
+import fnmatch
+import time
+
+
+class RespServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self._host = host
+        self._port = port
+        self._server: asyncio.base_events.Server | None = None
+        self.data: dict[bytes, tuple[bytes, float | None]] = {}
+        self.commands = 0
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self._host}:{self._port}/0"
+
+    async def start(self) -> "RespServer":
+        self._server = await asyncio.start_server(self._handle, self._host, self._port)
+        self._port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def __aenter__(self) -> "RespServer":
+        return await self.start()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                args = await _read_command(reader)
+                if args is None:
+                    break
+                self.commands += 1
+                writer.write(self._dispatch(args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _live(self, key: bytes) -> bytes | None:
+        item = self.data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def _dispatch(self, args: list[bytes]) -> bytes:
+        cmd = args[0].upper()
+        if cmd == b"PING":
+            return b"+PONG\r\n"
+        if cmd in (b"CLIENT", b"SELECT"):
+            return b"+OK\r\n"
+        if cmd == b"FLUSHDB":
+            self.data.clear()
+            return b"+OK\r\n"
+        if cmd == b"GET":
+            return _bulk(self._live(args[1]))
+        if cmd == b"MGET":
+            return b"*%d\r\n" % (len(args) - 1) + b"".join(_bulk(self._live(k)) for k in args[1:])
+        if cmd == b"SET":
+            expires_at = None
+            opts = [a.upper() for a in args[3:]]
+            if b"EX" in opts:
+                expires_at = time.monotonic() + int(args[3 + opts.index(b"EX") + 1])
+            elif b"PX" in opts:
+                expires_at = time.monotonic() + int(args[3 + opts.index(b"PX") + 1]) / 1000
+            self.data[args[1]] = (args[2], expires_at)
+            return b"+OK\r\n"
+        if cmd in (b"INCR", b"INCRBY"):
+            value = int(self._live(args[1]) or 0) + (int(args[2]) if cmd == b"INCRBY" else 1)
+            self.data[args[1]] = (b"%d" % value, self.data.get(args[1], (None, None))[1])
+            return b":%d\r\n" % value
+        if cmd in (b"DEL", b"UNLINK"):
+            removed = 0
+            for key in args[1:]:
+                if self._live(key) is not None:
+                    del self.data[key]
+                    removed += 1
+            return b":%d\r\n" % removed
+        if cmd == b"EXISTS":
+            return b":%d\r\n" % sum(self._live(k) is not None for k in args[1:])
+        if cmd == b"TTL":
+            item = self.data.get(args[1]) if self._live(args[1]) is not None else None
+            if item is None:
+                return b":-2\r\n"
+            return b":%d\r\n" % (-1 if item[1] is None else int(item[1] - time.monotonic()))
+        if cmd == b"DBSIZE":
+            return b":%d\r\n" % sum(self._live(k) is not None for k in list(self.data))
+        if cmd == b"SCAN":
+            opts = [a.upper() for a in args]
+            pattern = args[opts.index(b"MATCH") + 1].decode() if b"MATCH" in opts else "*"
+            keys = [
+                k for k in list(self.data) if self._live(k) is not None and fnmatch.fnmatchcase(k.decode(), pattern)
+            ]
+            return b"*2\r\n" + _bulk(b"0") + b"*%d\r\n" % len(keys) + b"".join(_bulk(k) for k in keys)
+        return b"-ERR unknown command '%s'\r\n" % cmd
+
+
+def _bulk(value: bytes | None) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+async def _read_command(reader: asyncio.StreamReader) -> list[bytes] | None:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.strip().split()
+    args = []
+    for _ in range(int(line[1:])):
+        size = int((await reader.readline())[1:])
+        args.append((await reader.readexactly(size + 2))[:-2])
+    return args
@@ -65,6 +65,42 @@ INSERT INTO order_items (order_id, product_id, quantity, unit_price) VALUES
     (6, 1, 3, 1299.99),
     (7, 3, 4, 349.00);
 
+-- Table versions: cached results are invalidated when these tables change
+CREATE TABLE IF NOT EXISTS copilot_table_versions (
+    table_name  TEXT PRIMARY KEY,
+    version     BIGINT NOT NULL DEFAULT 0,
+    updated_at  TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION copilot_bump_table_version() RETURNS trigger AS $$
+DECLARE
+    new_version BIGINT;
+BEGIN
+    INSERT INTO copilot_table_versions (table_name, version, updated_at)
+    VALUES (TG_TABLE_NAME, 1, NOW())
+    ON CONFLICT (table_name) DO UPDATE
+        SET version = copilot_table_versions.version + 1, updated_at = NOW()
+    RETURNING version INTO new_version;
+    PERFORM pg_notify('copilot_table_changes', TG_TABLE_NAME || ':' || new_version);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['customers', 'products', 'orders', 'order_items'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS copilot_table_version ON %I', t);
+        EXECUTE format(
+            'CREATE TRIGGER copilot_table_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+            'FOR EACH STATEMENT EXECUTE FUNCTION copilot_bump_table_version()',
+            t
+        );
+    END LOOP;
+END
+$$;
+
 DO $$
 BEGIN
     IF NOT EXISTS (SELECT FROM pg_roles WHERE rolname = 'copilot') THEN
@@ -77,3 +113,17 @@ GRANT CONNECT ON DATABASE sales_db TO copilot;
 GRANT USAGE ON SCHEMA public TO copilot;
 GRANT SELECT ON ALL TABLES IN SCHEMA public TO copilot;
 ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT SELECT ON TABLES TO copilot;
+
+-- Owner of the advisor's materialized views: reads the base tables, creates views, nothing else.
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT FROM pg_roles WHERE rolname = 'copilot_views') THEN
+        CREATE ROLE copilot_views WITH LOGIN PASSWORD 'changeme';
+    END IF;
+END
+$$;
+
+GRANT CONNECT ON DATABASE sales_db TO copilot_views;
+GRANT USAGE, CREATE ON SCHEMA public TO copilot_views;
+GRANT SELECT ON ALL TABLES IN SCHEMA public TO copilot_views;
+ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT SELECT ON TABLES TO copilot_views;
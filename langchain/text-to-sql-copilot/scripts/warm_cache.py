@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Replay a curated question list through the agent and write a question-cache snapshot.
+
+    python scripts/warm_cache.py [scripts/warmup_questions.txt] [--snapshot PATH] [--concurrency 4]
+
+Answers land in the configured cache backend. For the memory backend the result is
+written to --snapshot (default CACHE_SNAPSHOT_PATH); instances started with
+CACHE_SNAPSHOT_PATH pointing at that file load it instead of starting cold.
+An existing snapshot is loaded first, so re-runs only pay for new or expired questions.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+load_dotenv(os.path.join(ROOT, ".env"))
+
+from app.api.routes import warm_question
+from app.config import get_settings
+from app.db.engine import get_datasources
+from app.logging_config import setup_logging
+from app.services.cache_factory import get_query_cache, get_table_versions
+from app.services.cache_snapshot import load_cache_snapshot, save_cache_snapshot
+from app.services.cache_warmup import WarmupStatus, load_questions, warm_up
+
+
+async def main() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("questions", nargs="?", default=os.path.join(ROOT, "scripts", "warmup_questions.txt"))
+    parser.add_argument("--snapshot", default=settings.cache_snapshot_path or "data/cache_snapshot.bin")
+    parser.add_argument("--concurrency", type=int, default=settings.cache_warmup_concurrency)
+    args = parser.parse_args()
+
+    setup_logging(settings.log_level)
+    if not settings.cache_enabled:
+        sys.exit("CACHE_ENABLED=false: nothing to warm.")
+    memory = settings.cache_backend == "memory"
+    snapshot = Path(args.snapshot)
+    if memory:
+        load_cache_snapshot(get_query_cache(), get_table_versions(), snapshot)
+
+    try:
+        status = await warm_up(load_questions(Path(args.questions)), warm_question, args.concurrency, WarmupStatus())
+    finally:
+        await get_datasources().close()
+
+    warmed = status.done - status.failed
+    print(f"Warmed {warmed}/{status.total} questions ({status.failed} failed) in {status.elapsed_ms / 1000:.1f}s")
+    if memory:
+        saved = save_cache_snapshot(get_query_cache(), get_table_versions(), snapshot)
+        print(f"Snapshot: {saved} entries -> {snapshot}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
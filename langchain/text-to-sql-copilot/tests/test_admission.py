@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.agents import graph as graph_module
+from app.agents.graph import build_graph
+from app.llm.stub import StubChatModel
+from app.main import app
+from app.services.admission import LLMLimiter, LLMOverloaded, client_key, llm_client
+from app.services.cache_factory import get_query_cache
+
+
+async def _hold(limiter: LLMLimiter, client: str, order: list[str], release: asyncio.Event) -> None:
+    with llm_client(client):
+        async with limiter.slot():
+            order.append(client)
+            await release.wait()
+
+
+async def test_waiting_clients_are_served_round_robin():
+    limiter = LLMLimiter(max_concurrency=1, max_queue=10)
+    order: list[str] = []
+    release = asyncio.Event()
+    tasks = [asyncio.create_task(_hold(limiter, c, order, release)) for c in ["a", "a", "a", "a", "b", "c"]]
+    await asyncio.sleep(0)
+    assert limiter.stats()["queued"] == 5
+
+    release.set()
+    await asyncio.gather(*tasks)
+
+    # "a" holds the slot first; its burst then alternates with the other clients.
+    assert order == ["a", "a", "b", "c", "a", "a"]
+    assert limiter.stats()["in_flight"] == limiter.stats()["queued"] == 0
+
+
+async def test_full_queue_fails_fast_with_retry_after():
+    limiter = LLMLimiter(max_concurrency=2, max_queue=2)
+    release = asyncio.Event()
+    tasks = [asyncio.create_task(_hold(limiter, "a", [], release)) for _ in range(4)]
+    await asyncio.sleep(0)
+
+    with pytest.raises(LLMOverloaded) as exc_info:
+        async with limiter.slot():
+            pass
+
+    assert exc_info.value.retry_after >= 1
+    assert limiter.stats()["rejected"] == 1
+    release.set()
+    await asyncio.gather(*tasks)
+
+
+async def test_cancelled_waiter_leaves_the_queue():
+    limiter = LLMLimiter(max_concurrency=1, max_queue=10)
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold(limiter, "a", [], release))
+    waiter = asyncio.create_task(_hold(limiter, "b", [], asyncio.Event()))
+    await asyncio.sleep(0)
+    assert limiter.stats()["queued"] == 1
+
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    assert limiter.stats()["queued"] == 0
+
+    release.set()
+    await holder
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_client_key_prefers_api_key_then_forwarded_ip():
+    headers = {"X-Forwarded-For": "203.0.113.7, 10.0.0.1"}
+    assert client_key({"X-API-Key": "k1", **headers}, "10.0.0.2", "X-API-Key", "X-Forwarded-For", 1) == "key:k1"
+    assert client_key(headers, "10.0.0.2", "X-API-Key", "X-Forwarded-For", 2) == "ip:203.0.113.7"
+    assert client_key({}, "10.0.0.2", "X-API-Key", "X-Forwarded-For", 1) == "ip:10.0.0.2"
+    assert client_key({}, None, "X-API-Key", "X-Forwarded-For") == "anonymous"
+
+
+def test_client_key_trusts_only_hops_appended_by_known_proxies():
+    # The client sent "X-Forwarded-For: 1.2.3.4"; one trusted proxy appended the address it saw.
+    spoofed = {"X-Forwarded-For": "1.2.3.4, 198.51.100.9"}
+    assert client_key(spoofed, "10.0.0.2", "X-API-Key", "X-Forwarded-For", 1) == "ip:198.51.100.9"
+    assert client_key(spoofed, "10.0.0.2", "X-API-Key", "X-Forwarded-For", 0) == "ip:10.0.0.2"
+    assert client_key(spoofed, "10.0.0.2", "X-API-Key", "X-Forwarded-For", 3) == "ip:10.0.0.2"
+
+
+async def test_overload_with_stub_llm_returns_429(monkeypatch):
+    async def fake_execute(session, sql):
+        return ["n"], [[5]]
+
+    monkeypatch.setattr(graph_module, "execute_readonly_query", fake_execute)
+    monkeypatch.setattr(graph_module.settings, "result_cache_enabled", False)
+    monkeypatch.setattr("app.api.routes.get_ledger", lambda: None)
+    limiter = LLMLimiter(max_concurrency=2, max_queue=2)
+    monkeypatch.setattr("app.agents.nodes.get_llm_limiter", lambda: limiter)
+    compiled = build_graph(StubChatModel(latency_ms=100))
+    monkeypatch.setattr("app.agents.runner.get_compiled_graph", lambda: compiled)
+    get_query_cache().clear()
+
+    async def ask(client: AsyncClient, i: int):
+        body = {"question": f"Anything about shipments, batch {i}"}
+        return await client.post("/api/v1/query", json=body, headers={"X-API-Key": str(i)})
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        responses = await asyncio.gather(*(ask(client, i) for i in range(8)))
+    get_query_cache().clear()
+
+    statuses = sorted(r.status_code for r in responses)
+    assert statuses == [200] * 4 + [429] * 4
+    rejected = next(r for r in responses if r.status_code == 429)
+    assert int(rejected.headers["Retry-After"]) >= 1
+    assert limiter.stats() == {
+        "max_concurrency": 2,
+        "in_flight": 0,
+        "queued": 0,
+        "clients_waiting": 0,
+        "rejected": 4,
+    }
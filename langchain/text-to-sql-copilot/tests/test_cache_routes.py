@@ -25,7 +25,7 @@ async def test_query_cache_hit(monkeypatch):
             "sql": "SELECT COUNT(*) FROM customers LIMIT 100",
             "answer": "Result: **5**",
             "columns": ["count"],
-            "rows": [{"count": 5}],
+            "rows": [[5]],
             "relevant_tables": ["customers"],
             "llm_calls": 1,
             "retry_count": 0,
@@ -72,3 +72,19 @@ async def test_cache_bypass_header(monkeypatch):
         )
 
     assert call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_stats_reports_counters():
+    cache = get_query_cache()
+    cache.set("counted question", {"sql": "SELECT 1", "answer": "ok"})
+    cache.get("counted question")
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/api/v1/cache/stats")
+
+    body = response.json()
+    assert response.status_code == 200
+    assert body["size"] == 1
+    assert body["hits"] >= 1
+    assert {"misses", "evictions", "expired", "hit_ratio", "shards"} <= body.keys()
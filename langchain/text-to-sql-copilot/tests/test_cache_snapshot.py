@@ -0,0 +1,161 @@
+import asyncio
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import orjson
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.config import DatasourceConfig, get_settings
+from app.db.engine import get_datasources, get_db_session
+from app import main as main_module
+from app.main import app, lifespan
+from app.services.cache_factory import get_query_cache, get_warmup_status
+from app.services.cache_snapshot import SNAPSHOT_FORMAT, load_cache_snapshot, save_cache_snapshot
+from app.services.cache_warmup import WarmupStatus, load_questions, warm_up
+from app.services.query_cache import QueryCache, make_cache_key
+from app.services.table_versions import TableVersions
+
+PAYLOAD = {"sql": "SELECT COUNT(*) FROM orders LIMIT 100", "answer": "Result: **5**", "rows": [[5]]}
+
+
+def test_snapshot_round_trip_keeps_remaining_ttl_and_versions(tmp_path):
+    versions = TableVersions()
+    versions.set("orders", 3)
+    cache = QueryCache(max_size=16, ttl_seconds=300)
+    cache.set("How many orders?", {**PAYLOAD, "table_versions": {"orders": 3}})
+    path = tmp_path / "cache.bin"
+
+    assert save_cache_snapshot(cache, versions, path) == 1
+
+    restored_versions = TableVersions()
+    restored = QueryCache(max_size=16, ttl_seconds=300)
+    assert load_cache_snapshot(restored, restored_versions, path) == 1
+    assert restored.get("how many orders?")["answer"] == "Result: **5**"
+    assert restored_versions.get("orders") == 3
+    [(_, _, ttl_left)] = restored.export()
+    assert 295 < ttl_left <= 300
+
+
+def test_concurrent_saves_use_their_own_temp_files(tmp_path):
+    versions = TableVersions()
+    cache = QueryCache(max_size=16, ttl_seconds=300)
+    cache.set("Revenue?", {**PAYLOAD, "rows": [[Decimal("1299.99")]]})
+    path = tmp_path / "cache.bin"
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert list(pool.map(lambda _: save_cache_snapshot(cache, versions, path), range(32))) == [1] * 32
+
+    assert [p.name for p in tmp_path.iterdir()] == ["cache.bin"]
+    restored = QueryCache(max_size=16, ttl_seconds=300)
+    assert load_cache_snapshot(restored, TableVersions(), path) == 1
+    assert restored.get("revenue?")["rows"] == [["1299.99"]]
+
+
+def test_expired_and_invalidated_entries_are_not_restored(tmp_path):
+    now = time.time()
+    document = {
+        "format": SNAPSHOT_FORMAT,
+        "saved_at": now,
+        "table_versions": {"orders": 1},
+        "entries": [
+            [make_cache_key("expired"), now - 1, {**PAYLOAD, "table_versions": {}}],
+            [make_cache_key("stale"), now + 60, {**PAYLOAD, "table_versions": {"orders": 1}}],
+            [make_cache_key("fresh"), now + 60, {**PAYLOAD, "table_versions": {"customers": 0}}],
+        ],
+    }
+    path = tmp_path / "cache.bin"
+    path.write_bytes(zlib.compress(orjson.dumps(document)))
+    versions = TableVersions()
+    versions.set("orders", 2)  # e.g. loaded from copilot_table_versions: newer than the snapshot
+    cache = QueryCache(max_size=16, ttl_seconds=300)
+
+    assert load_cache_snapshot(cache, versions, path) == 1
+    assert cache.get("fresh") is not None
+    assert cache.get("stale") is None
+    assert versions.get("orders") == 2
+
+
+def test_missing_or_foreign_snapshot_loads_nothing(tmp_path):
+    cache = QueryCache(max_size=16, ttl_seconds=300)
+    assert load_cache_snapshot(cache, TableVersions(), tmp_path / "missing.bin") == 0
+    (tmp_path / "junk.bin").write_bytes(b"not zlib")
+    assert load_cache_snapshot(cache, TableVersions(), tmp_path / "junk.bin") == 0
+    (tmp_path / "other.bin").write_bytes(zlib.compress(orjson.dumps({"format": "other", "entries": []})))
+    assert load_cache_snapshot(cache, TableVersions(), tmp_path / "other.bin") == 0
+
+
+@pytest.mark.asyncio
+async def test_every_datasource_cache_is_snapshotted_to_its_own_file(tmp_path, monkeypatch):
+    emea = DatasourceConfig(url="postgresql+asyncpg://copilot:x@emea-db/sales")
+    monkeypatch.setattr(get_settings(), "datasources", {"emea": emea})
+    monkeypatch.setattr(main_module.settings, "cache_snapshot_path", str(tmp_path / "cache.bin"))
+    monkeypatch.setattr(main_module.settings, "cache_snapshot_interval_seconds", 0)
+    get_datasources.cache_clear()
+    try:
+        get_query_cache("default").set("How many orders?", PAYLOAD)
+        get_query_cache("emea").set("How many orders?", {**PAYLOAD, "answer": "Result: **7**"})
+        async with lifespan(app):
+            pass
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["cache.bin", "cache.emea.bin"]
+
+        for name in ("default", "emea"):
+            get_query_cache(name).clear()
+        async with lifespan(app):
+            assert get_query_cache("default").get("how many orders?")["answer"] == "Result: **5**"
+            assert get_query_cache("emea").get("how many orders?")["answer"] == "Result: **7**"
+    finally:
+        for name in ("default", "emea"):
+            get_query_cache(name).clear()
+        get_datasources.cache_clear()
+
+
+@pytest.mark.asyncio
+async def test_warm_up_bounds_concurrency_and_counts_failures(tmp_path):
+    path = tmp_path / "questions.txt"
+    path.write_text("# curated\nRevenue by country\n\nbad question\nRevenue by country\nTop 3 products\n")
+    in_flight = peak = 0
+
+    async def answer(question):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        if question.startswith("bad"):
+            raise RuntimeError("boom")
+
+    status = await warm_up(load_questions(path), answer, concurrency=2, status=WarmupStatus())
+
+    assert (status.total, status.done, status.failed, status.running) == (3, 3, 1, False)
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_health_reports_warming_until_warm_up_finishes():
+    class Session:
+        async def execute(self, statement):
+            return None
+
+    async def session():
+        yield Session()
+
+    app.dependency_overrides[get_db_session] = session
+    status = get_warmup_status()
+    try:
+        status.total, status.running = 8, True
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            warming = await client.get("/api/v1/health")
+            status.done, status.running = 8, False
+            ready = await client.get("/api/v1/health")
+    finally:
+        app.dependency_overrides.pop(get_db_session, None)
+        get_warmup_status.cache_clear()
+
+    assert warming.status_code == 503
+    assert warming.json()["status"] == "warming"
+    assert ready.status_code == 200
+    assert ready.json()["status"] == "ok"
+    assert ready.json()["warmup"]["done"] == 8
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from app.agents import graph as graph_module
+from app.agents.graph import build_graph
+from app.agents.runner import run_agent
+from app.config import Settings
+from app.llm.cassette import Cassette, CassetteChatModel, CassetteMiss, prompt_key
+from app.llm.factory import create_llm
+from app.llm.stub import StubChatModel
+
+
+def _prompt(question: str) -> list[HumanMessage]:
+    return [HumanMessage(content=f"Schema:\n  orders(id, status)\n  customers(id)\n\nQuestion: {question}")]
+
+
+class _CountingStub(StubChatModel):
+    calls: int = 0
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        return await super()._agenerate(messages, stop, run_manager, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_record_then_replay_without_the_live_model(tmp_path):
+    path = tmp_path / "cassette.json"
+    live = _CountingStub(latency_ms=20)
+    recorder = CassetteChatModel(cassette=Cassette.load(path), live=live)
+    recorded = await recorder.ainvoke(_prompt("How many customers do we have?"))
+    await recorder.ainvoke(_prompt("How many customers do we have?"))
+    assert live.calls == 1
+
+    data = json.loads(path.read_text())
+    entry = data["entries"][prompt_key(_prompt("How many customers do we have?"))]
+    assert entry["latency_ms"] >= 20
+
+    replayer = CassetteChatModel(cassette=Cassette.load(path))
+    replayed = await replayer.ainvoke(_prompt("How many customers do we have?"))
+    assert replayed.content == recorded.content
+    assert replayed.usage_metadata == recorded.usage_metadata
+    with pytest.raises(CassetteMiss):
+        await replayer.ainvoke(_prompt("Anything about shipments"))
+
+
+@pytest.mark.asyncio
+async def test_concurrent_recordings_are_written_atomically_off_the_event_loop(tmp_path, monkeypatch):
+    path = tmp_path / "cassette.json"
+    writers = []
+    put = Cassette.put
+
+    def tracked_put(self, key, entry):
+        writers.append(threading.get_ident())
+        put(self, key, entry)
+
+    monkeypatch.setattr(Cassette, "put", tracked_put)
+    recorder = CassetteChatModel(cassette=Cassette.load(path), live=_CountingStub())
+    await asyncio.gather(*(recorder.ainvoke(_prompt(f"How many orders in month {m}?")) for m in range(1, 9)))
+
+    assert len(writers) == 8 and threading.get_ident() not in writers
+    assert [p.name for p in tmp_path.iterdir()] == ["cassette.json"]
+    assert len(Cassette.load(path).entries) == 8
+
+
+@pytest.mark.asyncio
+async def test_replay_latency_is_recorded_latency_scaled_plus_offset(tmp_path):
+    key = prompt_key(_prompt("Orders per status?"))
+    cassette = Cassette(tmp_path / "c.json", {key: {"content": "{}", "usage": {}, "latency_ms": 40.0}})
+    model = CassetteChatModel(cassette=cassette, latency_scale=0.5, latency_ms=10)
+    assert model._delay(cassette.get(key)) == pytest.approx(0.03)
+
+    start = time.perf_counter()
+    await model.ainvoke(_prompt("Orders per status?"))
+    assert time.perf_counter() - start >= 0.03
+    assert CassetteChatModel(cassette=cassette, latency_scale=0)._delay(cassette.get(key)) == 0
+
+
+def test_factory_builds_replay_and_record_models(tmp_path):
+    path = tmp_path / "cassette.json"
+    path.write_text(json.dumps({"format": 1, "entries": {"k": {"content": "{}", "usage": {}, "latency_ms": 1}}}))
+
+    replay = create_llm(Settings(llm_provider="replay", llm_cassette_path=str(path), llm_cassette_latency_scale=2))
+    assert isinstance(replay, CassetteChatModel) and replay.live is None
+    assert replay.latency_scale == 2 and replay.cassette.get("k")
+
+    record = create_llm(
+        Settings(
+            llm_provider="replay",
+            llm_cassette_path=str(path),
+            llm_cassette_mode="record",
+            llm_cassette_record_provider="stub",
+        )
+    )
+    assert isinstance(record.live, StubChatModel)
+
+    path.write_text(json.dumps({"format": 99, "entries": {}}))
+    with pytest.raises(ValueError, match="format"):
+        Cassette.load(path)
+
+
+@pytest.mark.asyncio
+async def test_run_agent_replays_identically(tmp_path, monkeypatch):
+    async def fake_execute(session, sql):
+        return ["n"], [[7]]
+
+    monkeypatch.setattr(graph_module, "execute_readonly_query", fake_execute)
+    monkeypatch.setattr(graph_module.settings, "result_cache_enabled", False)
+    path = tmp_path / "cassette.json"
+
+    async def run(model):
+        monkeypatch.setattr("app.agents.runner.get_compiled_graph", lambda: build_graph(model))
+        return await run_agent("Which customers placed the most orders?", object())
+
+    recorded = await run(CassetteChatModel(cassette=Cassette.load(path), live=StubChatModel(failure_rate=1.0)))
+    replayed = await run(CassetteChatModel(cassette=Cassette.load(path)))
+
+    assert replayed["sql"] == recorded["sql"]
+    assert replayed["llm_calls"] == recorded["llm_calls"] == graph_module.settings.max_sql_retries + 1
@@ -0,0 +1,157 @@
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.db.engine import get_datasources, get_db_session
+from app.main import app
+from app.services import catalog as catalog_module
+from app.services.catalog import (
+    STATIC_CATALOG,
+    get_catalog,
+    load_snapshot,
+    refresh_catalog,
+    save_snapshot,
+    set_catalog,
+)
+from app.services.schema_service import build_schema_context, link_relevant_tables
+from app.services.sql_validator import SQLValidationError, validate_sql
+
+
+class FakeInformationSchema:
+    """Answers the catalog queries from an in-memory description of the database."""
+
+    def __init__(self, tables: dict[str, dict]) -> None:
+        self.tables = tables
+        self.introspected: list[list[str]] = []
+
+    async def execute(self, statement, params):
+        if statement is catalog_module.SIGNATURES_SQL:
+            return [SimpleNamespace(table_name=t, signature=m["signature"]) for t, m in self.tables.items()]
+        wanted = [t for t in params["tables"] if t in self.tables]
+        if statement is catalog_module.COLUMNS_SQL:
+            self.introspected.append(wanted)
+            return [SimpleNamespace(table_name=t, column_name=c) for t in wanted for c in self.tables[t]["columns"]]
+        if statement is catalog_module.COMMENTS_SQL:
+            return [SimpleNamespace(table_name=t, description=self.tables[t].get("comment")) for t in wanted]
+        return [
+            SimpleNamespace(table_name=t, column_name=col, ref_table=ref.split(".")[0], ref_column=ref.split(".")[1])
+            for t in wanted
+            for col, ref in self.tables[t].get("fks", {}).items()
+        ]
+
+
+@pytest.fixture
+def database():
+    yield FakeInformationSchema(
+        {
+            "customers": {"signature": "a", "columns": ["id", "name", "country"]},
+            "invoices": {
+                "signature": "b",
+                "columns": ["id", "customer_id", "total_due"],
+                "comment": "Open invoices",
+                "fks": {"customer_id": "customers.id"},
+            },
+            "copilot_table_versions": {"signature": "c", "columns": ["table_name", "version"]},
+            "copilot_mv_3f9a1c0d2b7e": {"signature": "d", "columns": ["country", "revenue"]},
+        }
+    )
+    set_catalog(STATIC_CATALOG)
+
+
+@pytest.mark.asyncio
+async def test_introspection_builds_catalog_with_overlay(database):
+    catalog, diff = await refresh_catalog(database, "public")
+
+    assert diff == {"added": ["customers", "invoices"], "removed": [], "changed": []}
+    # Neither the version table nor the advisor's materialized views are offered to the linker or the LLM.
+    assert set(catalog.tables) == {"customers", "invoices"}
+    assert catalog.tables["invoices"]["foreign_keys"] == {"customer_id": "customers.id"}
+    assert catalog.tables["invoices"]["description"] == "Open invoices"
+    # Hand-written keywords survive for tables the built-in catalog knows.
+    assert "client" in catalog.tables["customers"]["keywords"]
+    assert catalog.tables["customers"]["columns"] == ["id", "name", "country"]
+
+
+@pytest.mark.asyncio
+async def test_refresh_only_reintrospects_changed_tables(database):
+    first, _ = await refresh_catalog(database, "public")
+    database.tables["invoices"].update(signature="b2", columns=["id", "customer_id", "total_due", "due_date"])
+    del database.tables["customers"]
+    database.introspected.clear()
+
+    second, diff = await refresh_catalog(database, "public", first)
+
+    assert diff == {"added": [], "removed": ["customers"], "changed": ["invoices"]}
+    assert database.introspected == [["invoices"]]
+    assert second.tables["invoices"]["columns"][-1] == "due_date"
+    assert second.version != first.version
+
+
+@pytest.mark.asyncio
+async def test_snapshot_round_trip(database, tmp_path):
+    catalog, _ = await refresh_catalog(database, "public")
+    path = tmp_path / "catalog.json"
+    save_snapshot(catalog, path, "public")
+
+    loaded = load_snapshot(path, "public")
+    assert loaded.source == "snapshot"
+    assert loaded.version == catalog.version
+    assert loaded.signatures == catalog.signatures
+    assert load_snapshot(path, "analytics") is None
+    assert load_snapshot(tmp_path / "missing.json", "public") is None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_snapshot_writes_do_not_collide(database, tmp_path):
+    catalog, _ = await refresh_catalog(database, "public")
+    path = tmp_path / "catalog.json"
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: save_snapshot(catalog, path, "public"), range(32)))
+
+    assert [p.name for p in tmp_path.iterdir()] == ["catalog.json"]
+    assert load_snapshot(path, "public").signatures == catalog.signatures
+
+
+@pytest.mark.asyncio
+async def test_catalog_feeds_linking_context_and_validation(database):
+    catalog, _ = await refresh_catalog(database, "public")
+    set_catalog(catalog)
+
+    assert link_relevant_tables("total due on invoices") == ["invoices"]
+    context = build_schema_context(["invoices", "customers"])
+    assert "invoices(id, customer_id, total_due)  -- Open invoices" in context
+    assert "- invoices.customer_id -> customers.id" in context
+    validate_sql("SELECT total_due FROM invoices LIMIT 5")
+    with pytest.raises(SQLValidationError, match="not allowed"):
+        validate_sql("SELECT * FROM orders LIMIT 5")
+
+
+def test_static_context_lists_relationships_between_linked_tables():
+    context = build_schema_context(["order_items", "orders"])
+    assert "- order_items.order_id -> orders.id" in context
+    assert "products.id" not in context
+    assert "- Revenue = SUM(order_items.quantity * order_items.unit_price)" in context
+
+
+@pytest.mark.asyncio
+async def test_refresh_endpoint_swaps_catalog_and_writes_snapshot(database, tmp_path, monkeypatch):
+    path = tmp_path / "snap.json"
+    monkeypatch.setattr(get_datasources().get("default"), "snapshot_path", path)
+    app.dependency_overrides[get_db_session] = lambda: database
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post("/api/v1/catalog/refresh")
+            info = await client.get("/api/v1/catalog")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["added"] == ["customers", "invoices"]
+    assert body["source"] == "introspected"
+    assert info.json()["tables"] == ["customers", "invoices"]
+    assert get_catalog().version == body["version"]
+    assert load_snapshot(path, "public").version == body["version"]
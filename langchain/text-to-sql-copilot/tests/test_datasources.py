@@ -0,0 +1,130 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.config import DatasourceConfig, Settings, get_settings
+from app.db.datasources import Datasource, DatasourceRegistry, UnknownDatasource, current_datasource, use_datasource
+from app.db.engine import SessionLocal, get_datasources
+from app.main import app
+from app.services import catalog as catalog_module
+from app.services.cache_factory import get_query_cache, get_result_cache
+from app.services.catalog import get_catalog
+from app.services.sql_validator import SQLValidationError, validate_sql
+
+REGIONS = {
+    "emea": DatasourceConfig(
+        url="postgresql+asyncpg://copilot:x@emea-db/sales", allowed_tables=["customers", "orders"]
+    ),
+    "apac": DatasourceConfig(url="postgresql+asyncpg://copilot:x@apac-db/sales", pool_size=2),
+}
+
+
+@pytest.fixture
+def regions(monkeypatch):
+    monkeypatch.setattr(get_settings(), "datasources", REGIONS)
+    get_datasources.cache_clear()
+    yield get_datasources()
+    get_datasources.cache_clear()
+    for name in REGIONS:
+        catalog_module._current.pop(name, None)
+    for name in ["default", *REGIONS]:
+        get_query_cache(name).clear()
+
+
+def test_registry_gives_each_source_its_own_namespace_snapshot_and_allow_list():
+    registry = DatasourceRegistry.from_settings(Settings(datasources=REGIONS, cache_namespace="copilot"))
+
+    assert registry.names() == ["default", "emea", "apac"]
+    emea = registry.get("emea")
+    assert emea.cache_namespace == "copilot:emea"
+    assert emea.snapshot_path == Path("data/catalog_snapshot.emea.json")
+    assert emea.allowed_tables == {"customers", "orders"}
+    assert registry.get("apac").allowed_tables is None
+    with pytest.raises(UnknownDatasource):
+        registry.get("latam")
+    with pytest.raises(ValueError, match="default"):
+        DatasourceRegistry.from_settings(Settings(datasources={"default": REGIONS["emea"]}))
+
+
+async def test_engines_are_created_lazily_and_disposed_when_idle():
+    source = Datasource("emea", REGIONS["emea"].url)
+    registry = DatasourceRegistry([source])
+    assert not source.connected
+    assert source.pool_stats()["size"] == 0
+
+    engine = source.engine
+    assert source.connected
+    assert await registry.dispose_idle(60, now=source.last_used + 30) == []
+    assert await registry.dispose_idle(60, now=source.last_used + 61) == ["emea"]
+    assert not source.connected
+    assert source.engine is not engine
+    await registry.close()
+
+
+async def test_sessions_bind_to_the_request_datasource(regions):
+    async with SessionLocal() as session:
+        with use_datasource("emea"):
+            emea = session.get_bind()
+        with use_datasource("apac"):
+            apac = session.get_bind()
+    assert emea.url.host == "emea-db" and apac.url.host == "apac-db"
+    # Separate engines, so a saturated pool in one region never holds up another.
+    assert emea.pool is not apac.pool
+    assert apac.pool.size() == 2
+    await regions.close()
+
+
+def test_catalog_and_caches_follow_the_datasource(regions):
+    with use_datasource("emea"):
+        assert get_catalog().allowed_tables == {"customers", "orders"}
+        assert get_query_cache() is get_query_cache("emea")
+        with pytest.raises(SQLValidationError, match="not allowed"):
+            validate_sql("SELECT * FROM products LIMIT 5")
+    validate_sql("SELECT * FROM products LIMIT 5")
+    assert get_query_cache() is not get_query_cache("emea")
+    assert get_result_cache("apac") is not get_result_cache("emea")
+
+
+async def test_requests_pick_a_datasource_by_field_or_header(regions, monkeypatch):
+    seen: list[str] = []
+    emea_running = asyncio.Event()
+    release_emea = asyncio.Event()
+
+    async def fake_run_agent(question, session):
+        seen.append(current_datasource())
+        if current_datasource() == "emea":
+            emea_running.set()
+            await release_emea.wait()
+        return {
+            "sql": "SELECT COUNT(*) FROM customers LIMIT 100",
+            "answer": f"Result from {current_datasource()}",
+            "columns": ["count"],
+            "rows": [[5]],
+            "relevant_tables": ["customers"],
+            "llm_calls": 1,
+        }
+
+    monkeypatch.setattr("app.api.routes.run_agent", fake_run_agent)
+    monkeypatch.setattr("app.api.routes.get_ledger", lambda: None)
+    question = "How many customers do we have?"
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        # A slow answer in one region does not hold up the same question in another.
+        emea = asyncio.create_task(client.post("/api/v1/query", json={"question": question, "datasource": "emea"}))
+        await emea_running.wait()
+        apac = await client.post("/api/v1/query", json={"question": question}, headers={"X-Datasource": "apac"})
+        release_emea.set()
+        emea = await emea
+        default = await client.post("/api/v1/query", json={"question": question})
+        cached = await client.post("/api/v1/query", json={"question": question}, headers={"X-Datasource": "apac"})
+        unknown = await client.post("/api/v1/query", json={"question": question, "datasource": "latam"})
+        catalog = await client.get("/api/v1/catalog", headers={"X-Datasource": "emea"})
+
+    assert seen == ["emea", "apac", "default"]
+    assert emea.json()["answer"] == "Result from emea"
+    assert apac.json()["answer"] == "Result from apac"
+    assert default.json()["answer"] == "Result from default"
+    assert cached.json()["cached"] and cached.json()["answer"] == "Result from apac"
+    assert unknown.status_code == 400
+    assert catalog.json()["tables"] == ["customers", "orders"]
@@ -0,0 +1,162 @@
+import asyncio
+import json
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.main import app
+from app.services import query_executor
+from app.services.cache_factory import get_query_cache
+from app.telemetry import DB_QUERIES_CANCELLED, REQUESTS_CANCELLED
+
+RESULT = {
+    "sql": "SELECT COUNT(*) FROM customers LIMIT 100",
+    "answer": "Result: **5**",
+    "columns": ["count"],
+    "rows": [[5]],
+    "relevant_tables": ["customers"],
+    "llm_calls": 1,
+    "retry_count": 0,
+}
+
+
+class FakePool:
+    """Stands in for the five-connection engine pool: a request holds a connection while its agent runs."""
+
+    def __init__(self, size: int = 5) -> None:
+        self.size = size
+        self.checked_out = 0
+        self.cancelled = 0
+        self._slots = asyncio.Semaphore(size)
+
+    def available(self) -> int:
+        return self._slots._value
+
+    async def run(self, seconds: float) -> None:
+        async with self._slots:
+            self.checked_out += 1
+            try:
+                await asyncio.sleep(seconds)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+            finally:
+                self.checked_out -= 1
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = FakePool()
+
+    async def slow_run_agent(question, session):
+        await pool.run(30)
+        return RESULT
+
+    async def slow_stream_agent(question, session):
+        yield "link_schema", {"relevant_tables": ["customers"]}, {"question": question}
+        await pool.run(30)
+        yield "summarize", {"answer": "never"}, {"question": question}
+
+    monkeypatch.setattr("app.api.routes.run_agent", slow_run_agent)
+    monkeypatch.setattr("app.api.routes.stream_agent", slow_stream_agent)
+    monkeypatch.setattr("app.api.routes.get_ledger", lambda: None)
+    get_query_cache().clear()
+    yield pool
+    get_query_cache().clear()
+
+
+async def abandon(path: str, body: dict, after: float = 0.05) -> list[dict]:
+    """Drive the ASGI app like a client that sends the request and disconnects ``after`` seconds later."""
+    pending = [{"type": "http.request", "body": json.dumps(body).encode(), "more_body": False}]
+    sent: list[dict] = []
+
+    async def receive() -> dict:
+        if pending:
+            return pending.pop()
+        await asyncio.sleep(after)
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict) -> None:
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        # 2.4: the server reports disconnects only through receive(), as uvicorn does
+        "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"test"), (b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("test", 80),
+    }
+    await app(scope, receive, send)
+    return sent
+
+
+def _cancelled(endpoint: str) -> float:
+    return REQUESTS_CANCELLED.labels(endpoint)._value.get()
+
+
+async def test_storm_of_abandoned_queries_leaves_the_pool_available(pool, monkeypatch):
+    before = _cancelled("query")
+    # 40 distinct questions and 40 copies of one question (coalesced onto one agent run).
+    bodies = [{"question": f"Revenue for region {i}?"} for i in range(40)]
+    bodies += [{"question": "How many customers?"}] * 40
+
+    responses = await asyncio.wait_for(asyncio.gather(*(abandon("/api/v1/query", b) for b in bodies)), timeout=5)
+
+    assert {sent[0]["status"] for sent in responses} == {499}
+    assert _cancelled("query") - before == len(bodies)
+    # Every run that got a connection was cancelled mid-query, and every connection came back.
+    assert pool.cancelled >= pool.size
+    assert pool.checked_out == 0
+    assert pool.available() == pool.size
+
+    async def fast_run_agent(question, session):
+        return RESULT
+
+    monkeypatch.setattr("app.api.routes.run_agent", fast_run_agent)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/api/v1/query", json={"question": "How many customers?"})
+        metrics = (await client.get("/metrics")).text
+    assert response.status_code == 200
+    assert 'copilot_requests_cancelled_total{endpoint="query"}' in metrics
+    assert 'copilot_db_pool_connections{datasource="default",state="checked_out"}' in metrics
+
+
+async def test_abandoned_stream_cancels_the_agent(pool):
+    before = _cancelled("query_stream")
+
+    sent = await asyncio.wait_for(abandon("/api/v1/query/stream", {"question": "Revenue by country?"}), timeout=5)
+
+    chunks = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+    assert chunks.startswith(b"event: schema")
+    assert b"event: answer" not in chunks
+    assert _cancelled("query_stream") - before == 1
+    assert pool.cancelled == 1 and pool.checked_out == 0
+
+
+async def test_cancelled_statement_is_counted(monkeypatch):
+    monkeypatch.setattr(query_executor.settings, "plan_guard_enabled", False)
+    monkeypatch.setattr(query_executor.settings, "matview_advisor_enabled", False)
+
+    class SlowSession:
+        async def execute(self, statement):
+            if "statement_timeout" not in str(statement):
+                await asyncio.sleep(30)
+
+        async def rollback(self):
+            pass
+
+    before = DB_QUERIES_CANCELLED._value.get()
+    task = asyncio.create_task(query_executor.execute_readonly_query(SlowSession(), "SELECT pg_sleep(30)"))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert DB_QUERIES_CANCELLED._value.get() - before == 1
@@ -0,0 +1,345 @@
+import base64
+import contextlib
+import csv
+import io
+import json
+import os
+from decimal import Decimal
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.api.exports import encode_csv, encode_ndjson, encode_parquet
+from app.main import app
+from app.services.cache_factory import get_export_tokens, get_query_cache
+from app.services.exporter import ExportCursor, ExportSlots, ExportTokens, InvalidExportToken, export_sql
+from app.services.query_planner import QueryPlanRejected
+
+COLUMNS = ["id", "name", "amount"]
+
+
+async def _synthetic(rows: int, batch_rows: int = 5000):
+    """Row batches generated on demand, like a server-side cursor."""
+    for start in range(0, rows, batch_rows):
+        yield [(i, f"customer-{i}", Decimal(i) / 100) for i in range(start, min(start + batch_rows, rows))]
+
+
+def _rss_bytes() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def test_export_sql_lifts_the_generated_limit():
+    assert export_sql("SELECT id FROM customers LIMIT 100", 1000) == "SELECT id FROM customers LIMIT 1000"
+    assert export_sql("SELECT id FROM customers LIMIT 10 OFFSET 5", 1000) == "SELECT id FROM customers LIMIT 1000"
+    assert export_sql("SELECT id FROM customers LIMIT 10", 1000, keep_limit=True) == "SELECT id FROM customers LIMIT 10"
+    assert export_sql("SELECT id FROM customers LIMIT 5000", 1000, keep_limit=True).endswith("LIMIT 1000")
+    assert export_sql("SELECT id FROM customers", 1000) == "SELECT id FROM customers LIMIT 1000"
+
+
+async def test_csv_and_ndjson_encode_one_chunk_per_batch():
+    chunks = [c async for c in encode_csv(COLUMNS, _synthetic(5, batch_rows=2))]
+    assert len(chunks) == 3
+    rows = list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+    assert rows[0] == COLUMNS
+    assert rows[-1] == ["4", "customer-4", "0.04"]
+
+    lines = b"".join([c async for c in encode_ndjson(COLUMNS, _synthetic(3))]).splitlines()
+    assert [json.loads(line) for line in lines][1] == {"id": 1, "name": "customer-1", "amount": "0.01"}
+
+
+async def test_csv_header_is_sent_for_an_empty_result():
+    assert [c async for c in encode_csv(COLUMNS, _synthetic(0))] == [b"id,name,amount\r\n"]
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="needs /proc")
+@pytest.mark.parametrize("encode", [encode_csv, encode_ndjson])
+async def test_multi_million_row_export_runs_at_constant_rss(encode):
+    total_rows = 2_000_000
+    exported = 0
+    baseline = None
+    async for chunk in encode(COLUMNS, _synthetic(total_rows)):
+        exported += len(chunk)
+        if baseline is None:
+            baseline = _rss_bytes()
+
+    # Well over 50 MB went out; memory grew by no more than a few batches' worth.
+    assert exported > 50_000_000
+    assert _rss_bytes() - baseline < 20_000_000
+
+
+async def test_parquet_writes_one_row_group_per_batch():
+    pq = pytest.importorskip("pyarrow.parquet")
+    data = b"".join([c async for c in encode_parquet(COLUMNS, _synthetic(12_000))])
+    parquet = pq.ParquetFile(io.BytesIO(data))
+    assert parquet.metadata.num_rows == 12_000
+    assert parquet.metadata.num_row_groups == 3
+
+
+class FakeCursor:
+    opened: list[str] = []
+
+    def __init__(self, engine, sql, batch_rows, timeout_seconds, on_close=None):
+        self.sql = sql
+        self.batch_rows = batch_rows
+        self.on_close = on_close
+
+    async def open(self):
+        FakeCursor.opened.append(self.sql)
+        return COLUMNS
+
+    def batches(self):
+        return _synthetic(7, self.batch_rows)
+
+    async def close(self):
+        if self.on_close is not None:
+            self.on_close()
+            self.on_close = None
+
+
+ANSWER_SQL = "SELECT id, name, amount FROM customers LIMIT 100"
+
+
+@pytest.fixture
+def exports(monkeypatch):
+    """/query answers ANSWER_SQL; exports run on FakeCursor with the plan check recorded instead of EXPLAINed."""
+
+    async def fake_run_agent(question, session):
+        return {"sql": ANSWER_SQL, "answer": "ok", "columns": COLUMNS, "rows": [[1, "a", 1]]}
+
+    planned = []
+
+    async def fake_check_plan(session, sql, **budgets):
+        planned.append(budgets)
+        if "secret" in sql:
+            raise QueryPlanRejected("Query plan rejected: estimated cost 1e+12 exceeds budget 1e+08.")
+        return sql
+
+    monkeypatch.setattr("app.api.routes.run_agent", fake_run_agent)
+    monkeypatch.setattr("app.api.routes.check_plan", fake_check_plan)
+    monkeypatch.setattr("app.api.routes.SessionLocal", lambda: contextlib.nullcontext(object()))
+    monkeypatch.setattr("app.api.routes.ExportCursor", FakeCursor)
+    FakeCursor.opened = []
+    get_query_cache().clear()
+    yield planned
+    get_query_cache().clear()
+
+
+async def test_export_streams_the_sql_of_a_query_answer(exports):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        answer = (await client.post("/api/v1/query", json={"question": "List customers"})).json()
+        response = await client.post("/api/v1/export", json={"export_token": answer["export_token"], "format": "ndjson"})
+        raw_sql = await client.post("/api/v1/export", json={"sql": "SELECT * FROM orders"})
+        claims, signature = answer["export_token"].split(".")
+        forged_claims = base64.urlsafe_b64encode(b'{"sql":"SELECT 1","datasource":"default","exp":9999999999}')
+        forged = await client.post("/api/v1/export", json={"export_token": f"{forged_claims.decode()}.{signature}"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["content-disposition"] == 'attachment; filename="export.ndjson"'
+    assert len(response.content.splitlines()) == 7
+    assert FakeCursor.opened == ["SELECT id, name, amount FROM customers LIMIT 10000000"]
+    assert exports == [{"max_cost": 1e8, "max_plan_rows": 100_000_000, "row_cap": 10_000_000}]
+    assert raw_sql.status_code == 422
+    assert forged.status_code == 403
+
+
+def test_export_tokens_expire_and_bind_the_datasource():
+    tokens = ExportTokens(b"k", ttl_seconds=60)
+    assert tokens.open(tokens.issue(ANSWER_SQL, "emea")) == (ANSWER_SQL, "emea")
+    with pytest.raises(InvalidExportToken):
+        ExportTokens(b"other", ttl_seconds=60).open(tokens.issue(ANSWER_SQL, "emea"))
+    with pytest.raises(InvalidExportToken, match="expired"):
+        ExportTokens(b"k", ttl_seconds=-1).open(ExportTokens(b"k", ttl_seconds=-1).issue(ANSWER_SQL, "emea"))
+    with pytest.raises(InvalidExportToken):
+        tokens.open("not-a-token")
+
+
+async def test_export_is_plan_checked_and_capped(exports, monkeypatch):
+    slots = ExportSlots(1)
+    monkeypatch.setattr("app.api.routes.get_export_slots", lambda: slots)
+    over_budget = get_export_tokens().issue("SELECT * FROM customers a, customers b, customers secret", "default")
+    token = get_export_tokens().issue(ANSWER_SQL, "default")
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        rejected = await client.post("/api/v1/export", json={"export_token": over_budget})
+        assert slots.try_acquire()
+        busy = await client.post("/api/v1/export", json={"export_token": token})
+        slots.release()
+        done = await client.post("/api/v1/export", json={"export_token": token})
+
+    assert rejected.status_code == 400 and "plan rejected" in rejected.json()["detail"]
+    assert busy.status_code == 429
+    assert done.status_code == 200
+    assert slots.in_use == 0
+
+
+class StubResult:
+    """Streams ``rows`` like an AsyncResult over a server-side cursor, recording how far it was read."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.fetched = 0
+        self.closed = False
+
+    def keys(self):
+        return COLUMNS
+
+    async def partitions(self, size):
+        try:
+            while self.fetched < len(self.rows):
+                batch = self.rows[self.fetched : self.fetched + size]
+                self.fetched += len(batch)
+                yield batch
+        finally:
+            self.closed = True
+
+
+class StubConnection:
+    """The parts of AsyncConnection the exporter uses: a transaction, execute and stream."""
+
+    def __init__(self, rows, fail_on_stream=False):
+        self.result = StubResult(rows)
+        self.fail_on_stream = fail_on_stream
+        self.statements: list[str] = []
+        self.execution_options: dict = {}
+        self.transaction: str | None = None
+        self.released = False
+
+    @contextlib.asynccontextmanager
+    async def begin(self):
+        self.transaction = "open"
+        try:
+            yield self
+        except BaseException:
+            self.transaction = "rolled back"
+            raise
+        self.transaction = "committed"
+
+    async def execute(self, statement):
+        self.statements.append(str(statement))
+
+    async def stream(self, statement):
+        self.statements.append(str(statement))
+        self.execution_options = statement.get_execution_options()
+        if self.fail_on_stream:
+            raise RuntimeError('relation "nope" does not exist')
+        return self.result
+
+
+class StubEngine:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @contextlib.asynccontextmanager
+    async def connect(self):
+        try:
+            yield self.conn
+        finally:
+            self.conn.released = True
+
+
+def _rows(count):
+    return [(i, f"customer-{i}", Decimal(i)) for i in range(count)]
+
+
+async def test_export_cursor_streams_batches_and_releases_on_exhaustion():
+    slots = ExportSlots(1)
+    assert slots.try_acquire()
+    conn = StubConnection(_rows(5))
+    cursor = ExportCursor(StubEngine(conn), ANSWER_SQL, 2, 30, on_close=slots.release)
+
+    assert await cursor.open() == COLUMNS
+    assert conn.statements == ["SET LOCAL statement_timeout = 30000", ANSWER_SQL]
+    assert conn.execution_options["yield_per"] == 2
+    assert not conn.released and slots.in_use == 1
+
+    assert [len(batch) async for batch in cursor.batches()] == [2, 2, 1]
+    assert cursor.rows == 5
+    assert conn.transaction == "committed" and conn.released
+    assert slots.in_use == 0
+
+
+async def test_export_cursor_releases_when_the_reader_stops_early():
+    slots = ExportSlots(1)
+    assert slots.try_acquire()
+    conn = StubConnection(_rows(10))
+    cursor = ExportCursor(StubEngine(conn), ANSWER_SQL, 3, 30, on_close=slots.release)
+    await cursor.open()
+
+    batches = cursor.batches()
+    assert len(await anext(batches)) == 3
+    await batches.aclose()  # what the encoder's consumer does when the client goes away
+
+    assert cursor.rows == 3 and conn.result.fetched == 3
+    assert conn.released and slots.in_use == 0
+
+    failing = StubConnection(_rows(1), fail_on_stream=True)
+    assert slots.try_acquire()
+    with pytest.raises(RuntimeError):
+        await ExportCursor(StubEngine(failing), ANSWER_SQL, 3, 30, on_close=slots.release).open()
+    assert failing.transaction == "rolled back" and failing.released
+    assert slots.in_use == 0
+
+
+async def test_export_cursor_frees_its_slot_once():
+    slots = ExportSlots(1)
+    assert slots.try_acquire()
+    cursor = ExportCursor(None, ANSWER_SQL, 10, 1, on_close=slots.release)
+    await cursor.close()
+    await cursor.close()
+    assert slots.in_use == 0
+
+
+
+async def test_abandoned_export_response_frees_its_slot(exports, monkeypatch):
+    slots = ExportSlots(1)
+    monkeypatch.setattr("app.api.routes.get_export_slots", lambda: slots)
+    cursors = []
+
+    class Tracked(FakeCursor):
+        read = closed = False
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            cursors.append(self)
+
+        def batches(self):
+            self.read = True
+            return super().batches()
+
+        async def close(self):
+            self.closed = True
+            await super().close()
+
+    monkeypatch.setattr("app.api.routes.ExportCursor", Tracked)
+    body = json.dumps({"export_token": get_export_tokens().issue(ANSWER_SQL, "default")}).encode()
+    messages = [{"type": "http.request", "body": body}, {"type": "http.disconnect"}]
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        # The client is gone before the response starts, so the body is never iterated.
+        raise OSError("connection reset by peer")
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/api/v1/export",
+        "raw_path": b"/api/v1/export",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"test"), (b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("test", 80),
+    }
+    with pytest.raises(Exception):
+        await app(scope, receive, send)
+
+    [cursor] = cursors
+    assert not cursor.read and cursor.closed
+    assert slots.in_use == 0
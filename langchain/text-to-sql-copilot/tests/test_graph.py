@@ -0,0 +1,64 @@
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from app.agents import graph as graph_module
+from app.agents.graph import build_graph, get_compiled_graph
+from app.agents.runner import run_agent
+from app.services.cache_factory import get_result_cache
+
+SQL_REPLY = '{"sql": "SELECT COUNT(*) AS n FROM customers LIMIT 100"}'
+
+
+@pytest.fixture
+def stub_graph(monkeypatch):
+    get_result_cache().clear()
+    sessions = []
+
+    async def fake_execute(session, sql):
+        sessions.append(session)
+        return ["n"], [[5]]
+
+    monkeypatch.setattr(graph_module, "execute_readonly_query", fake_execute)
+    monkeypatch.setattr(graph_module.settings, "result_cache_enabled", False)
+    compiled = build_graph(FakeListChatModel(responses=[SQL_REPLY]))
+    monkeypatch.setattr("app.agents.runner.get_compiled_graph", lambda: compiled)
+    yield sessions
+    get_result_cache().clear()
+
+
+@pytest.mark.asyncio
+async def test_run_agent_injects_session_per_request(stub_graph):
+    first, second = object(), object()
+    r1 = await run_agent("How many customers?", first)
+    r2 = await run_agent("How many customers?", second)
+
+    assert stub_graph == [first, second]
+    assert r1["answer"] == r2["answer"] == "Result: **5**"
+    assert r1["llm_calls"] == 1
+
+
+def test_compiled_graph_and_llm_are_built_once(monkeypatch):
+    created = 0
+
+    def fake_create_llm(settings=None):
+        nonlocal created
+        created += 1
+        return FakeListChatModel(responses=[SQL_REPLY])
+
+    monkeypatch.setattr("app.llm.factory.create_llm", fake_create_llm)
+    from app.llm.factory import get_llm
+
+    get_llm.cache_clear()
+    get_compiled_graph.cache_clear()
+    try:
+        assert get_compiled_graph() is get_compiled_graph()
+        assert created == 1
+    finally:
+        get_llm.cache_clear()
+        get_compiled_graph.cache_clear()
+
+
+@pytest.mark.asyncio
+async def test_missing_session_is_a_wiring_error():
+    with pytest.raises(RuntimeError, match="configurable.session"):
+        await graph_module.execute_sql_node({"sql": "SELECT 1 FROM customers LIMIT 1"}, {})
@@ -0,0 +1,135 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from langchain_core.messages import AIMessage
+
+from app.db.datasources import use_datasource
+from app.main import app
+from app.services.cache_factory import get_query_cache
+from app.services.ledger import SCHEMA, Ledger, RequestRecord, percentiles, record_request
+from app.telemetry import record_llm_usage, span
+
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    ledger = Ledger(tmp_path / "ledger.sqlite3")
+    monkeypatch.setattr("app.api.routes.get_ledger", lambda: ledger)
+    get_query_cache().clear()
+    yield ledger
+    ledger.close()
+    get_query_cache().clear()
+
+
+def test_percentiles_use_nearest_rank():
+    assert percentiles(list(range(1, 101))) == {"p50": 50, "p95": 95, "p99": 99}
+    assert percentiles([7.0]) == {"p50": 7.0, "p95": 7.0, "p99": 7.0}
+    assert percentiles([]) == {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+
+
+@pytest.mark.asyncio
+async def test_spans_and_tokens_inside_a_request_land_in_its_record(ledger):
+    with record_request(ledger, "How many customers?") as record:
+        with span("llm"):
+            await asyncio.sleep(0.01)
+        usage = {"input_tokens": 120, "output_tokens": 30, "total_tokens": 150}
+        record_llm_usage(AIMessage(content="", usage_metadata=usage))
+        with span("db.execute"):
+            await asyncio.sleep(0.005)
+        with span("summarize"):
+            pass
+
+    assert record.llm_ms >= 10
+    assert 5 <= record.db_ms < record.llm_ms
+    assert (record.input_tokens, record.output_tokens) == (120, 30)
+    assert record.total_ms >= record.llm_ms + record.db_ms
+    with span("llm"):
+        pass  # outside the request: no record to update
+    assert ledger.pending == 1
+
+    assert await ledger.flush() == 1
+    conn = sqlite3.connect(ledger.path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("SELECT question, input_tokens, status FROM requests").fetchall() == [
+        ("How many customers?", 120, 200)
+    ]
+
+
+def test_append_never_blocks_and_counts_drops(tmp_path):
+    ledger = Ledger(tmp_path / "ledger.sqlite3", max_pending=2)
+    for _ in range(5):
+        ledger.append(RequestRecord(0.0, "h", "q"))
+    assert (ledger.pending, ledger.dropped) == (2, 3)
+
+
+@pytest.mark.asyncio
+async def test_query_requests_are_recorded_and_reported(ledger, monkeypatch):
+    async def fake_run_agent(question, session):
+        with span("llm"):
+            await asyncio.sleep(0.02 if "slow" in question else 0.001)
+        with span("db.execute"):
+            pass
+        return {
+            "sql": "SELECT COUNT(*) AS n FROM customers LIMIT 100",
+            "answer": "Result: **5**",
+            "columns": ["n"],
+            "rows": [[5]],
+            "relevant_tables": ["customers"],
+            "llm_calls": 1,
+            "retry_count": 0,
+        }
+
+    monkeypatch.setattr("app.api.routes.run_agent", fake_run_agent)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        await client.post("/api/v1/query", json={"question": "How many customers? slow"})
+        await client.post("/api/v1/query", json={"question": "How many customers? slow"})
+        await client.post("/api/v1/query", json={"question": "How many orders?"})
+        slow = (await client.get("/api/v1/admin/slow-queries", params={"limit": 2})).json()
+        top = (await client.get("/api/v1/admin/top-questions")).json()
+        bad_order = await client.get("/api/v1/admin/top-questions", params={"order": "sql"})
+
+    assert slow["requests"] == 3
+    assert set(slow["percentiles"]) == {"total_ms", "db_ms", "llm_ms"}
+    first = slow["slowest"][0]
+    assert first["question"] == "How many customers? slow"
+    assert (first["cache"], first["llm_calls"], first["row_count"]) == ("miss", 1, 1)
+    assert first["llm_ms"] >= 20
+
+    assert [q["question"] for q in top["questions"]] == ["How many customers? slow", "How many orders?"]
+    assert (top["questions"][0]["requests"], top["questions"][0]["cache_hits"]) == (2, 1)
+    assert bad_order.status_code == 400
+    assert {q["datasource"] for q in top["questions"]} == {"default"}
+
+
+@pytest.mark.asyncio
+async def test_top_questions_keep_datasources_apart(ledger):
+    for datasource in ("emea", "emea", "apac"):
+        with use_datasource(datasource), record_request(ledger, "Revenue by country?"):
+            pass
+    await ledger.flush()
+
+    top = await ledger.top_questions(0.0, 10, order="count")
+
+    assert [(q["datasource"], q["requests"]) for q in top] == [("emea", 2), ("apac", 1)]
+    assert top[0]["question_hash"] == top[1]["question_hash"]
+
+
+def test_ledger_files_without_a_datasource_column_are_migrated(tmp_path):
+    path = tmp_path / "ledger.sqlite3"
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA.replace(",\n    datasource TEXT NOT NULL DEFAULT 'default'", ""))
+    now = time.time()
+    conn.execute("INSERT INTO requests VALUES (?, 'h', 'q', NULL, 0, 1.0, 0, 0, 0, 0, 0, 0, 'miss', 200)", (now,))
+    conn.commit()
+    conn.close()
+
+    ledger = Ledger(path)
+    ledger.append(RequestRecord(now + 1, "h", "q", datasource="emea"))
+    asyncio.run(ledger.flush())
+    rows = ledger._read("SELECT datasource FROM requests ORDER BY ts")
+    ledger.close()
+
+    assert [row["datasource"] for row in rows] == ["default", "emea"]
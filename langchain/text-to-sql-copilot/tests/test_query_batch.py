@@ -0,0 +1,125 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.main import app
+from app.services.cache_factory import get_query_cache
+
+
+def result_for(question: str) -> dict:
+    return {
+        "sql": "SELECT COUNT(*) FROM customers LIMIT 100",
+        "answer": f"Answer to {question}",
+        "columns": ["count"],
+        "rows": [[5]],
+        "relevant_tables": ["customers"],
+        "llm_calls": 2,
+        "retry_count": 1,
+    }
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    get_query_cache().clear()
+    calls: list[str] = []
+    running = {"now": 0, "peak": 0}
+
+    async def fake_run_agent(question, session):
+        calls.append(question)
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+        if "fail" in question:
+            raise RuntimeError("boom")
+        return result_for(question)
+
+    @asynccontextmanager
+    async def fake_session():
+        yield object()
+
+    monkeypatch.setattr("app.api.routes.run_agent", fake_run_agent)
+    monkeypatch.setattr("app.api.routes.SessionLocal", fake_session)
+    yield calls, running
+    get_query_cache().clear()
+
+
+async def post_batch(questions: list[str]) -> dict:
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/api/v1/query/batch", json={"questions": questions})
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.mark.asyncio
+async def test_batch_dedupes_and_reports_stats(agent):
+    calls, _ = agent
+    questions = ["How many customers?", "how many  CUSTOMERS?", "Top products"]
+    body = await post_batch(questions)
+
+    assert sorted(calls) == ["How many customers?", "Top products"]
+    assert [item["question"] for item in body["results"]] == questions
+    assert body["results"][1]["response"]["answer"] == "Answer to How many customers?"
+    assert body["stats"] | {"elapsed_ms": 0} == {
+        "total": 3,
+        "unique": 2,
+        "cache_hits": 0,
+        "executed": 2,
+        "errors": 0,
+        "llm_calls": 4,
+        "retries": 2,
+        "elapsed_ms": 0,
+    }
+
+
+@pytest.mark.asyncio
+async def test_batch_serves_cached_questions_without_agent(agent):
+    calls, _ = agent
+    await post_batch(["How many customers?"])
+    body = await post_batch(["How many customers?", "Top products"])
+
+    assert calls == ["How many customers?", "Top products"]
+    assert body["results"][0]["response"]["cached"] is True
+    assert body["stats"]["cache_hits"] == 1
+    assert body["stats"]["llm_calls"] == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_concurrency_is_bounded(agent, monkeypatch):
+    calls, running = agent
+    monkeypatch.setattr("app.api.routes.settings.batch_max_concurrency", 3)
+    await post_batch([f"Question number {i}" for i in range(12)])
+
+    assert len(calls) == 12
+    assert running["peak"] == 3
+
+
+@pytest.mark.asyncio
+async def test_batch_isolates_failures(agent):
+    body = await post_batch(["Top products", "please fail"])
+
+    assert body["results"][0]["response"] is not None
+    assert body["results"][1]["response"] is None
+    assert body["results"][1]["error"] == "Agent failed to process question."
+    assert body["stats"]["errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_rejects_oversized_requests(agent, monkeypatch):
+    monkeypatch.setattr("app.api.routes.settings.batch_max_questions", 2)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        questions = ["Total revenue", "Top products", "Orders per status"]
+        response = await client.post("/api/v1/query/batch", json={"questions": questions})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_batch_rejects_blank_questions(agent):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        empty = await client.post("/api/v1/query/batch", json={"questions": ["Top products", ""]})
+        blank = await client.post("/api/v1/query/batch", json={"questions": ["Top products", "     "]})
+    assert empty.status_code == 422
+    assert blank.status_code == 400
+    assert agent[0] == []
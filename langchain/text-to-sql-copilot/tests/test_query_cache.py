@@ -15,7 +15,7 @@ def test_same_cache_key_for_equivalent_questions():
 
 def test_cache_hit_and_miss():
     cache = QueryCache(max_size=10, ttl_seconds=60)
-    payload = {"sql": "SELECT 1", "answer": "Result: **1**", "columns": ["?column?"], "rows": [{"?column?": 1}]}
+    payload = {"sql": "SELECT 1", "answer": "Result: **1**", "columns": ["?column?"], "rows": [[1]]}
 
     assert cache.get("test question") is None
     cache.set("test question", payload)
@@ -45,3 +45,47 @@ def test_is_cacheable_response():
     assert is_cacheable_response({"sql": "SELECT 1", "answer": "ok"}) is True
     assert is_cacheable_response({"sql": None, "answer": "fail"}) is False
     assert is_cacheable_response({"sql": "SELECT 1", "answer": "Could not produce a valid SQL answer."}) is False
+
+
+def test_get_refreshes_lru_order():
+    cache = QueryCache(max_size=2, ttl_seconds=60)
+    cache.set("a", {"sql": "SELECT 1", "answer": "a"})
+    cache.set("b", {"sql": "SELECT 2", "answer": "b"})
+    assert cache.get("a") is not None
+    cache.set("c", {"sql": "SELECT 3", "answer": "c"})
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_purge_expired_drops_unread_entries():
+    cache = QueryCache(max_size=10, ttl_seconds=1)
+    cache.set("a", {"sql": "SELECT 1", "answer": "a"})
+    cache.set("b", {"sql": "SELECT 2", "answer": "b"})
+    time.sleep(1.1)
+    cache.set("c", {"sql": "SELECT 3", "answer": "c"})
+    assert cache.purge_expired() == 2
+    stats = cache.stats()
+    assert stats["size"] == 1
+    assert stats["expired"] == 2
+
+
+def test_stats_counts_hits_and_misses():
+    cache = QueryCache(max_size=10, ttl_seconds=60)
+    cache.set("q", {"sql": "SELECT 1", "answer": "ok"})
+    cache.get("q")
+    cache.get("other")
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_sharded_cache_respects_max_size():
+    cache = QueryCache(max_size=1024, ttl_seconds=60, shards=8)
+    for i in range(5000):
+        cache.set(f"question {i}", {"sql": "SELECT 1", "answer": str(i)})
+    stats = cache.stats()
+    assert stats["shards"] == 8
+    assert stats["size"] <= 1024
+    assert stats["evictions"] == 5000 - stats["size"]
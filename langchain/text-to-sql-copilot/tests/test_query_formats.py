@@ -0,0 +1,107 @@
+import sys
+from datetime import date
+from decimal import Decimal
+
+import orjson
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.api.formats import COLUMNS_MEDIA_TYPE, ROWS_MEDIA_TYPE
+from app.main import app
+from app.services.cache_factory import get_query_cache
+
+RESULT = {
+    "sql": "SELECT c.country, SUM(oi.quantity * oi.unit_price) AS revenue, MIN(o.order_date) AS first_order ...",
+    "answer": "Found **2** row(s).",
+    "columns": ["country", "revenue", "first_order"],
+    "rows": [["USA", Decimal("1299.99"), date(2024, 1, 15)], ["Canada", Decimal("89.50"), date(2024, 2, 1)]],
+    "relevant_tables": ["customers", "orders", "order_items"],
+    "llm_calls": 1,
+    "retry_count": 0,
+}
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    get_query_cache().clear()
+    calls = []
+
+    async def fake_run_agent(question, session):
+        calls.append(question)
+        return dict(RESULT)
+
+    monkeypatch.setattr("app.api.routes.run_agent", fake_run_agent)
+    yield calls
+    get_query_cache().clear()
+
+
+async def _post(params=None, headers=None):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        return await client.post(
+            "/api/v1/query", json={"question": "Revenue per country?"}, params=params, headers=headers
+        )
+
+
+@pytest.mark.asyncio
+async def test_default_format_is_unchanged(agent):
+    response = await _post()
+
+    assert response.headers["content-type"] == "application/json"
+    assert response.json()["rows"][0] == {"country": "USA", "revenue": "1299.99", "first_order": "2024-01-15"}
+
+
+@pytest.mark.asyncio
+async def test_rows_format_sends_columns_once(agent):
+    response = await _post(params={"format": "rows"})
+
+    assert response.headers["content-type"] == ROWS_MEDIA_TYPE
+    body = orjson.loads(response.content)
+    assert body["format"] == "rows"
+    assert body["columns"] == ["country", "revenue", "first_order"]
+    assert body["rows"] == [["USA", "1299.99", "2024-01-15"], ["Canada", "89.50", "2024-02-01"]]
+    assert body["sql"] == RESULT["sql"] and body["cached"] is False and body["llm_calls"] == 1
+
+
+@pytest.mark.asyncio
+async def test_columns_format_negotiated_by_accept_and_served_from_cache(agent):
+    await _post()
+    response = await _post(headers={"Accept": f"{COLUMNS_MEDIA_TYPE}, application/json;q=0.5"})
+
+    assert agent == ["Revenue per country?"]
+    assert response.headers["content-type"] == COLUMNS_MEDIA_TYPE
+    body = orjson.loads(response.content)
+    assert body["cached"] is True
+    assert body["data"] == [["USA", "Canada"], ["1299.99", "89.50"], ["2024-01-15", "2024-02-01"]]
+
+
+@pytest.mark.asyncio
+async def test_cached_payload_keeps_rows_as_arrays(agent):
+    await _post()
+    cached = get_query_cache().get("Revenue per country?")
+    assert cached["rows"][0] == ["USA", Decimal("1299.99"), date(2024, 1, 15)]
+
+
+@pytest.mark.asyncio
+async def test_unknown_format_is_rejected(agent):
+    response = await _post(params={"format": "xml"})
+    assert response.status_code == 400
+    assert agent == []
+
+
+@pytest.mark.asyncio
+async def test_arrow_without_pyarrow_is_not_acceptable(agent, monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    response = await _post(params={"format": "arrow"})
+    assert response.status_code == 406
+
+
+@pytest.mark.asyncio
+async def test_arrow_ipc_round_trip(agent):
+    pa = pytest.importorskip("pyarrow")
+    response = await _post(headers={"Accept": "application/vnd.apache.arrow.stream"})
+
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column_names == ["country", "revenue", "first_order"]
+    assert table.column("revenue").to_pylist() == [Decimal("1299.99"), Decimal("89.50")]
+    assert table.column("first_order").to_pylist() == [date(2024, 1, 15), date(2024, 2, 1)]
+    assert orjson.loads(table.schema.metadata[b"copilot"])["answer"] == RESULT["answer"]
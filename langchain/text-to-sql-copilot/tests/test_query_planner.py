@@ -0,0 +1,215 @@
+import json
+
+import pytest
+
+from app.agents import graph as graph_module
+from app.services import query_executor
+from app.services.cache_factory import get_plan_cache
+from app.services.query_executor import execute_readonly_query
+from app.services.query_planner import QueryPlanRejected, check_plan, over_budget, summarize_plan, tighten_limit
+
+CHEAP_PLAN = {
+    "Node Type": "Limit",
+    "Total Cost": 42.5,
+    "Plan Rows": 5,
+    "Plans": [
+        {
+            "Node Type": "Hash Join",
+            "Total Cost": 40.0,
+            "Plan Rows": 200,
+            "Hash Cond": "(o.customer_id = c.id)",
+            "Plans": [
+                {"Node Type": "Seq Scan", "Relation Name": "orders", "Plan Rows": 200},
+                {
+                    "Node Type": "Hash",
+                    "Plan Rows": 8,
+                    "Plans": [{"Node Type": "Seq Scan", "Relation Name": "customers", "Plan Rows": 8}],
+                },
+            ],
+        }
+    ],
+}
+
+CARTESIAN_PLAN = {
+    "Node Type": "Sort",
+    "Total Cost": 4.2e9,
+    "Plan Rows": 8e8,
+    "Plans": [
+        {
+            "Node Type": "Nested Loop",
+            "Total Cost": 1.1e9,
+            "Plan Rows": 8e8,
+            "Plans": [
+                {"Node Type": "Seq Scan", "Relation Name": "customers", "Plan Rows": 40000},
+                {
+                    "Node Type": "Materialize",
+                    "Plan Rows": 20000,
+                    "Plans": [{"Node Type": "Seq Scan", "Relation Name": "products", "Plan Rows": 20000}],
+                },
+            ],
+        }
+    ],
+}
+
+
+class _Result:
+    def __init__(self, document=None, columns=(), rows=()):
+        self.document, self.columns, self.rows = document, list(columns), list(rows)
+
+    def scalar(self):
+        return self.document
+
+    def keys(self):
+        return self.columns
+
+    def fetchmany(self, size):
+        return self.rows[:size]
+
+
+class PlanningSession:
+    """Answers EXPLAIN with a canned plan and records every statement it is asked to run."""
+
+    def __init__(self, plan: dict) -> None:
+        self.plan = plan
+        self.statements: list[str] = []
+        self.rolled_back = False
+
+    async def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append(sql)
+        if sql.startswith("EXPLAIN"):
+            return _Result(document=json.dumps([{"Plan": self.plan}]))
+        return _Result(columns=["n"], rows=[(1,)])
+
+    async def rollback(self):
+        self.rolled_back = True
+
+    @property
+    def explains(self) -> list[str]:
+        return [s for s in self.statements if s.startswith("EXPLAIN")]
+
+
+@pytest.fixture(autouse=True)
+def fresh_plan_cache():
+    get_plan_cache().clear()
+    yield
+    get_plan_cache().clear()
+
+
+def test_summary_flags_nested_loop_without_join_condition():
+    summary = summarize_plan(CARTESIAN_PLAN)
+    assert summary.total_cost == 4.2e9
+    assert summary.max_rows == 8e8
+    assert summary.hints == ["cartesian product between customers and products (no join condition)"]
+    assert summarize_plan(CHEAP_PLAN).hints == []
+
+
+def test_row_budget_skips_limited_scans_and_aggregated_scans():
+    limited_scan = {
+        "Node Type": "Limit",
+        "Total Cost": 2.5,
+        "Plan Rows": 100,
+        "Plans": [{"Node Type": "Seq Scan", "Relation Name": "orders", "Total Cost": 5e5, "Plan Rows": 2e7}],
+    }
+    aggregate = {
+        "Node Type": "Aggregate",
+        "Total Cost": 5.5e5,
+        "Plan Rows": 1,
+        "Plans": [{"Node Type": "Seq Scan", "Relation Name": "orders", "Total Cost": 5e5, "Plan Rows": 2e7}],
+    }
+    for plan in (limited_scan, aggregate):
+        summary = summarize_plan(plan)
+        assert summary.max_rows == 0
+        assert over_budget(summary, max_cost=1e6, max_plan_rows=1e7) is None
+    assert over_budget(summarize_plan(CARTESIAN_PLAN), max_cost=1e10, max_plan_rows=1e7) is not None
+
+
+@pytest.mark.asyncio
+async def test_limit_over_large_scan_is_allowed():
+    session = PlanningSession(
+        {
+            "Node Type": "Limit",
+            "Total Cost": 2.5,
+            "Plan Rows": 100,
+            "Plans": [{"Node Type": "Seq Scan", "Relation Name": "orders", "Total Cost": 5e5, "Plan Rows": 2e7}],
+        }
+    )
+    sql = "SELECT * FROM orders LIMIT 100"
+    assert await check_plan(session, sql, max_cost=1e6, max_plan_rows=1e7, row_cap=100) == sql
+
+
+def test_tighten_limit_only_lowers_trailing_limit():
+    assert tighten_limit("SELECT id FROM orders LIMIT 100000", 100) == "SELECT id FROM orders LIMIT 100"
+    paged = "SELECT id FROM orders LIMIT 5000 OFFSET 20"
+    assert tighten_limit(paged, 100) == "SELECT id FROM orders LIMIT 100 OFFSET 20"
+    assert tighten_limit("SELECT id FROM orders LIMIT 10", 100) == "SELECT id FROM orders LIMIT 10"
+    sub = "SELECT * FROM (SELECT id FROM orders LIMIT 5000) t"
+    assert tighten_limit(sub, 100) == sub
+
+
+@pytest.mark.asyncio
+async def test_over_budget_plan_is_rejected_with_actionable_message():
+    session = PlanningSession(CARTESIAN_PLAN)
+    with pytest.raises(QueryPlanRejected) as info:
+        await check_plan(
+            session, "SELECT * FROM customers, products ORDER BY 1", max_cost=1e6, max_plan_rows=1e7, row_cap=100
+        )
+    message = str(info.value)
+    assert "estimated cost 4.2e+09 exceeds budget 1e+06" in message
+    assert "cartesian product between customers and products" in message
+    assert len(message) < 300  # execute_sql_node truncates longer errors
+
+
+@pytest.mark.asyncio
+async def test_verdicts_are_cached_by_sql():
+    session = PlanningSession(CHEAP_PLAN)
+    sql = "SELECT c.name FROM customers c JOIN orders o ON o.customer_id = c.id LIMIT 5"
+    for variant in (sql, sql + "  ", sql.replace(" JOIN", "\n JOIN")):
+        planned = await check_plan(
+            session, variant, max_cost=1e6, max_plan_rows=1e7, row_cap=100, cache=get_plan_cache()
+        )
+        assert planned == sql
+    assert len(session.explains) == 1
+
+    rejecting = PlanningSession(CARTESIAN_PLAN)
+    for _ in range(2):
+        with pytest.raises(QueryPlanRejected):
+            await check_plan(
+                rejecting,
+                "SELECT 1 FROM customers, products",
+                max_cost=1e6,
+                max_plan_rows=1e7,
+                row_cap=100,
+                cache=get_plan_cache(),
+            )
+    assert len(rejecting.explains) == 1
+
+
+@pytest.mark.asyncio
+async def test_executor_runs_the_tightened_sql(monkeypatch):
+    session = PlanningSession(CHEAP_PLAN)
+    columns, rows = await execute_readonly_query(session, "SELECT id AS n FROM orders LIMIT 50000")
+
+    assert rows == [[1]]
+    assert session.explains == ["EXPLAIN (FORMAT JSON) SELECT id AS n FROM orders LIMIT 100"]
+    assert session.statements[-1] == "SELECT id AS n FROM orders LIMIT 100"
+
+    monkeypatch.setattr(query_executor.settings, "plan_guard_enabled", False)
+    unguarded = PlanningSession(CARTESIAN_PLAN)
+    await execute_readonly_query(unguarded, "SELECT 1 AS n FROM customers, products LIMIT 100")
+    assert unguarded.explains == []
+
+
+@pytest.mark.asyncio
+async def test_rejection_becomes_execution_error_for_retry(monkeypatch):
+    monkeypatch.setattr(graph_module.settings, "result_cache_enabled", False)
+    session = PlanningSession(CARTESIAN_PLAN)
+    update = await graph_module.execute_sql_node(
+        {"sql": "SELECT c.name, p.name FROM customers c, products p ORDER BY 1 LIMIT 100"},
+        {"configurable": {"session": session}},
+    )
+
+    assert update["execution_error"].startswith("Query plan rejected:")
+    assert "Add the missing JOIN ... ON condition." in update["execution_error"]
+    assert session.rolled_back
+    assert not any(s.startswith("SELECT c.name") for s in session.statements)
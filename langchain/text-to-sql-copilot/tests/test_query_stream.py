@@ -0,0 +1,105 @@
+import json
+from contextlib import asynccontextmanager
+from decimal import Decimal
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from app.agents import graph as graph_module
+from app.agents.graph import build_graph
+from app.main import app
+from app.services.cache_factory import get_query_cache, get_result_cache
+
+
+def parse_sse(text: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+def stub_agent(monkeypatch):
+    get_query_cache().clear()
+    get_result_cache().clear()
+
+    async def fake_execute(session, sql):
+        return ["country", "revenue"], [[f"C{i}", Decimal("10.50")] for i in range(120)]
+
+    @asynccontextmanager
+    async def fake_session():
+        yield object()
+
+    def install(*replies: str) -> None:
+        compiled = build_graph(FakeListChatModel(responses=list(replies)))
+        monkeypatch.setattr("app.agents.runner.get_compiled_graph", lambda: compiled)
+
+    monkeypatch.setattr(graph_module, "execute_readonly_query", fake_execute)
+    monkeypatch.setattr(graph_module.settings, "result_cache_enabled", False)
+    monkeypatch.setattr("app.api.routes.SessionLocal", fake_session)
+    yield install
+    get_query_cache().clear()
+
+
+VALID = '{"sql": "SELECT c.country, SUM(oi.quantity * oi.unit_price) AS revenue FROM customers c JOIN orders o ON c.id = o.customer_id JOIN order_items oi ON o.id = oi.order_id GROUP BY c.country LIMIT 100"}'
+
+
+@pytest.mark.asyncio
+async def test_stream_emits_node_progress(stub_agent):
+    stub_agent(VALID)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/api/v1/query/stream", json={"question": "Revenue by country"})
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.text)
+    names = [name for name, _ in events]
+    assert names[:4] == ["schema", "sql", "validation", "rows"]
+    assert names.count("rows") == 3
+    assert names[-2:] == ["answer", "done"]
+    assert "customers" in events[0][1]["tables"]
+    assert events[3][1]["rows"][0] == {"country": "C0", "revenue": "10.50"}
+    done = events[-1][1]
+    assert done["cached"] is False
+    assert len(done["rows"]) == 120
+
+
+@pytest.mark.asyncio
+async def test_stream_reports_retries(stub_agent):
+    stub_agent('{"sql": "SELECT * FROM secrets"}', VALID)
+    question = "Which countries bring in the most revenue?"  # no template: goes to the LLM
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/api/v1/query/stream", json={"question": question})
+
+    events = parse_sse(response.text)
+    names = [name for name, _ in events]
+    assert names[:5] == ["schema", "sql", "validation", "retry", "sql"]
+    assert events[2][1]["valid"] is False
+    assert events[4][1]["attempt"] == 2
+    assert events[-1][1]["retry_count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_serves_cache_hit_immediately(stub_agent):
+    stub_agent(VALID)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        await client.post("/api/v1/query/stream", json={"question": "Revenue by country"})
+        response = await client.post("/api/v1/query/stream", json={"question": "revenue by country"})
+
+    events = parse_sse(response.text)
+    assert [name for name, _ in events] == ["done"]
+    assert events[0][1]["cached"] is True
+
+
+@pytest.mark.asyncio
+async def test_stream_template_hit_skips_llm(stub_agent):
+    stub_agent()  # no LLM replies: any generate_sql call would fail
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/api/v1/query/stream", json={"question": "Top 3 products by revenue"})
+
+    events = parse_sse(response.text)
+    assert [name for name, _ in events][:3] == ["schema", "sql", "validation"]
+    assert events[1][1]["template"] == "top_n_by_metric"
+    assert events[-1][1]["llm_calls"] == 0
+    assert events[-1][1]["template"] == "top_n_by_metric"
@@ -0,0 +1,111 @@
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from app.agents import graph as graph_module
+from app.agents.graph import build_graph
+from app.agents.runner import run_agent
+from app.services.query_templates import match_template
+from app.services.sql_validator import validate_sql
+
+ALLOWED = frozenset({"customers", "products", "orders", "order_items"})
+
+
+def match(question: str):
+    return match_template(question, ALLOWED, max_rows=100)
+
+
+@pytest.mark.parametrize(
+    ("question", "name", "slots"),
+    [
+        ("What is total revenue by country?", "metric_by_dimension", {"metric": "revenue", "dimension": "country"}),
+        ("Top 5 products by revenue", "top_n_by_metric", {"n": 5, "metric": "revenue", "dimension": "product"}),
+        ("best selling products", "best_selling", {"n": 10, "metric": "units_sold", "dimension": "product"}),
+        ("Orders in March 2024", "orders_in_period", {"period": ["2024-03-01", "2024-04-01"]}),
+        (
+            "How many orders in Q4 2024?",
+            "metric_in_period",
+            {"metric": "order_count", "period": ["2024-10-01", "2025-01-01"]},
+        ),
+    ],
+)
+def test_templates_extract_slots(question, name, slots):
+    result = match(question)
+    assert result.name == name
+    assert result.slots == slots
+    validate_sql(result.sql, allowed_tables=set(result.tables))
+
+
+def test_period_and_limit_are_rendered_from_parsed_values():
+    result = match("top 500 customers by sales in 2023")
+    assert result.sql.endswith("LIMIT 100")
+    assert "o.order_date >= DATE '2023-01-01' AND o.order_date < DATE '2024-01-01'" in result.sql
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "Which customers have never ordered?",
+        "revenue by country and product",
+        "revenue by country'; drop table orders; --",
+        "orders in 0000",
+        "How many customers are from the USA?",
+    ],
+)
+def test_unmatched_questions_fall_through(question):
+    assert match(question) is None
+
+
+def test_order_counts_keep_orders_without_line_items():
+    for question in ("How many orders in 2024?", "orders by status"):
+        sql = match(question).sql
+        assert "FROM orders o JOIN customers c" in sql
+        assert "LEFT JOIN order_items oi" in sql
+    assert "FROM order_items oi JOIN orders o" in match("Revenue by status").sql
+
+
+def test_templates_need_their_tables():
+    assert match_template("Top 5 products by revenue", frozenset({"products"}), max_rows=100) is None
+
+
+@pytest.mark.asyncio
+async def test_template_hit_costs_no_llm_call(monkeypatch):
+    executed = []
+
+    async def fake_execute(session, sql):
+        executed.append(sql)
+        return ["country", "revenue"], [["USA", 10]]
+
+    monkeypatch.setattr(graph_module, "execute_readonly_query", fake_execute)
+    monkeypatch.setattr(graph_module.settings, "result_cache_enabled", False)
+    compiled = build_graph(FakeListChatModel(responses=[]))
+    monkeypatch.setattr("app.agents.runner.get_compiled_graph", lambda: compiled)
+
+    result = await run_agent("Revenue by country", object())
+
+    assert result["llm_calls"] == 0
+    assert result["template"] == "metric_by_dimension"
+    assert executed == [result["sql"]]
+
+
+@pytest.mark.asyncio
+async def test_template_execution_error_falls_back_to_llm(monkeypatch):
+    calls = 0
+
+    async def flaky_execute(session, sql):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("column does not exist")
+        return ["n"], [[1]]
+
+    monkeypatch.setattr(graph_module, "execute_readonly_query", flaky_execute)
+    monkeypatch.setattr(graph_module.settings, "result_cache_enabled", False)
+    compiled = build_graph(FakeListChatModel(responses=['{"sql": "SELECT COUNT(*) AS n FROM orders LIMIT 1"}']))
+    monkeypatch.setattr("app.agents.runner.get_compiled_graph", lambda: compiled)
+
+    result = await run_agent("Revenue by country", object())
+
+    assert result["llm_calls"] == 1
+    assert result["retry_count"] == 1
+    assert result["template"] is None
+    assert result["answer"] == "Result: **1**"
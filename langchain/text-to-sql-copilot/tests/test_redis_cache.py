@@ -0,0 +1,164 @@
+from decimal import Decimal
+
+import pytest
+
+from bench.resp_server import RespServer
+from app.services.redis_cache import RedisCacheBackend, decode_payload, encode_payload
+
+PAYLOAD = {"sql": "SELECT 1", "answer": "ok", "rows": [[Decimal("1299.99"), "2024-01-15"]]}
+
+
+def test_payload_roundtrip_compresses_large_values():
+    small = encode_payload({"answer": "ok"})
+    large = encode_payload({"answer": "x" * 5000})
+    assert small.startswith(b"j")
+    assert large.startswith(b"z")
+    assert len(large) < 5000
+    assert decode_payload(large) == {"answer": "x" * 5000}
+    assert decode_payload(encode_payload(PAYLOAD))["rows"] == [["1299.99", "2024-01-15"]]
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_against_stand_in_server():
+    async with RespServer() as server:
+        backend = RedisCacheBackend(server.url, namespace="t", ttl_seconds=60)
+        try:
+            assert await backend.get("How many customers?") is None
+            await backend.set("How many customers?", PAYLOAD)
+            assert (await backend.get("  how many CUSTOMERS? "))["answer"] == "ok"
+
+            await backend.set_many([("a", {"answer": "a"}), ("b", {"answer": "b"})])
+            assert [p and p["answer"] for p in await backend.get_many(["a", "b", "c"])] == ["a", "b", None]
+
+            stats = await backend.stats()
+            assert stats["backend"] == "redis"
+            assert stats["size"] == 3
+            assert stats["hits"] == 3
+
+            assert await backend.delete("a") is True
+            assert await backend.clear() == 2
+            assert (await backend.stats())["size"] == 0
+        finally:
+            await backend.close()
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_ttl_is_server_side():
+    async with RespServer() as server:
+        backend = RedisCacheBackend(server.url, namespace="t", ttl_seconds=60)
+        try:
+            await backend.set("q", PAYLOAD)
+            ((_, expires_at),) = server.data.values()
+            assert expires_at is not None
+        finally:
+            await backend.close()
+
+
+@pytest.mark.asyncio
+async def test_workers_share_one_cache():
+    async with RespServer() as server:
+        worker_a = RedisCacheBackend(server.url, namespace="t", ttl_seconds=60)
+        worker_b = RedisCacheBackend(server.url, namespace="t", ttl_seconds=60)
+        try:
+            await worker_a.set("revenue by country", PAYLOAD)
+            assert await worker_b.get("revenue by country") is not None
+            await worker_b.clear()
+            assert await worker_a.get("revenue by country") is None
+        finally:
+            await worker_a.close()
+            await worker_b.close()
+
+
+@pytest.mark.asyncio
+async def test_query_route_uses_shared_backend(monkeypatch):
+    from httpx import ASGITransport, AsyncClient
+
+    from app.main import app
+
+    calls = 0
+
+    async def fake_run_agent(question, session):
+        nonlocal calls
+        calls += 1
+        return {"sql": "SELECT COUNT(*) FROM customers LIMIT 100", "answer": "Result: **5**", "llm_calls": 1}
+
+    async with RespServer() as server:
+        backend = RedisCacheBackend(server.url, namespace="t", ttl_seconds=60)
+        monkeypatch.setattr("app.api.routes.get_cache_backend", lambda: backend)
+        monkeypatch.setattr("app.api.routes.run_agent", fake_run_agent)
+        try:
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+                r1 = await client.post("/api/v1/query", json={"question": "How many customers?"})
+                r2 = await client.post("/api/v1/query", json={"question": "how many customers?"})
+                stats = await client.get("/api/v1/cache/stats")
+        finally:
+            await backend.close()
+
+    assert r1.json()["cached"] is False
+    assert r2.json()["cached"] is True
+    assert stats.json()["backend"] == "redis"
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_workers_share_table_versions():
+    async with RespServer() as server:
+        worker_a = RedisCacheBackend(server.url, namespace="t", ttl_seconds=60)
+        worker_b = RedisCacheBackend(server.url, namespace="t", ttl_seconds=60)
+        try:
+            assert await worker_a.bump_version("orders") == 1
+            await worker_b.sync_versions(["orders", "customers"])
+            assert worker_b.versions.all() == {"orders": 1}
+
+            assert await worker_b.set_version("orders", 7) == 7
+            await worker_a.sync_versions(["orders"])
+            assert worker_a.versions.get("orders") == 7
+            # Version keys sit next to the entries but are not entries.
+            assert (await worker_a.stats())["size"] == 0
+            await worker_a.clear()
+            await worker_b.sync_versions(["orders"])
+            assert worker_b.versions.get("orders") == 7
+        finally:
+            await worker_a.close()
+            await worker_b.close()
+
+
+@pytest.mark.asyncio
+async def test_invalidation_on_one_worker_is_seen_by_all(monkeypatch):
+    from httpx import ASGITransport, AsyncClient
+
+    from app.main import app
+
+    calls = 0
+
+    async def fake_run_agent(question, session):
+        nonlocal calls
+        calls += 1
+        return {"sql": "SELECT COUNT(*) FROM customers LIMIT 100", "answer": "Result: **5**", "llm_calls": 1}
+
+    async with RespServer() as server:
+        worker_a = RedisCacheBackend(server.url, namespace="t", ttl_seconds=60)
+        worker_b = RedisCacheBackend(server.url, namespace="t", ttl_seconds=60)
+        workers = {"current": worker_a}
+        monkeypatch.setattr("app.api.routes.get_cache_backend", lambda: workers["current"])
+        monkeypatch.setattr("app.api.routes.run_agent", fake_run_agent)
+        question = {"question": "How many customers?"}
+        try:
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+                await client.post("/api/v1/cache/tables/customers/invalidate")
+                await client.post("/api/v1/query", json=question)
+                # Worker B never saw the bump locally, but the shared entry is still fresh for it.
+                workers["current"] = worker_b
+                shared_hit = await client.post("/api/v1/query", json=question)
+                await client.post("/api/v1/cache/tables/customers/invalidate")
+                workers["current"] = worker_a
+                after_bump = await client.post("/api/v1/query", json=question)
+                listing = await client.get("/api/v1/cache/tables")
+        finally:
+            await worker_a.close()
+            await worker_b.close()
+
+    assert shared_hit.json()["cached"] is True
+    assert after_bump.json()["cached"] is False
+    assert calls == 2
+    assert listing.json()["versions"]["customers"] == 2
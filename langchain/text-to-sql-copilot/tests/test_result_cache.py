@@ -0,0 +1,114 @@
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.agents.graph import execute_sql_node
+from app.main import app
+from app.services.cache_factory import get_query_cache, get_result_cache, get_table_versions
+from app.services.result_cache import ResultCache, make_sql_cache_key, normalize_sql
+from app.services.table_versions import TableVersions, apply_notification
+
+SQL = "SELECT c.country, COUNT(*) FROM customers c JOIN orders o ON c.id = o.customer_id GROUP BY c.country LIMIT 100"
+
+
+def test_normalize_sql_collapses_whitespace_but_keeps_literals():
+    assert normalize_sql("SELECT  *\n FROM customers;") == "SELECT * FROM customers"
+    assert normalize_sql("SELECT * FROM customers WHERE name = 'A  B'") == "SELECT * FROM customers WHERE name = 'A  B'"
+    assert make_sql_cache_key("SELECT 1 FROM t WHERE x = 'usa'") != make_sql_cache_key(
+        "SELECT 1 FROM t WHERE x = 'USA'"
+    )
+
+
+def test_result_cache_shared_across_formatting():
+    cache = ResultCache(TableVersions(), max_size=10, ttl_seconds=60)
+    cache.set(SQL, ["country", "count"], [["USA", 3]], {"customers": 0, "orders": 0})
+    assert cache.get(SQL.replace(" ", "  ")) == (["country", "count"], [["USA", 3]])
+
+
+def test_table_bump_invalidates_only_dependent_entries():
+    versions = TableVersions()
+    cache = ResultCache(versions, max_size=10, ttl_seconds=60)
+    cache.set(SQL, ["country", "count"], [["USA", 3]], {"customers": 0, "orders": 0})
+    cache.set("SELECT name FROM products LIMIT 100", ["name"], [["Laptop Pro"]], {"products": 0})
+
+    versions.bump("orders")
+
+    assert cache.get(SQL) is None
+    assert cache.get("SELECT name FROM products LIMIT 100") is not None
+    assert cache.stats()["stale"] == 1
+
+
+def test_apply_notification_sets_or_bumps():
+    versions = TableVersions()
+    apply_notification(versions, "orders:7")
+    assert versions.get("orders") == 7
+    apply_notification(versions, "orders")
+    assert versions.get("orders") == 8
+
+
+@pytest.mark.asyncio
+async def test_execute_node_reuses_cached_result(monkeypatch):
+    get_result_cache().clear()
+    calls = 0
+
+    async def fake_execute(session, sql):
+        nonlocal calls
+        calls += 1
+        return ["country", "count"], [["USA", 3]]
+
+    monkeypatch.setattr("app.agents.graph.execute_readonly_query", fake_execute)
+
+    config = {"configurable": {"session": object()}}
+    first = await execute_sql_node({"sql": SQL}, config)
+    second = await execute_sql_node({"sql": SQL + ";"}, config)
+    get_table_versions().bump("customers")
+    third = await execute_sql_node({"sql": SQL}, config)
+
+    get_result_cache().clear()
+    assert first["rows"] == second["rows"] == third["rows"]
+    assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_change_during_execution_leaves_result_stale(monkeypatch):
+    get_result_cache().clear()
+
+    async def execute_while_orders_change(session, sql):
+        get_table_versions().bump("orders")
+        return ["country", "count"], [["USA", 3]]
+
+    monkeypatch.setattr("app.agents.graph.execute_readonly_query", execute_while_orders_change)
+
+    result = await execute_sql_node({"sql": SQL}, {"configurable": {"session": object()}})
+
+    assert result["table_versions"]["orders"] == get_table_versions().get("orders") - 1
+    assert get_result_cache().get(SQL) is None
+    get_result_cache().clear()
+
+
+@pytest.mark.asyncio
+async def test_invalidate_endpoint_expires_cached_answers(monkeypatch):
+    get_query_cache().clear()
+    calls = 0
+
+    async def fake_run_agent(question, session):
+        nonlocal calls
+        calls += 1
+        return {"sql": "SELECT COUNT(*) FROM customers LIMIT 100", "answer": "Result: **5**", "llm_calls": 1}
+
+    monkeypatch.setattr("app.api.routes.run_agent", fake_run_agent)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        await client.post("/api/v1/query", json={"question": "How many customers?"})
+        bumped = await client.post("/api/v1/cache/tables/customers/invalidate")
+        again = await client.post("/api/v1/query", json={"question": "How many customers?"})
+        set_resp = await client.put("/api/v1/cache/tables/orders/version", json={"version": 42})
+        unknown = await client.post("/api/v1/cache/tables/secrets/invalidate")
+        listing = await client.get("/api/v1/cache/tables")
+
+    get_query_cache().clear()
+    assert bumped.status_code == 200
+    assert again.json()["cached"] is False
+    assert calls == 2
+    assert set_resp.json() == {"versions": {"orders": 42}}
+    assert unknown.status_code == 404
+    assert listing.json()["versions"]["orders"] == 42
@@ -0,0 +1,53 @@
+from app.db.schema import TABLE_CATALOG
+from app.services.schema_index import SchemaIndex, tokenize
+from app.services.schema_service import link_relevant_tables
+
+CHAIN = {
+    "regions": {"columns": ["id", "region_name"], "keywords": ["region"]},
+    "stores": {"columns": ["id", "region_id"], "keywords": ["store"], "foreign_keys": {"region_id": "regions.id"}},
+    "shipments": {"columns": ["id", "store_id"], "keywords": ["shipment"], "foreign_keys": {"store_id": "stores.id"}},
+    "carriers": {
+        "columns": ["id", "shipment_id"],
+        "keywords": ["carrier"],
+        "foreign_keys": {"shipment_id": "shipments.id"},
+    },
+}
+
+
+def test_tokenize_splits_underscores_and_stems():
+    assert tokenize("Unit_Price of line items") == ("unit", "price", "of", "line", "item")
+
+
+def test_whole_tokens_only():
+    index = SchemaIndex(TABLE_CATALOG)
+    # "did" contains "id", "buyer" contains "user": neither may score.
+    assert index.score("Which did the buyer like?") == {"customers": 2}
+
+
+def test_keywords_outweigh_columns():
+    index = SchemaIndex(TABLE_CATALOG)
+    scores = index.score("customers by email and country")
+    assert scores["customers"] == 2 + 3 + 3  # table name, then keyword + column for email and country
+
+
+def test_multi_word_phrases():
+    assert "order_items" in SchemaIndex(TABLE_CATALOG).score("show each line item")
+
+
+def test_revenue_pulls_in_companion_orders():
+    assert link_relevant_tables("What is total revenue by country?") == ["order_items", "customers", "orders"]
+
+
+def test_fk_bridge_across_intermediate_tables():
+    index = SchemaIndex(CHAIN)
+    assert index.link("carriers per region") == ["regions", "carriers", "shipments", "stores"]
+
+
+def test_bridge_respects_hop_limit():
+    index = SchemaIndex(CHAIN, max_bridge_hops=1)
+    assert index.link("carriers per region") == ["regions", "carriers"]
+
+
+def test_no_match_falls_back_to_first_tables():
+    index = SchemaIndex(CHAIN)
+    assert index.link("hello there", limit=2) == ["regions", "stores"]
@@ -0,0 +1,103 @@
+import time
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.api import routes
+from app.main import app
+from app.services.cache_factory import get_query_cache, get_semantic_cache
+from app.db.schema import TABLE_CATALOG
+from app.services.semantic_cache import SemanticCache, schema_terms
+
+PAYLOAD = {"sql": "SELECT c.country, SUM(oi.quantity * oi.unit_price) FROM customers c LIMIT 100", "answer": "ok"}
+
+
+def test_paraphrase_hits():
+    cache = SemanticCache(max_size=10, ttl_seconds=60, threshold=0.8)
+    cache.add("total revenue per country", PAYLOAD)
+    match = cache.lookup("revenue by country?")
+    assert match is not None
+    payload, similarity = match
+    assert payload == PAYLOAD
+    assert 0.8 <= similarity <= 1.0
+
+
+def test_different_dimension_misses():
+    cache = SemanticCache(max_size=10, ttl_seconds=60, threshold=0.8)
+    cache.add("revenue by country", PAYLOAD)
+    assert cache.lookup("revenue by product") is None
+
+
+def test_numbers_must_match():
+    cache = SemanticCache(max_size=10, ttl_seconds=60, threshold=0.8)
+    cache.add("top 3 products by revenue", PAYLOAD)
+    assert cache.lookup("top 5 products by revenue") is None
+    assert cache.lookup("Top 3 products by revenue?") is not None
+
+
+def test_time_words_must_match():
+    cache = SemanticCache(max_size=10, ttl_seconds=60, threshold=0.8)
+    cache.add("revenue by country this month", PAYLOAD)
+    assert cache.lookup("revenue by country last month") is None
+    assert cache.lookup("revenue by country this year") is None
+    assert cache.lookup("revenue by country") is None
+    assert cache.lookup("Revenue per country this month?") is not None
+
+
+def test_schema_terms_must_match():
+    cache = SemanticCache(max_size=10, ttl_seconds=60, threshold=0.8, guard_terms=schema_terms(TABLE_CATALOG))
+    cache.add("revenue by product category", PAYLOAD)
+    assert cache.lookup("revenue by product") is None
+    assert cache.lookup("revenue per product category") is not None
+
+
+def test_count_phrasings_are_equivalent():
+    cache = SemanticCache(max_size=10, ttl_seconds=60, threshold=0.8)
+    cache.add("How many customers do we have?", PAYLOAD)
+    assert cache.lookup("customer count?") is not None
+
+
+def test_expired_entries_are_not_returned():
+    cache = SemanticCache(max_size=10, ttl_seconds=1, threshold=0.8)
+    cache.add("total revenue per country", PAYLOAD)
+    time.sleep(1.1)
+    assert cache.lookup("revenue by country") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_evicts_least_recently_used():
+    cache = SemanticCache(max_size=2, ttl_seconds=60, threshold=0.8)
+    cache.add("revenue by country", PAYLOAD)
+    cache.add("customers by country", PAYLOAD)
+    assert cache.lookup("revenue per country") is not None
+    cache.add("products by category", PAYLOAD)
+    assert cache.stats()["size"] == 2
+    assert cache.lookup("customers per country") is None
+    assert cache.lookup("revenue per country") is not None
+
+
+@pytest.mark.asyncio
+async def test_query_route_serves_semantic_hit(monkeypatch):
+    monkeypatch.setattr(routes.settings, "semantic_cache_enabled", True)
+    get_query_cache().clear()
+    get_semantic_cache().clear()
+    call_count = 0
+
+    async def fake_run_agent(question, session):
+        nonlocal call_count
+        call_count += 1
+        return {**PAYLOAD, "columns": ["country"], "rows": [], "relevant_tables": ["customers"], "llm_calls": 1}
+
+    monkeypatch.setattr("app.api.routes.run_agent", fake_run_agent)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        r1 = await client.post("/api/v1/query", json={"question": "total revenue per country"})
+        r2 = await client.post("/api/v1/query", json={"question": "revenue by country?"})
+
+    get_query_cache().clear()
+    get_semantic_cache().clear()
+    assert call_count == 1
+    assert r1.json()["similarity"] is None
+    assert r2.json()["cached"] is True
+    assert r2.json()["question"] == "revenue by country?"
+    assert r2.json()["similarity"] >= 0.8
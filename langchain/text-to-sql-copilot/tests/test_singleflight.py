@@ -0,0 +1,201 @@
+import asyncio
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.db.engine import get_db_session
+from app.main import app
+from app.services.cache_factory import get_query_cache
+from app.services.singleflight import SingleFlight
+
+RESULT = {
+    "sql": "SELECT COUNT(*) FROM customers LIMIT 100",
+    "answer": "Result: **5**",
+    "columns": ["count"],
+    "rows": [[5]],
+    "relevant_tables": ["customers"],
+    "llm_calls": 1,
+    "retry_count": 0,
+}
+
+
+@pytest.fixture(autouse=True)
+def reset_cache():
+    get_query_cache().clear()
+    yield
+    get_query_cache().clear()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "done"
+
+    results = await asyncio.gather(*(flights.do("k", work) for _ in range(10)))
+    assert calls == 1
+    assert [r for r, _ in results] == ["done"] * 10
+    assert sum(shared for _, shared in results) == 9
+    assert flights.stats() == {"in_flight": 0, "coalesced": 9}
+
+
+@pytest.mark.asyncio
+async def test_errors_propagate_to_every_waiter():
+    flights = SingleFlight()
+
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("llm down")
+
+    results = await asyncio.gather(*(flights.do("k", boom) for _ in range(5)), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert flights.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_shared_work():
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    first = asyncio.create_task(flights.do("k", work))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(flights.do("k", work))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == ("done", True)
+
+
+@pytest.mark.asyncio
+async def test_work_is_cancelled_once_every_waiter_is():
+    flights = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    waiters = [asyncio.create_task(flights.do("k", work)) for _ in range(3)]
+    await asyncio.sleep(0)
+    for waiter in waiters:
+        waiter.cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+    assert flights.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_shared_run_does_not_use_the_leader_session(monkeypatch):
+    injected: list[object] = []
+    agent_sessions: list[object] = []
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def request_session():
+        session = object()
+        injected.append(session)
+        yield session
+
+    async def fake_run_agent(question, session):
+        agent_sessions.append(session)
+        started.set()
+        await release.wait()
+        return RESULT
+
+    monkeypatch.setattr("app.api.routes.run_agent", fake_run_agent)
+    app.dependency_overrides[get_db_session] = request_session
+    question = {"question": "How many customers?"}
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            leader = asyncio.create_task(client.post("/api/v1/query", json=question))
+            await started.wait()
+            follower = asyncio.create_task(client.post("/api/v1/query", json=question))
+            await asyncio.sleep(0.01)
+            # The leader goes away (its session is torn down) while the follower still waits on the run.
+            leader.cancel()
+            await asyncio.gather(leader, return_exceptions=True)
+            release.set()
+            response = await follower
+    finally:
+        app.dependency_overrides.pop(get_db_session, None)
+
+    assert response.json()["answer"] == "Result: **5**"
+    assert len(agent_sessions) == 1
+    assert agent_sessions[0] not in injected
+
+
+@pytest.mark.asyncio
+async def test_hundred_identical_requests_make_one_llm_call(monkeypatch):
+    calls = 0
+
+    async def fake_run_agent(question, session):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return RESULT
+
+    monkeypatch.setattr("app.api.routes.run_agent", fake_run_agent)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        responses = await asyncio.gather(
+            *(client.post("/api/v1/query", json={"question": "How many customers?"}) for _ in range(100))
+        )
+        stats = await client.get("/api/v1/cache/stats")
+
+    assert calls == 1
+    assert all(r.status_code == 200 for r in responses)
+    assert {r.json()["answer"] for r in responses} == {"Result: **5**"}
+    assert stats.json()["coalesced"] >= 99
+
+
+@pytest.mark.asyncio
+async def test_coalesced_failures_return_errors(monkeypatch):
+    calls = 0
+
+    async def failing_run_agent(question, session):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.02)
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr("app.api.routes.run_agent", failing_run_agent)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        responses = await asyncio.gather(
+            *(client.post("/api/v1/query", json={"question": "failing question"}) for _ in range(10))
+        )
+
+    assert calls == 1
+    assert all(r.status_code == 500 for r in responses)
+
+
+@pytest.mark.asyncio
+async def test_cache_bypass_is_not_coalesced(monkeypatch):
+    calls = 0
+
+    async def fake_run_agent(question, session):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.02)
+        return RESULT
+
+    monkeypatch.setattr("app.api.routes.run_agent", fake_run_agent)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        await asyncio.gather(
+            *(
+                client.post("/api/v1/query", json={"question": "bypass me"}, headers={"X-Cache-Bypass": "true"})
+                for _ in range(5)
+            )
+        )
+
+    assert calls == 5
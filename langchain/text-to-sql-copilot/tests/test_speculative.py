@@ -0,0 +1,128 @@
+import asyncio
+import contextlib
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from app.agents import graph as graph_module
+from app.agents import nodes as nodes_module
+from app.agents.graph import build_graph, race_candidates
+from app.agents.runner import run_agent
+
+INVALID = '{"sql": "SELECT * FROM secrets LIMIT 1"}'
+SLOW = '{"sql": "SELECT COUNT(*) AS slow FROM customers LIMIT 100"}'
+FAST = '{"sql": "SELECT COUNT(*) AS fast FROM customers LIMIT 100"}'
+
+
+@pytest.fixture
+def speculative(monkeypatch):
+    """Three candidates; the executor sleeps per SQL and records which queries were cancelled."""
+    monkeypatch.setattr(nodes_module.settings, "speculative_candidates", 3)
+    monkeypatch.setattr(graph_module.settings, "result_cache_enabled", False)
+    monkeypatch.setattr(graph_module, "SessionLocal", lambda: contextlib.nullcontext(object()))
+    delays = {"slow": 5.0, "fast": 0.01}
+    cancelled = []
+
+    async def fake_execute(session, sql):
+        name = "slow" if "slow" in sql else "fast"
+        try:
+            await asyncio.sleep(delays[name])
+        except asyncio.CancelledError:
+            cancelled.append(name)
+            raise
+        return [name], [[1]]
+
+    monkeypatch.setattr(graph_module, "execute_readonly_query", fake_execute)
+    return delays, cancelled
+
+
+async def test_first_valid_candidate_to_finish_wins_and_the_rest_are_cancelled(speculative, monkeypatch):
+    _, cancelled = speculative
+    compiled = build_graph(FakeListChatModel(responses=[INVALID, SLOW, FAST]))
+    monkeypatch.setattr("app.agents.runner.get_compiled_graph", lambda: compiled)
+
+    result = await run_agent("How many customers?", object())
+
+    assert result["columns"] == ["fast"]
+    assert "fast" in result["sql"]
+    assert result["llm_calls"] == 3
+    assert result["candidates_generated"] == 3
+    assert result["retry_count"] == 0
+    assert cancelled == ["slow"]
+
+
+async def test_all_candidates_invalid_retries_with_a_new_round(speculative, monkeypatch):
+    compiled = build_graph(FakeListChatModel(responses=[INVALID, INVALID, INVALID, FAST, FAST, FAST]))
+    monkeypatch.setattr("app.agents.runner.get_compiled_graph", lambda: compiled)
+
+    result = await run_agent("How many customers?", object())
+
+    assert result["columns"] == ["fast"]
+    assert result["retry_count"] == 1
+    assert result["llm_calls"] == result["candidates_generated"] == 6
+
+
+async def test_race_times_out_as_an_execution_error(speculative):
+    delays, cancelled = speculative
+    delays["fast"] = 5.0
+    sqls = ["SELECT COUNT(*) AS slow FROM customers LIMIT 100", "SELECT COUNT(*) AS fast FROM customers LIMIT 100"]
+
+    update = await race_candidates(sqls, timeout=0.05)
+
+    assert update == {"sql": sqls[0], "execution_error": "no candidate finished within 0.05s"}
+    assert sorted(cancelled) == ["fast", "slow"]
+
+
+async def test_all_candidates_failing_report_the_sql_that_raised(speculative, monkeypatch):
+    async def fake_execute(session, sql):
+        if "slow" in sql:
+            await asyncio.sleep(0.02)
+            raise RuntimeError("slow failed")
+        raise RuntimeError("fast failed")
+
+    monkeypatch.setattr(graph_module, "execute_readonly_query", fake_execute)
+    sqls = ["SELECT COUNT(*) AS slow FROM customers LIMIT 100", "SELECT COUNT(*) AS fast FROM customers LIMIT 100"]
+
+    update = await race_candidates(sqls, timeout=1)
+
+    assert update["sql"] == sqls[1]
+    assert "fast failed" in update["execution_error"]
+
+
+async def test_cancelled_candidates_count_as_failures(speculative, monkeypatch):
+    synced = []
+
+    async def fake_execute(session, sql):
+        if "slow" in sql:
+            raise asyncio.CancelledError
+        await asyncio.sleep(0.01)
+        raise RuntimeError("fast failed")
+
+    async def sync_versions(tables):
+        synced.append(set(tables))
+
+    monkeypatch.setattr(graph_module, "execute_readonly_query", fake_execute)
+    monkeypatch.setattr(graph_module.get_cache_backend(), "sync_versions", sync_versions)
+    sqls = ["SELECT COUNT(*) AS slow FROM customers LIMIT 100", "SELECT COUNT(*) AS fast FROM orders LIMIT 100"]
+
+    update = await race_candidates(sqls, timeout=1)
+
+    assert update == {"sql": sqls[0], "execution_error": "candidate was cancelled"}
+    assert synced == [{"customers", "orders"}]
+
+
+async def test_single_candidate_mode_is_unchanged(monkeypatch):
+    monkeypatch.setattr(graph_module.settings, "result_cache_enabled", False)
+
+    async def fake_execute(session, sql):
+        return ["n"], [[5]]
+
+    monkeypatch.setattr(graph_module, "execute_readonly_query", fake_execute)
+    compiled = build_graph(FakeListChatModel(responses=[FAST]))
+    monkeypatch.setattr("app.agents.runner.get_compiled_graph", lambda: compiled)
+
+    result = await run_agent("How many customers?", object())
+
+    assert result["llm_calls"] == 1
+    assert "candidates" not in result
+    assert result.get("candidates_generated", 0) == 0
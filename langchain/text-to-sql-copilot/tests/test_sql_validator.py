@@ -1,7 +1,7 @@
 import pytest
 
 from app.services.schema_service import link_relevant_tables
-from app.services.sql_validator import SQLValidationError, validate_sql
+from app.services.sql_validator import SQLValidationError, _validate, extract_tables, validate_sql
 
 
 def test_link_relevant_tables_revenue():
@@ -29,3 +29,76 @@ def test_validate_blocks_multi_statement():
 def test_validate_unknown_table():
     with pytest.raises(SQLValidationError, match="not allowed"):
         validate_sql("SELECT * FROM secrets")
+
+
+def test_validate_allows_cte_names():
+    sql = (
+        "WITH recent AS (SELECT customer_id FROM orders) "
+        "SELECT c.name FROM recent r JOIN customers c ON c.id = r.customer_id"
+    )
+    assert validate_sql(sql).endswith("LIMIT 100")
+
+
+def test_validate_checks_tables_inside_subqueries_and_comma_lists():
+    with pytest.raises(SQLValidationError, match="secrets"):
+        validate_sql("SELECT * FROM orders WHERE customer_id IN (SELECT id FROM secrets)")
+    with pytest.raises(SQLValidationError, match="secrets"):
+        validate_sql("SELECT * FROM orders o, secrets s")
+    with pytest.raises(SQLValidationError, match="not allowed: other.customers"):
+        validate_sql("SELECT * FROM other.customers")
+
+
+def test_validate_checks_tables_inside_parenthesized_joins():
+    allowed = {"customers", "orders"}
+    with pytest.raises(SQLValidationError, match="secrets"):
+        validate_sql("SELECT * FROM (secrets CROSS JOIN customers) LIMIT 5", allowed_tables=allowed)
+    with pytest.raises(SQLValidationError, match="secrets"):
+        validate_sql("SELECT * FROM (secrets s JOIN customers c ON true)", allowed_tables=allowed)
+    with pytest.raises(SQLValidationError, match="secrets"):
+        validate_sql("SELECT * FROM orders o JOIN ((customers c JOIN secrets s ON true)) ON true", allowed_tables=allowed)
+    sql = "SELECT * FROM (customers c JOIN orders o ON o.customer_id = c.id) LIMIT 5"
+    assert extract_tables(sql) == allowed
+
+
+def test_validate_checks_tables_named_by_table_commands():
+    with pytest.raises(SQLValidationError, match="pg_user"):
+        validate_sql("SELECT name, email FROM customers UNION ALL TABLE pg_user")
+    with pytest.raises(SQLValidationError, match="pg_shadow"):
+        validate_sql("SELECT * FROM customers WHERE EXISTS (TABLE pg_shadow)")
+    with pytest.raises(SQLValidationError, match="pg_shadow"):
+        validate_sql("SELECT * FROM (TABLE ONLY pg_catalog.pg_shadow) s")
+    assert extract_tables("SELECT id FROM customers UNION TABLE orders") == {"customers", "orders"}
+
+
+def test_validate_cte_cannot_mask_qualified_table():
+    with pytest.raises(SQLValidationError, match="secrets"):
+        validate_sql("WITH secrets AS (SELECT 1) SELECT * FROM public.secrets")
+
+
+def test_validate_ignores_keywords_in_literals_and_function_syntax():
+    sql = validate_sql("SELECT EXTRACT(YEAR FROM order_date) FROM orders WHERE status <> 'DELETE; DROP'")
+    assert sql.endswith("LIMIT 100")
+
+
+def test_validate_only_counts_top_level_limit():
+    sql = validate_sql("SELECT * FROM (SELECT * FROM products LIMIT 5) p")
+    assert sql.endswith("p LIMIT 100")
+    assert validate_sql("SELECT * FROM products LIMIT 5;") == "SELECT * FROM products LIMIT 5"
+
+
+def test_extract_tables_matches_validation():
+    sql = "WITH t AS (SELECT * FROM order_items) SELECT * FROM t JOIN orders o ON o.id = t.order_id, products"
+    assert extract_tables(sql) == {"order_items", "orders", "products"}
+
+
+def test_validation_is_memoized_per_allow_list():
+    _validate.cache_clear()
+    sql = "SELECT id FROM customers"
+    validate_sql(sql, allowed_tables={"customers"})
+    validate_sql(sql, allowed_tables={"customers"})
+    with pytest.raises(SQLValidationError):
+        validate_sql(sql, allowed_tables={"orders"})
+    with pytest.raises(SQLValidationError):
+        validate_sql(sql, allowed_tables={"orders"})
+    info = _validate.cache_info()
+    assert (info.hits, info.misses) == (2, 2)
@@ -0,0 +1,54 @@
+"""Validation latency on short and generated long queries.
+
+    pytest tests/test_sql_validator_benchmark.py --benchmark-only
+
+"cold" runs the full tokenizer pass; "memoized" is what retries and cached SQL pay.
+"""
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from app.services.sql_validator import _validate, analyze_sql, validate_sql  # noqa: E402
+
+ALLOWED = frozenset({"customers", "products", "orders", "order_items"})
+
+SHORT = (
+    "SELECT c.country, SUM(oi.quantity * oi.unit_price) AS revenue FROM customers c "
+    "JOIN orders o ON c.id = o.customer_id JOIN order_items oi ON o.id = oi.order_id "
+    "GROUP BY c.country ORDER BY revenue DESC LIMIT 100"
+)
+
+
+def long_query(ctes: int = 60, columns: int = 40) -> str:
+    """Many CTEs, each with a correlated subquery, literals and comments — roughly 80 KB of SQL."""
+    bodies = []
+    for i in range(ctes):
+        cols = ", ".join(f"oi.quantity * {j} AS q{i}_{j}" for j in range(columns))
+        bodies.append(
+            f"s{i} AS (SELECT o.id, {cols} FROM orders o JOIN order_items oi ON oi.order_id = o.id "
+            f"WHERE o.status <> 'cancelled; {i}' AND o.customer_id IN (SELECT id FROM customers "
+            f"WHERE country = 'USA') -- segment {i}\n)"
+        )
+    joins = " ".join(f"JOIN s{i} ON s{i}.id = s0.id" for i in range(1, ctes))
+    return f"WITH {', '.join(bodies)} SELECT s0.* FROM s0 {joins} ORDER BY 1"
+
+
+LONG = long_query()
+
+
+def test_long_query_is_valid():
+    assert len(LONG) > 60_000
+    assert analyze_sql(LONG).tables == {"orders", "order_items", "customers"}
+
+
+@pytest.mark.parametrize("sql", [SHORT, LONG], ids=["short", "long"])
+def test_validate_cold(benchmark, sql):
+    cleaned, error = benchmark(_validate.__wrapped__, sql, ALLOWED)
+    assert error is None
+
+
+@pytest.mark.parametrize("sql", [SHORT, LONG], ids=["short", "long"])
+def test_validate_memoized(benchmark, sql):
+    validate_sql(sql, allowed_tables=ALLOWED)
+    assert benchmark(validate_sql, sql, ALLOWED).endswith("LIMIT 100")
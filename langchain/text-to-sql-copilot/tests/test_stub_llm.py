@@ -0,0 +1,79 @@
+import json
+import time
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from app.agents import graph as graph_module
+from app.agents.graph import build_graph
+from app.agents.runner import run_agent
+from app.config import Settings
+from app.llm.factory import create_llm
+from app.llm.stub import FAILED_SQL, StubChatModel, load_script
+
+
+def _prompt(question: str) -> list[HumanMessage]:
+    return [HumanMessage(content=f"Schema:\n  orders(id, status)\n  customers(id)\n\nQuestion: {question}")]
+
+
+def _sql(message) -> str:
+    return json.loads(message.content)["sql"]
+
+
+@pytest.mark.asyncio
+async def test_scripted_and_fallback_replies():
+    model = StubChatModel()
+    scripted = await model.ainvoke(_prompt("How many customers do we have?"))
+    fallback = await model.ainvoke(_prompt("Anything about shipments"))
+
+    assert _sql(scripted) == "SELECT COUNT(*) AS customers FROM customers LIMIT 100"
+    assert _sql(fallback) == "SELECT COUNT(*) AS n FROM orders LIMIT 100"
+    assert scripted.usage_metadata["input_tokens"] > 0
+
+
+@pytest.mark.asyncio
+async def test_failures_and_latency_are_deterministic_per_seed():
+    questions = [f"Question number {i}" for i in range(200)]
+
+    async def failures(seed: int) -> list[bool]:
+        model = StubChatModel(failure_rate=0.2, seed=seed)
+        return [_sql(await model.ainvoke(_prompt(q))) == FAILED_SQL for q in questions]
+
+    first, again, other = await failures(1), await failures(1), await failures(2)
+    assert first == again != other
+    assert 20 < sum(first) < 60
+
+
+@pytest.mark.asyncio
+async def test_latency_is_applied():
+    model = StubChatModel(latency_ms=30)
+    start = time.perf_counter()
+    await model.ainvoke(_prompt("How many customers do we have?"))
+    assert time.perf_counter() - start >= 0.03
+
+
+def test_factory_builds_stub_with_script_file(tmp_path):
+    script = tmp_path / "script.json"
+    script.write_text(json.dumps({"Orders per status?": "SELECT status, COUNT(*) FROM orders GROUP BY 1 LIMIT 100"}))
+    llm = create_llm(Settings(llm_provider="stub", stub_llm_script=str(script), stub_llm_latency_ms=12))
+
+    assert isinstance(llm, StubChatModel)
+    assert llm.latency_ms == 12
+    assert llm.script["orders per status"].startswith("SELECT status")
+    assert "what is the total revenue" in load_script("")
+
+
+@pytest.mark.asyncio
+async def test_failed_reply_drives_the_retry_path(monkeypatch):
+    async def fake_execute(session, sql):
+        return ["n"], [[7]]
+
+    monkeypatch.setattr(graph_module, "execute_readonly_query", fake_execute)
+    monkeypatch.setattr(graph_module.settings, "result_cache_enabled", False)
+    model = StubChatModel(failure_rate=1.0)
+    compiled = build_graph(model)
+    monkeypatch.setattr("app.agents.runner.get_compiled_graph", lambda: compiled)
+
+    result = await run_agent("How many customers do we have?", object())
+    assert result["llm_calls"] == graph_module.settings.max_sql_retries + 1
+    assert "stub_unknown_table" in result["answer"]
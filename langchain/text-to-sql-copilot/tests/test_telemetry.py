@@ -0,0 +1,93 @@
+import pytest
+from httpx import ASGITransport, AsyncClient
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage
+
+from app.agents import graph as graph_module
+from app.agents.graph import build_graph
+from app.agents.runner import run_agent
+from app.main import app
+from app.telemetry import REGISTRY, record_llm_usage, span, traced_node
+
+NODES = ["link_schema", "match_template", "generate_sql", "validate_sql", "execute_sql", "summarize"]
+
+
+def _count(span_name: str) -> float:
+    return REGISTRY.get_sample_value("copilot_span_seconds_count", {"span": span_name}) or 0.0
+
+
+def _sample(name: str, labels: dict) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_span_records_latency_and_errors():
+    before, errors = _count("unit"), _sample("copilot_span_errors_total", {"span": "unit"})
+    with span("unit"):
+        pass
+    with pytest.raises(RuntimeError), span("unit"):
+        raise RuntimeError("boom")
+
+    assert _count("unit") == before + 2
+    assert _sample("copilot_span_errors_total", {"span": "unit"}) == errors + 1
+
+
+@pytest.mark.asyncio
+async def test_traced_node_keeps_config_parameter():
+    async def node(state, config):
+        return {"seen": config["configurable"]["x"]}
+
+    wrapped = traced_node("unit_node", node)
+    assert await wrapped({}, {"configurable": {"x": 1}}) == {"seen": 1}
+    assert _count("unit_node") >= 1
+
+
+def test_llm_usage_counts_tokens():
+    before = _sample("copilot_llm_tokens_total", {"kind": "input"})
+    usage = {"input_tokens": 120, "output_tokens": 9, "total_tokens": 129}
+    record_llm_usage(AIMessage(content="{}", usage_metadata=usage))
+    record_llm_usage(AIMessage(content="{}"))
+    assert _sample("copilot_llm_tokens_total", {"kind": "input"}) == before + 120
+
+
+@pytest.mark.asyncio
+async def test_agent_run_emits_node_llm_and_retry_metrics(monkeypatch):
+    replies = ['{"sql": "SELECT * FROM secrets LIMIT 1"}', '{"sql": "SELECT COUNT(*) AS n FROM customers LIMIT 100"}']
+
+    async def fake_execute(session, sql):
+        return ["n"], [[5]]
+
+    monkeypatch.setattr(graph_module, "execute_readonly_query", fake_execute)
+    monkeypatch.setattr(graph_module.settings, "result_cache_enabled", False)
+    compiled = build_graph(FakeListChatModel(responses=replies))
+    monkeypatch.setattr("app.agents.runner.get_compiled_graph", lambda: compiled)
+
+    before = {name: _count(name) for name in [*NODES, "llm", "agent"]}
+    retries = _sample("copilot_retries_total", {"reason": "validation"})
+    runs = _sample("copilot_agent_runs_total", {"outcome": "success"})
+
+    result = await run_agent("How many customers?", object())
+
+    assert result["answer"] == "Result: **5**"
+    after = {name: _count(name) for name in before}
+    assert after["generate_sql"] - before["generate_sql"] == 2
+    assert after["llm"] - before["llm"] == 2
+    assert all(after[name] > before[name] for name in [*NODES, "agent"])
+    assert _sample("copilot_retries_total", {"reason": "validation"}) == retries + 1
+    assert _sample("copilot_agent_runs_total", {"outcome": "success"}) == runs + 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_exposes_prometheus_text():
+    with span("execute_sql"):
+        pass
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'copilot_span_seconds_bucket{le="0.001",span="execute_sql"}' in body
+    assert 'copilot_cache_hit_ratio{tier="question"}' in body
+    assert 'copilot_cache_hit_ratio{tier="result"}' in body
+    assert "# TYPE copilot_cache_hits_total counter" in body
+    assert 'copilot_cache_misses_total{tier="question"}' in body
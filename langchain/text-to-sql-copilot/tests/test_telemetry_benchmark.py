@@ -0,0 +1,26 @@
+"""Per-span overhead of the tracing wrapper.
+
+    pytest tests/test_telemetry_benchmark.py --benchmark-only
+
+Every node, LLM call and DB call opens a span, so it must stay in the low microseconds.
+"""
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from app.telemetry import span  # noqa: E402
+
+MAX_SPAN_SECONDS = 5e-6
+
+
+def _one_span():
+    with span("bench"):
+        pass
+
+
+def test_span_overhead(benchmark, request):
+    if not request.config.getoption("benchmark_only"):
+        pytest.skip("timing bound only holds on a quiet machine; run with --benchmark-only")
+    benchmark(_one_span)
+    assert benchmark.stats.stats.median < MAX_SPAN_SECONDS
@@ -0,0 +1,248 @@
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.main import app
+from app.services import query_executor, view_advisor
+from app.services.cache_factory import get_view_advisor
+from app.services.query_executor import execute_readonly_query
+from app.services.table_versions import TableVersions
+from app.services.view_advisor import ViewAdvisor, split_query, sync_views, sync_views_once, view_name
+
+REVENUE_BY_COUNTRY = (
+    "SELECT c.country, SUM(oi.quantity * oi.unit_price) AS revenue FROM customers c "
+    "JOIN orders o ON o.customer_id = c.id JOIN order_items oi ON oi.order_id = o.id "
+    "GROUP BY c.country ORDER BY revenue DESC LIMIT {limit}"
+)
+BODY = split_query(REVENUE_BY_COUNTRY.format(limit=100)).body
+
+
+class _Result:
+    def __init__(self, columns, rows):
+        self.columns, self.rows = columns, rows
+
+    def keys(self):
+        return self.columns
+
+    def fetchmany(self, size):
+        return self.rows[:size]
+
+
+class RecordingSession:
+    """Returns one row for any SELECT, or raises for statements containing ``fail_on``."""
+
+    def __init__(self, fail_on: str | None = None) -> None:
+        self.fail_on = fail_on
+        self.statements: list[str] = []
+
+    async def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append(sql)
+        if self.fail_on and self.fail_on in sql:
+            raise RuntimeError(f"relation {self.fail_on} does not exist")
+        return _Result(["country", "revenue"], [("USA", 10)])
+
+    async def rollback(self):
+        pass
+
+
+class AdminConnection:
+    def __init__(self, superuser: bool = False, locked: bool = False) -> None:
+        self.superuser = superuser
+        self.locked = locked
+        self.statements: list[str] = []
+        self.closed = False
+
+    async def execute(self, sql):
+        self.statements.append(sql)
+
+    async def fetchval(self, sql, *args):
+        if "pg_try_advisory_lock" in sql:
+            assert args == (view_advisor.MAINTENANCE_LOCK_KEY,)
+            return not self.locked
+        return self.superuser
+
+    async def close(self):
+        self.closed = True
+
+
+def hot_advisor(versions: TableVersions, calls: int = 5, mean_ms: float = 80.0) -> ViewAdvisor:
+    advisor = ViewAdvisor(versions, min_calls=5, min_mean_ms=50.0)
+    for _ in range(calls):
+        advisor.record(REVENUE_BY_COUNTRY.format(limit=100), mean_ms)
+    return advisor
+
+
+@pytest.fixture
+def advisor_on(monkeypatch):
+    monkeypatch.setattr(query_executor.settings, "plan_guard_enabled", False)
+    monkeypatch.setattr(query_executor.settings, "matview_advisor_enabled", True)
+    get_view_advisor.cache_clear()
+    yield
+    get_view_advisor.cache_clear()
+
+
+def test_split_query_strips_order_and_limit_of_aggregates():
+    shape = split_query(REVENUE_BY_COUNTRY.format(limit=10))
+
+    assert shape.order_by == "revenue DESC"
+    assert shape.limit == 10
+    assert shape.body.endswith("GROUP BY c.country")
+    assert split_query(REVENUE_BY_COUNTRY.format(limit=100)).body == shape.body
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT name FROM customers ORDER BY name LIMIT 100",  # not an aggregate
+        "SELECT country, COUNT(*) FROM customers GROUP BY country ORDER BY COUNT(*) DESC LIMIT 5",
+        "SELECT c.country, COUNT(*) FROM customers c GROUP BY c.country ORDER BY c.country LIMIT 5",
+        "SELECT country, COUNT(*) FROM customers GROUP BY country LIMIT 5 OFFSET 5",
+    ],
+)
+def test_split_query_rejects_shapes_a_view_cannot_answer(sql):
+    assert split_query(sql) is None
+
+
+def test_only_repeated_expensive_aggregates_are_advised():
+    versions = TableVersions()
+    assert hot_advisor(versions, calls=4).advised() == []
+    assert hot_advisor(versions, mean_ms=10.0).advised() == []
+
+    advised = hot_advisor(versions).advised()
+    assert [s.body for s in advised] == [BODY]
+    assert advised[0].tables == ["customers", "order_items", "orders"]
+
+
+@pytest.mark.asyncio
+async def test_sync_creates_grants_and_refreshes_views():
+    versions = TableVersions()
+    advisor = hot_advisor(versions)
+    conn = AdminConnection()
+
+    result = await sync_views(conn, advisor, versions, create=True, reader="copilot")
+
+    name = view_name(BODY)
+    assert result == {"created": [name], "refreshed": [name], "failed": []}
+    assert conn.statements == [
+        f"CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS {BODY} WITH NO DATA",
+        f'GRANT SELECT ON {name} TO "copilot"',
+        f"REFRESH MATERIALIZED VIEW {name}",
+    ]
+    assert advisor.advised() == []
+
+    advise_only = hot_advisor(versions)
+    assert await sync_views(AdminConnection(), advise_only, versions, create=False, reader="") == {
+        "created": [],
+        "refreshed": [],
+        "failed": [],
+    }
+
+
+@pytest.mark.asyncio
+async def test_sync_runs_as_the_view_owner_with_a_statement_timeout(monkeypatch):
+    connects = []
+
+    async def connect(dsn, server_settings):
+        connects.append((dsn, server_settings))
+        return conn
+
+    monkeypatch.setattr(view_advisor.asyncpg, "connect", connect)
+    versions = TableVersions()
+    owner_url = "postgresql+asyncpg://copilot_views:x@db/sales"
+
+    conn = AdminConnection()
+    result = await sync_views_once(
+        owner_url, hot_advisor(versions), versions, create=True, reader="copilot", statement_timeout=30
+    )
+    assert result["created"] == [view_name(BODY)]
+    assert connects == [("postgresql://copilot_views:x@db/sales", {"statement_timeout": "30000"})]
+    assert conn.closed
+
+    conn = AdminConnection(superuser=True)
+    with pytest.raises(PermissionError):
+        await sync_views_once(
+            owner_url, hot_advisor(versions), versions, create=True, reader="copilot", statement_timeout=30
+        )
+    assert conn.statements == [] and conn.closed
+
+    conn = AdminConnection(locked=True)
+    result = await sync_views_once(
+        owner_url, hot_advisor(versions), versions, create=True, reader="copilot", statement_timeout=30
+    )
+    assert result == {"created": [], "refreshed": [], "failed": [], "skipped": True}
+    assert conn.statements == [] and conn.closed
+
+
+@pytest.mark.asyncio
+async def test_fresh_view_answers_matching_sql_until_a_table_changes():
+    versions = TableVersions()
+    advisor = hot_advisor(versions)
+    await sync_views(AdminConnection(), advisor, versions, create=True, reader="")
+
+    rewritten, view = advisor.rewrite(REVENUE_BY_COUNTRY.format(limit=3))
+    assert rewritten == f"SELECT * FROM {view.name} ORDER BY revenue DESC LIMIT 3"
+
+    advisor.record_hit(view, 5.0)
+    assert advisor.stats()["saved_ms"] == 75.0
+
+    versions.bump("orders")
+    assert advisor.rewrite(REVENUE_BY_COUNTRY.format(limit=3)) is None
+    assert advisor.stats()["active"][0]["fresh"] is False
+
+
+@pytest.mark.asyncio
+async def test_executor_reads_the_view_and_falls_back_to_base_tables(advisor_on):
+    advisor = get_view_advisor()
+    for _ in range(5):
+        await execute_readonly_query(RecordingSession(), REVENUE_BY_COUNTRY.format(limit=100))
+    advisor.activate(advisor._stats[BODY])
+    advisor.mark_refreshed(advisor.views()[0], {})
+    name = view_name(BODY)
+
+    session = RecordingSession()
+    await execute_readonly_query(session, REVENUE_BY_COUNTRY.format(limit=100))
+    assert session.statements[-1] == f"SELECT * FROM {name} ORDER BY revenue DESC LIMIT 100"
+    assert advisor.views()[0].hits == 1
+
+    broken = RecordingSession(fail_on=name)
+    columns, rows = await execute_readonly_query(broken, REVENUE_BY_COUNTRY.format(limit=100))
+    assert rows == [["USA", 10]]
+    assert broken.statements[-1] == REVENUE_BY_COUNTRY.format(limit=100)
+
+
+@pytest.mark.asyncio
+async def test_views_endpoint_lists_advised_and_active(advisor_on):
+    advisor = get_view_advisor()
+    for _ in range(5):
+        advisor.record(REVENUE_BY_COUNTRY.format(limit=100), 120.0)
+    advisor.record("SELECT COUNT(*) FROM customers LIMIT 100", 500.0)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        body = (await client.get("/api/v1/views")).json()
+
+    assert body["enabled"] is True
+    assert [v["name"] for v in body["advised"]] == [view_name(BODY)]
+    assert body["advised"][0]["calls"] == 5
+    assert body["active"] == []
+
+
+@pytest.mark.asyncio
+async def test_views_sync_requires_the_admin_token(advisor_on, monkeypatch):
+    runs = []
+
+    async def fake_sync(*args, **kwargs):
+        runs.append(kwargs)
+        return {"created": [], "refreshed": ["copilot_mv_x"], "failed": []}
+
+    monkeypatch.setattr("app.api.routes.sync_views_once", fake_sync)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        monkeypatch.setattr(query_executor.settings, "admin_token", "")
+        disabled = await client.post("/api/v1/views/sync", headers={"X-Admin-Token": ""})
+        monkeypatch.setattr(query_executor.settings, "admin_token", "s3cret")
+        missing = await client.post("/api/v1/views/sync")
+        wrong = await client.post("/api/v1/views/sync", headers={"X-Admin-Token": "guess"})
+        ok = await client.post("/api/v1/views/sync", headers={"X-Admin-Token": "s3cret"})
+
+    assert [disabled.status_code, missing.status_code, wrong.status_code] == [403, 403, 403]
+    assert ok.status_code == 200 and ok.json()["refreshed"] == ["copilot_mv_x"] and ok.json()["skipped"] is False
+    assert len(runs) == 1